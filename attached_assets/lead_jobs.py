@@ -0,0 +1,117 @@
+"""
+Job handlers wrapping gpt_messages for the durable queue in backend/jobs.py.
+
+Each handler receives a job payload ({"lead_ids": [...], ...}), loads those
+leads from the lead database (LEADS_DATABASE_URL, defaulting to DATABASE_URL)
+and returns a JSON-able result that the queue stores on the job row. Raising
+fails the attempt, so the queue retries it and eventually dead-letters it.
+
+gpt_messages and the Lead/Assistant models belong to the lead project, so they
+are imported on first use, inside the worker process.
+"""
+import os
+from types import SimpleNamespace
+from typing import List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+try:
+    from attached_assets import lead_prefilter
+except ImportError as e:  # numpy missing; every lead then goes to the assistant unfiltered
+    lead_prefilter = None
+    _prefilter_import_error = str(e)
+
+# "off", "shadow" (score and report, send every lead) or "enforce" (drop ruled-out leads)
+LEAD_PREFILTER_MODE = os.getenv("LEAD_PREFILTER_MODE", "shadow").lower()
+
+if lead_prefilter is None and LEAD_PREFILTER_MODE != "off":
+    print(f"[LeadJobs] WARNING: LEAD_PREFILTER_MODE={LEAD_PREFILTER_MODE} but the pre-filter "
+          f"cannot be imported ({_prefilter_import_error}); leads will not be pre-filtered. "
+          f"Install numpy or set LEAD_PREFILTER_MODE=off")
+
+_engine = None
+
+
+def _lead_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_engine(os.getenv("LEADS_DATABASE_URL") or os.getenv("DATABASE_URL"),
+                                pool_pre_ping=True)
+    return _engine
+
+
+def load_leads(session: Session, lead_ids: List) -> list:
+    from models.leads import Lead
+
+    leads = session.query(Lead).filter(Lead.id.in_(lead_ids)).all()
+    missing = set(map(str, lead_ids)) - {str(lead.id) for lead in leads}
+    if missing:
+        print(f"[LeadJobs] {len(missing)} leads not found: {sorted(missing)[:10]}")
+    return leads
+
+
+def score_lead_batch(payload: dict) -> dict:
+    """Score one batch of leads with gpt_messages.score_leads.
+
+    The lead_prefilter runs in LEAD_PREFILTER_MODE, or the payload's "prefilter"
+    mode. In "shadow" every lead is still sent; "filtered" lists the leads the
+    pre-filter would have dropped, with their local score, so the weights can be
+    calibrated against the assistant's scores. In "enforce" those leads are not
+    sent, and each gets a result entry marked "prefiltered" instead. Either way
+    "prefilter" reports the (possible) savings, or {"mode", "unavailable": true}
+    when the pre-filter module could not be imported.
+    """
+    from attached_assets import gpt_messages
+
+    mode = payload.get("prefilter", LEAD_PREFILTER_MODE)
+    with Session(_lead_engine()) as session:
+        leads = load_leads(session, payload["lead_ids"])
+        if not leads:
+            return {"scored": 0, "results": []}
+        filtered, report = [], None
+        if lead_prefilter is None and mode in ("shadow", "enforce"):
+            print(f"[LeadJobs] WARNING: pre-filter ({mode}) unavailable, scoring every lead")
+            report = {"mode": mode, "unavailable": True}
+        elif mode in ("shadow", "enforce"):
+            kept, filtered, report = lead_prefilter.prefilter_leads(leads)
+            report["mode"] = mode
+            if mode == "enforce":
+                leads = kept
+            if filtered:
+                print(f"[LeadJobs] Pre-filter ({mode}) rules out {len(filtered)} of "
+                      f"{report['leads']} leads (~{report['tokens_saved']} tokens, "
+                      f"{report['calls_saved']} calls)")
+        ok, results = gpt_messages.score_leads(leads) if leads else (True, [])
+    if not ok:
+        raise RuntimeError("score_leads returned no results")
+    result = {"scored": len(results), "results": results}
+    if report is not None:
+        if mode == "enforce":
+            results.extend(dict(entry, prefiltered=True) for entry in filtered)
+        result.update(filtered=filtered, prefilter=report)
+    return result
+
+
+def outreach_batch(payload: dict) -> dict:
+    """Write and clean an outreach message for each lead in the batch.
+
+    The payload carries the OpenAI assistant id as "assistant_id". A lead whose
+    message fails is reported in the result; the batch fails only if none succeed.
+    """
+    from attached_assets import gpt_messages
+
+    assistant = SimpleNamespace(assistant_id=payload["assistant_id"])
+    messages, failed = {}, []
+    with Session(_lead_engine()) as session:
+        for lead in load_leads(session, payload["lead_ids"]):
+            ok, message = gpt_messages.get_assistant_lead_message(lead, assistant)
+            if ok:
+                ok, message = gpt_messages.validate_message(message)
+            if ok and message:
+                messages[str(lead.id)] = message
+            else:
+                failed.append(str(lead.id))
+    if failed and not messages:
+        raise RuntimeError(f"No outreach message produced for {len(failed)} leads")
+    return {"messages": messages, "failed": failed}
@@ -0,0 +1,299 @@
+"""
+Local pre-filter for lead scoring.
+
+gpt_messages.score_leads sends every lead to the scoring assistant, including
+leads whose job title, industry or description already shows they are not a
+fit. LeadPrefilter scores leads locally, so only the plausible ones reach the
+assistant.
+
+The input is the output of gpt_messages.extract_relevant_lead_data. For each
+text field (job_title, industry, description), every lead is tokenized once and
+its keyword phrases are looked up in that field's vocabulary. The matches form a
+sparse lead x keyword matrix (KeywordMatrix, COO row/column index arrays). Each
+category (seniority, industry_fit, ...) carries keyword weights per field, so
+every field has a keyword x category weight matrix. The whole table is then
+scored with NumPy in one pass:
+
+    category_scores = sum over fields of  features[field] @ weights[field]   (leads x categories)
+    total = clip(category_scores, -cap, cap) @ category_weights
+
+Leads with total >= threshold are kept. Leads that match no keyword at all are
+kept as well (keep_unknown), since there is nothing to judge them on.
+
+DEFAULT_CONFIG's weights are a starting point, not calibrated against the
+assistant's scores; lead_jobs runs the pre-filter in shadow mode (report only)
+by default until they are. The weights are configurable through a JSON file
+named by LEAD_PREFILTER_CONFIG (same shape as DEFAULT_CONFIG). Every run reports how many assistant calls and
+how many tokens it saved. Token counts are estimates: characters of the lead
+JSON / 4 for input, plus a fixed number of tokens per lead for the scores the
+assistant writes back and per call for the assistant's instructions.
+
+    python -m attached_assets.lead_prefilter --ids-file leads.txt --out kept.txt
+    python -m backend.jobs enqueue --queue score_leads --ids-file kept.txt
+"""
+import json
+import math
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FIELDS = ("job_title", "industry", "description")
+
+DEFAULT_CONFIG = {
+    "threshold": 1.0,
+    "keep_unknown": True,
+    "category_cap": 6.0,
+    "chars_per_token": 4.0,
+    "output_tokens_per_lead": 40,
+    "call_overhead_tokens": 600,
+    "categories": {
+        "seniority": {
+            "weight": 1.0,
+            "keywords": {
+                "job_title": {
+                    "founder": 3, "co founder": 3, "owner": 3, "ceo": 3, "chief": 2.5,
+                    "president": 2.5, "partner": 2, "principal": 2, "managing director": 2.5,
+                    "cto": 3, "cio": 2.5, "coo": 2.5, "cmo": 2.5, "vp": 2, "vice president": 2,
+                    "head": 1.5, "director": 1.5, "entrepreneur": 2.5, "consultant": 1,
+                    "manager": 0.5, "intern": -4, "student": -4, "trainee": -3,
+                    "apprentice": -3, "assistant": -1.5, "cashier": -4, "retired": -4,
+                    "volunteer": -3, "seeking": -2, "unemployed": -4,
+                },
+                "description": {
+                    "founded": 1.5, "built": 1, "scaled": 1, "leading": 0.5, "retired": -3,
+                    "student": -2, "looking for work": -2, "open to work": -2,
+                },
+            },
+        },
+        "industry_fit": {
+            "weight": 1.0,
+            "keywords": {
+                "industry": {
+                    "software": 2, "information technology": 2, "internet": 1.5,
+                    "computer software": 2, "saas": 2, "marketing": 1.5, "advertising": 1.5,
+                    "management consulting": 1.5, "consulting": 1, "financial services": 1,
+                    "real estate": 1, "e learning": 1, "professional training": 1,
+                    "venture capital": 1.5, "media": 0.5, "retail": 0.5,
+                    "government administration": -3, "military": -3, "religious institutions": -3,
+                    "primary secondary education": -2, "law enforcement": -3,
+                },
+            },
+        },
+        "ai_interest": {
+            "weight": 1.5,
+            "keywords": {
+                "job_title": {"ai": 2, "machine learning": 2, "data": 1, "automation": 1.5,
+                              "innovation": 1, "digital": 0.5, "growth": 0.5},
+                "description": {
+                    "ai": 1.5, "artificial intelligence": 2, "machine learning": 1.5,
+                    "automation": 1.5, "chatgpt": 2, "gpt": 1.5, "llm": 2, "generative": 1.5,
+                    "saas": 1, "startup": 1, "digital transformation": 1, "innovation": 0.5,
+                    "scale": 0.5, "growth": 0.5,
+                },
+            },
+        },
+    },
+}
+
+_TOKEN = re.compile(r"[a-z0-9+#]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.casefold())
+
+
+def load_config(path: Optional[str] = None) -> dict:
+    """DEFAULT_CONFIG with the top-level keys of the JSON file at `path` (or LEAD_PREFILTER_CONFIG)"""
+    path = path or os.getenv("LEAD_PREFILTER_CONFIG")
+    if not path:
+        return DEFAULT_CONFIG
+    with open(path) as f:
+        return {**DEFAULT_CONFIG, **json.load(f)}
+
+
+@dataclass
+class KeywordMatrix:
+    """Sparse 0/1 lead x keyword matrix in COO form"""
+    rows: np.ndarray
+    cols: np.ndarray
+    shape: Tuple[int, int]
+
+    def dot(self, weights: np.ndarray) -> np.ndarray:
+        """self @ weights for a dense (keywords x k) weight matrix"""
+        out = np.zeros((self.shape[0], weights.shape[1]))
+        np.add.at(out, self.rows, weights[self.cols])
+        return out
+
+    def matched(self) -> np.ndarray:
+        return np.bincount(self.rows, minlength=self.shape[0]) > 0
+
+
+@dataclass
+class PrefilterReport:
+    leads: int
+    kept: int
+    dropped: int
+    unknown: int
+    calls_before: int
+    calls_after: int
+    calls_saved: int
+    tokens_saved: int
+
+
+class LeadPrefilter:
+    def __init__(self, config: Optional[dict] = None):
+        config = config or load_config()
+        self.threshold = float(config["threshold"])
+        self.keep_unknown = bool(config["keep_unknown"])
+        self.category_cap = float(config["category_cap"])
+        self.chars_per_token = float(config["chars_per_token"])
+        self.output_tokens_per_lead = int(config["output_tokens_per_lead"])
+        self.call_overhead_tokens = int(config["call_overhead_tokens"])
+        self.categories = list(config["categories"])
+        self.category_weights = np.array(
+            [float(config["categories"][name].get("weight", 1.0)) for name in self.categories])
+
+        # Per field: phrase (as a token tuple) -> column, and the keyword x category weights
+        self.vocab: Dict[str, Dict[Tuple[str, ...], int]] = {}
+        self.weights: Dict[str, np.ndarray] = {}
+        self.max_phrase = 1
+        for field in FIELDS:
+            vocab: Dict[Tuple[str, ...], int] = {}
+            entries = []
+            for c, name in enumerate(self.categories):
+                for phrase, weight in config["categories"][name]["keywords"].get(field, {}).items():
+                    key = tuple(tokenize(phrase))
+                    if key:
+                        entries.append((vocab.setdefault(key, len(vocab)), c, float(weight)))
+                        self.max_phrase = max(self.max_phrase, len(key))
+            matrix = np.zeros((len(vocab), len(self.categories)))
+            for column, c, weight in entries:
+                matrix[column, c] += weight
+            self.vocab[field] = vocab
+            self.weights[field] = matrix
+
+    def features(self, lead_data: Sequence[dict], field: str) -> KeywordMatrix:
+        """Which of the field's keyword phrases occur in each lead"""
+        vocab = self.vocab[field]
+        rows: List[int] = []
+        cols: List[int] = []
+        seen: Dict[str, List[int]] = {}  # titles and industries repeat a lot
+        for i, lead in enumerate(lead_data):
+            text = lead.get(field) or ""
+            found = seen.get(text)
+            if found is None:
+                tokens = tokenize(text)
+                found = seen[text] = list({
+                    vocab[gram]
+                    for size in range(1, self.max_phrase + 1)
+                    for gram in zip(*(tokens[k:] for k in range(size)))
+                    if gram in vocab})
+            rows.extend([i] * len(found))
+            cols.extend(found)
+        return KeywordMatrix(np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp),
+                             (len(lead_data), len(vocab)))
+
+    def score(self, lead_data: Sequence[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per-category scores (leads x categories), totals, and whether any keyword matched"""
+        scores = np.zeros((len(lead_data), len(self.categories)))
+        matched = np.zeros(len(lead_data), dtype=bool)
+        for field in FIELDS:
+            features = self.features(lead_data, field)
+            scores += features.dot(self.weights[field])
+            matched |= features.matched()
+        scores = np.clip(scores, -self.category_cap, self.category_cap)
+        return scores, scores @ self.category_weights, matched
+
+    def estimate_tokens(self, lead_data: Sequence[dict]) -> np.ndarray:
+        """Assistant tokens each lead accounts for (its JSON in the request plus its scores)"""
+        if not lead_data:
+            return np.zeros(0)
+        # Keys and indentation are the same for every lead; only the values vary
+        overhead = len(json.dumps({key: "" for key in lead_data[0]}, indent=4))
+        chars = np.fromiter((overhead + sum(map(len, lead.values())) for lead in lead_data),
+                            dtype=float, count=len(lead_data))
+        return np.ceil(chars / self.chars_per_token) + self.output_tokens_per_lead
+
+    def select(self, lead_data: Sequence[dict],
+               batch_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, PrefilterReport]:
+        """Mask of leads to send to the assistant, their totals, and the savings.
+
+        batch_size is the number of leads per score_leads call (default: all in one call).
+        """
+        _, totals, matched = self.score(lead_data)
+        keep = totals >= self.threshold
+        unknown = ~matched
+        if self.keep_unknown:
+            keep |= unknown
+        n, kept = len(lead_data), int(keep.sum())
+        batch_size = batch_size or max(n, 1)
+        calls_before, calls_after = math.ceil(n / batch_size), math.ceil(kept / batch_size)
+        calls_saved = calls_before - calls_after
+        dropped = [lead for lead, k in zip(lead_data, keep) if not k]
+        tokens_saved = (int(self.estimate_tokens(dropped).sum())
+                        + calls_saved * self.call_overhead_tokens)
+        report = PrefilterReport(n, kept, n - kept, int(unknown.sum()), calls_before,
+                                 calls_after, calls_saved, tokens_saved)
+        return keep, totals, report
+
+
+_prefilter: Optional[LeadPrefilter] = None
+
+
+def default_prefilter() -> LeadPrefilter:
+    global _prefilter
+    if _prefilter is None:
+        _prefilter = LeadPrefilter()
+    return _prefilter
+
+
+def prefilter_leads(leads: list, batch_size: Optional[int] = None,
+                    prefilter: Optional[LeadPrefilter] = None) -> Tuple[list, list, dict]:
+    """Split Lead objects into (kept, dropped) and report the savings.
+
+    dropped holds {"id", "prefilter_score"} for each lead not sent to the assistant.
+    """
+    from attached_assets.gpt_messages import extract_relevant_lead_data
+
+    prefilter = prefilter or default_prefilter()
+    lead_data = extract_relevant_lead_data(leads)
+    keep, totals, report = prefilter.select(lead_data, batch_size)
+    kept = [lead for lead, k in zip(leads, keep) if k]
+    dropped = [{"id": data["id"], "prefilter_score": round(float(total), 2)}
+               for data, k, total in zip(lead_data, keep, totals) if not k]
+    return kept, dropped, asdict(report)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy.orm import Session
+
+    from attached_assets.lead_jobs import _lead_engine, load_leads
+
+    parser = argparse.ArgumentParser(description="Pre-filter leads before assistant scoring")
+    parser.add_argument("--ids-file", help="Lead ids, one per line (default: every lead)")
+    parser.add_argument("--out", help="Write the ids of the kept leads here, one per line")
+    parser.add_argument("--batch-size", type=int, default=10,
+                        help="Leads per score_leads call, for the call savings")
+    parser.add_argument("--config", help="JSON weights file (default: LEAD_PREFILTER_CONFIG)")
+    args = parser.parse_args()
+
+    with Session(_lead_engine()) as session:
+        if args.ids_file:
+            with open(args.ids_file) as f:
+                leads = load_leads(session, [line.strip() for line in f if line.strip()])
+        else:
+            from models.leads import Lead
+            leads = session.query(Lead).all()
+        kept, dropped, report = prefilter_leads(leads, args.batch_size,
+                                                LeadPrefilter(load_config(args.config)))
+        if args.out:
+            with open(args.out, "w") as f:
+                f.writelines(f"{lead.id}\n" for lead in kept)
+    print(f"[LeadPrefilter] Kept {report['kept']} of {report['leads']} leads; "
+          f"saved {report['calls_saved']} assistant calls and ~{report['tokens_saved']} tokens")
+    print(json.dumps(report, indent=2))
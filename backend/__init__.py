@@ -1,4 +1,13 @@
 # This file makes the backend directory a Python package
-from .database import Base, get_db
-from .models import Configurations, ConversationFlow
-from .schemas import ConfigBase, ConfigCreate, Config as ConfigSchema
+from dotenv import load_dotenv
+
+# Modules read their settings at import time, so .env is loaded before any of them
+load_dotenv()
+
+from .startup import startup_timer
+
+with startup_timer.phase("import database"):
+    from .database import Base, get_db
+with startup_timer.phase("import models and schemas"):
+    from .models import Configurations, ConversationFlow
+    from .schemas import ConfigBase, ConfigCreate, Config as ConfigSchema
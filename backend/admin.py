@@ -0,0 +1,20 @@
+"""
+Guard for operational endpoints (archival, profiling, ...).
+
+Requests must send the shared secret from ADMIN_TOKEN in the X-Admin-Token
+header. When ADMIN_TOKEN is unset the guarded endpoints are disabled.
+"""
+import hmac
+import os
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """FastAPI dependency rejecting requests without the admin token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,235 @@
+"""
+Cold storage for old conversations.
+
+archive_conversations() moves conversations whose last activity is older than
+ARCHIVE_AFTER_DAYS out of the hot table into append-only segment files under
+ARCHIVE_DIR. Each segment is gzip-compressed JSONL written as one gzip member
+per record, so the whole file still decompresses with zcat while a single
+record can be read by seeking to its offset. index.jsonl maps conversation ids
+to (segment, offset, length) and is small enough to keep in memory.
+
+Conversations of /ws/session visitors that have not completed are left in place
+while their session can still be resumed from the row: until their last activity
+is SESSION_STORE_TTL_SECONDS plus ARCHIVE_SESSION_GRACE_SECONDS old. Abandoned
+sessions, the common case, are archived like any other conversation after that.
+
+Archived conversations are read-only: GET /conversations/{id} serves them from
+the archive, while PUT and DELETE answer 409.
+
+Records are written and fsynced before their rows are deleted; if a run dies in
+between, the next run archives them again and the later index entry wins.
+
+Run it from cron with `python -m backend.archive`, or via POST /admin/archive/run.
+"""
+import fcntl
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, func, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .session_store import SESSION_STORE_TTL
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive/conversations")
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+ARCHIVE_SESSION_GRACE_SECONDS = float(os.getenv("ARCHIVE_SESSION_GRACE_SECONDS", "3600"))
+
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = ".lock"
+
+
+class ConversationArchive:
+    def __init__(self, directory: str, segment_max_bytes: int = ARCHIVE_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._index: Dict[int, Tuple[str, int, int]] = {}
+        self._index_size = 0
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _refresh_index(self):
+        """Read index entries appended since the last call (possibly by another process)"""
+        try:
+            size = os.path.getsize(self.index_path)
+        except FileNotFoundError:
+            return
+        if size == self._index_size:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_size)
+            data = f.read(size - self._index_size)
+        # Only consume complete lines; a writer may be mid-append
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            entry = json.loads(line)
+            self._index[entry["id"]] = (entry["segment"], entry["offset"], entry["length"])
+        self._index_size += len(complete)
+
+    def contains(self, conversation_id: int) -> bool:
+        with self._lock:
+            self._refresh_index()
+            return conversation_id in self._index
+
+    def get(self, conversation_id: int) -> Optional[dict]:
+        """Return an archived conversation as a dict, or None if it was never archived"""
+        with self._lock:
+            self._refresh_index()
+            location = self._index.get(conversation_id)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(gzip.decompress(f.read(length)))
+
+    @contextmanager
+    def writer_lock(self):
+        """Exclusive lock so only one archival run writes segments at a time"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError("Another archival run is in progress")
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _current_segment(self) -> str:
+        segments = sorted(name for name in os.listdir(self.directory)
+                          if name.startswith("segment-") and name.endswith(".jsonl.gz"))
+        if segments:
+            path = os.path.join(self.directory, segments[-1])
+            if os.path.getsize(path) < self.segment_max_bytes:
+                return segments[-1]
+        return time.strftime("segment-%Y%m%dT%H%M%S.jsonl.gz", time.gmtime())
+
+    def append(self, records: list) -> int:
+        """Append records to the current segment and index them; call under writer_lock()"""
+        if not records:
+            return 0
+        segment = self._current_segment()
+        entries = []
+        with open(os.path.join(self.directory, segment), "ab") as f:
+            offset = f.tell()
+            for record in records:
+                member = gzip.compress(
+                    (json.dumps(record, separators=(",", ":")) + "\n").encode(), mtime=0)
+                f.write(member)
+                entries.append({"id": record["id"], "config_id": record["config_id"],
+                                "created_at": record["created_at"], "segment": segment,
+                                "offset": offset, "length": len(member)})
+                offset += len(member)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path, "a") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        return len(entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh_index()
+            archived = len(self._index)
+        segments = []
+        if os.path.isdir(self.directory):
+            segments = [name for name in os.listdir(self.directory) if name.startswith("segment-")]
+        return {
+            "directory": self.directory,
+            "archived_conversations": archived,
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(os.path.join(self.directory, name)) for name in segments),
+            "archive_after_days": ARCHIVE_AFTER_DAYS,
+        }
+
+
+def archive_conversations(db: Session, older_than_days: float = ARCHIVE_AFTER_DAYS,
+                          batch_size: int = ARCHIVE_BATCH_SIZE,
+                          max_batches: Optional[int] = None) -> dict:
+    """Move inactive conversations from the database into the archive, batch by batch"""
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=older_than_days)
+    last_activity = func.coalesce(models.Conversations.updated_at,
+                                  models.Conversations.created_at)
+    # An unfinished /ws/session conversation can be resumed (session_store.load
+    # reads the row back) until the session store would have evicted it
+    resumable_since = now - timedelta(seconds=SESSION_STORE_TTL + ARCHIVE_SESSION_GRACE_SECONDS)
+    archivable = or_(models.Conversations.session_id.is_(None),
+                     models.Conversations.status == "completed",
+                     last_activity < resumable_since)
+    archived = batches = 0
+    started = time.perf_counter()
+
+    with conversation_archive.writer_lock():
+        while max_batches is None or batches < max_batches:
+            rows = db.query(models.Conversations).filter(
+                last_activity < cutoff, archivable).order_by(
+                    models.Conversations.id).limit(batch_size).all()
+            if not rows:
+                break
+            records = [jsonable_encoder({
+                "id": row.id,
+                "config_id": row.config_id,
+                "messages": row.messages,
+                "status": row.status,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+                "session_id": row.session_id,
+                "current_order": row.current_order,
+                "verdicts": row.verdicts,
+            }) for row in rows]
+            ids = [record["id"] for record in records]
+            conversation_archive.append(records)
+            try:
+                db.execute(delete(models.Conversations).where(
+                    models.Conversations.id.in_(ids)))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            db.expunge_all()
+            archived += len(rows)
+            batches += 1
+            print(f"[Archive] Archived batch {batches}: {len(rows)} conversations "
+                  f"(ids {ids[0]}-{ids[-1]})")
+
+    elapsed = time.perf_counter() - started
+    print(f"[Archive] Archived {archived} conversations older than "
+          f"{older_than_days:g} days in {elapsed:.1f}s")
+    return {"archived": archived, "batches": batches, "cutoff": cutoff.isoformat(),
+            "seconds": round(elapsed, 3)}
+
+
+conversation_archive = ConversationArchive(ARCHIVE_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archive old conversations to cold storage")
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        archive_conversations(db, args.older_than_days, args.batch_size)
+    finally:
+        db.close()
@@ -0,0 +1,107 @@
+"""
+Batch classification for prompt evaluation.
+
+classify_batch() runs many classifications through the same path as
+/openai/chat (verdict cache, single-flight, hedging) with at most
+`concurrency` in flight, and yields each result as soon as it finishes.
+
+Upstream calls from all batches share one token bucket
+(CLASSIFIER_BATCH_RATE per second) so an evaluation run cannot use up the
+OpenAI quota that live visitors need. Cached verdicts skip the bucket.
+
+Batches never take the local pre-classifier's verdicts: an evaluation has to
+measure the model on the prompt under test, not the lexicon.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from . import classifier
+from .ratelimit import RateLimitRule, TokenBucket
+
+BATCH_MAX_ITEMS = int(os.getenv("CLASSIFIER_BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("CLASSIFIER_BATCH_CONCURRENCY", "8"))
+BATCH_RATE = float(os.getenv("CLASSIFIER_BATCH_RATE", "5"))
+
+
+@dataclass
+class BatchItem:
+    index: int
+    id: Optional[str]
+    flow_id: Optional[int]
+    system_prompt: str
+    agent_question: str
+    user_message: str
+
+
+class UpstreamBudget:
+    """Token bucket shared by every batch, awaited before each upstream call"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rule = RateLimitRule(rate=rate, burst=burst)
+        self._bucket = TokenBucket(burst, time.monotonic())
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                allowed, retry_after = self._bucket.take(self.rule, time.monotonic())
+                if allowed:
+                    return
+                self.waited_seconds += retry_after
+                await asyncio.sleep(retry_after)
+
+
+upstream_budget = UpstreamBudget(BATCH_RATE, burst=BATCH_MAX_CONCURRENCY)
+
+
+async def _classify_one(api_key: str, item: BatchItem) -> dict:
+    started = time.perf_counter()
+    result = {"index": item.index, "id": item.id, "flow_id": item.flow_id}
+    try:
+        verdict = classifier.cached_classification(item.system_prompt, item.agent_question,
+                                                   item.user_message, item.flow_id)
+        if verdict is None:
+            await upstream_budget.acquire()
+            verdict = await classifier.classify_async(api_key, item.system_prompt,
+                                                      item.agent_question, item.user_message,
+                                                      flow_id=item.flow_id, use_local=False)
+        result.update(verdict)
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def classify_batch(api_key: str, items: list, concurrency: int) -> AsyncIterator[dict]:
+    """Yield one result per item in completion order, then a summary"""
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker(item: BatchItem):
+        async with semaphore:
+            await results.put(await _classify_one(api_key, item))
+
+    tasks = [asyncio.create_task(worker(item)) for item in items]
+    counts = {"pass": 0, "fail": 0, "error": 0, "cached": 0}
+    try:
+        for _ in range(len(items)):
+            result = await results.get()
+            if "error" in result:
+                counts["error"] += 1
+            else:
+                counts[result["status"]] += 1
+                counts["cached"] += bool(result.get("cached"))
+            yield result
+    finally:
+        # Client went away mid-stream: stop issuing upstream calls
+        for task in tasks:
+            task.cancel()
+
+    seconds = time.perf_counter() - started
+    print(f"[API] Batch of {len(items)} classified in {seconds:.1f}s: {counts}")
+    yield {"done": True, "total": len(items), **counts, "seconds": round(seconds, 3)}
@@ -0,0 +1,507 @@
+"""
+Cache shared by all uvicorn workers, with cross-worker invalidation.
+
+Lookups go through a short-lived per-process tier (L1) and then a shared backend
+(L2) selected by CACHE_BACKEND:
+
+- memory: process-local only, the default for a single worker
+- sqlite: a WAL-mode SQLite file shared by the workers on one host
+  (CACHE_SQLITE_PATH)
+- redis: any Redis-compatible server (CACHE_REDIS_URL); needs the optional
+  `redis` package
+
+Writes call invalidate(), which deletes the key from L2 and broadcasts it on the
+bus selected by CACHE_BUS so every worker drops its L1 copy:
+
+- local: in-process only
+- postgres: LISTEN/NOTIFY on the application database
+- redis: Redis pub/sub on CACHE_REDIS_URL
+
+With the local bus another worker's copy is only dropped when it expires, so
+entries then default to a short lifetime (LOCAL_BUS_TTL_SECONDS) instead of
+CACHE_TTL_SECONDS; set CACHE_BUS for multi-worker deployments.
+
+Every eviction bumps a per-key generation. get_or_load() notes the generation
+before calling the loader and does not store the result if the key was
+invalidated meanwhile, so a slow load cannot write a stale value back.
+
+Values handed out are copies; callers may modify them without changing the
+cached entry.
+"""
+import json
+import os
+import select
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from .compression import EncodedPayload, encode_json
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for the redis backend/bus
+    redis = None
+
+CACHE_CHANNEL = "cache_invalidation"
+LOCAL_BUS_TTL_SECONDS = "5"
+
+
+class CacheBackend(ABC):
+    """Key/value store for JSON-encoded strings with per-key TTL"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: float):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def close(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries: int = 10_000):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self.max_entries = max_entries
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict_expired()
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
+
+
+class SQLiteCache(CacheBackend):
+    """Host-local shared cache; one connection per thread against a WAL database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                     "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl))
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        self._conn().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+
+class RedisCache(CacheBackend):
+    def __init__(self, url: str, prefix: str = "aim:"):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        # RESP2 keeps us compatible with older and non-Redis servers speaking the protocol
+        self.client = redis.Redis.from_url(url, decode_responses=True, protocol=2,
+                                           socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def close(self):
+        self.client.close()
+
+
+class InvalidationBus(ABC):
+    """Broadcasts invalidated keys to every worker, including the publisher"""
+
+    def __init__(self):
+        self._callback: Optional[Callable[[str], None]] = None
+
+    def start(self, callback: Callable[[str], None]):
+        self._callback = callback
+
+    @abstractmethod
+    def publish(self, key: str):
+        ...
+
+    def stop(self):
+        pass
+
+    def _deliver(self, key: str):
+        if self._callback is not None:
+            self._callback(key)
+
+
+class LocalBus(InvalidationBus):
+    def publish(self, key: str):
+        self._deliver(key)
+
+
+class PostgresNotifyBus(InvalidationBus):
+    """LISTEN/NOTIFY on a dedicated autocommit connection, read by a daemon thread"""
+
+    def __init__(self, dsn: str, channel: str = CACHE_CHANNEL):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._publish_lock = threading.Lock()
+        self._publish_conn = None
+
+    def _connect(self):
+        import psycopg2
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def start(self, callback: Callable[[str], None]):
+        super().start(callback)
+        self._thread = threading.Thread(target=self._listen, name="cache-listen", daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                print(f"[Cache] Listening for invalidations on {self.channel}")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(conn.notifies.pop(0).payload)
+                conn.close()
+            except Exception as e:
+                print(f"[Cache] Invalidation listener error, reconnecting: {e}")
+                self._stop.wait(1.0)
+
+    def publish(self, key: str):
+        # Evict locally right away; the NOTIFY echo will repeat it harmlessly
+        self._deliver(key)
+        with self._publish_lock:
+            try:
+                if self._publish_conn is None or self._publish_conn.closed:
+                    self._publish_conn = self._connect()
+                with self._publish_conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, key))
+            except Exception as e:
+                print(f"[Cache] Failed to publish invalidation for {key}: {e}")
+                self._publish_conn = None
+
+    def stop(self):
+        self._stop.set()
+        if self._publish_conn is not None:
+            self._publish_conn.close()
+
+
+class RedisBus(InvalidationBus):
+    def __init__(self, url: str, channel: str = CACHE_CHANNEL):
+        super().__init__()
+        if redis is None:
+            raise RuntimeError("CACHE_BUS=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url, decode_responses=True, protocol=2)
+        self.channel = channel
+        self._pubsub = None
+        self._thread = None
+
+    def start(self, callback: Callable[[str], None]):
+        super().start(callback)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: lambda message: self._deliver(message["data"])})
+        self._thread = self._pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+
+    def publish(self, key: str):
+        self._deliver(key)
+        try:
+            self.client.publish(self.channel, key)
+        except Exception as e:
+            print(f"[Cache] Failed to publish invalidation for {key}: {e}")
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread.join(timeout=2)
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+
+class SharedCache:
+    """Two-tier JSON cache: per-process L1 in front of a shared L2 backend"""
+
+    def __init__(self, backend: CacheBackend, bus: InvalidationBus,
+                 ttl: float = 300.0, l1_ttl: float = 30.0):
+        self.backend = backend
+        self.bus = bus
+        self.ttl = ttl
+        self.l1_ttl = l1_ttl
+        # The memory backend is already process-local, so it doubles as L1
+        self.l1 = backend if isinstance(backend, MemoryCache) else MemoryCache()
+        self.hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+        self.stale_loads = 0
+        self._generations: Dict[str, int] = {}
+        self._generation_lock = threading.Lock()
+
+    def start(self):
+        self.bus.start(self._evict_local)
+
+    def stop(self):
+        self.bus.stop()
+        self.backend.close()
+
+    def _evict_local(self, key: str):
+        with self._generation_lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self.l1.delete(key)
+        self.l1.delete(_encoded_key(key))
+
+    def generation(self, key: str) -> int:
+        """Number of evictions of `key` so far, local or from the bus"""
+        with self._generation_lock:
+            return self._generations.get(key, 0)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None:
+            self.hits += 1
+            return _copy(value)
+        if self.l1 is not self.backend:
+            try:
+                raw = self.backend.get(key)
+            except Exception as e:
+                self.errors += 1
+                print(f"[Cache] Backend read failed for {key}: {e}")
+                raw = None
+            if raw is not None:
+                self.l2_hits += 1
+                value = json.loads(raw)
+                self.l1.set(key, value, self.l1_ttl)
+                return _copy(value)
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None,
+            generation: Optional[int] = None) -> bool:
+        """Store a value; with `generation`, only if the key was not evicted since"""
+        if generation is not None and self.generation(key) != generation:
+            self.stale_loads += 1
+            return False
+        value = jsonable_encoder(value)
+        ttl = ttl or self.ttl
+        if self.l1 is not self.backend:
+            try:
+                self.backend.set(key, json.dumps(value), ttl)
+            except Exception as e:
+                self.errors += 1
+                print(f"[Cache] Backend write failed for {key}: {e}")
+        self.l1.set(key, value, min(ttl, self.l1_ttl) if self.l1 is not self.backend else ttl)
+        if generation is not None and self.generation(key) != generation:
+            # Invalidated while we were writing; undo rather than leave the old value
+            self._evict_local(key)
+            self._delete_shared(key)
+            self.stale_loads += 1
+            return False
+        return True
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None):
+        """Return the cached value or call loader, caching anything that is not None"""
+        value = self.get(key)
+        if value is None:
+            generation = self.generation(key)
+            value = loader()
+            if value is not None:
+                value = jsonable_encoder(value)
+                self.set(key, value, ttl, generation)
+                value = _copy(value)
+        return value
+
+    def get_or_load_encoded(self, key: str, loader: Callable[[], Any],
+                            ttl: Optional[float] = None) -> Optional[EncodedPayload]:
+        """Like get_or_load, but returns the serialized body and its compressed variants.
+
+        The payload is kept in this worker's L1 next to the value and dropped with it
+        on invalidation, so each encoding is compressed once per entry, not per request.
+        """
+        payload = self.l1.get(_encoded_key(key))
+        if payload is not None:
+            return payload
+        generation = self.generation(key)
+        value = self.get_or_load(key, loader, ttl)
+        if value is None:
+            return None
+        payload = EncodedPayload(encode_json(value))
+        local_ttl = ttl or self.ttl
+        if self.l1 is not self.backend:
+            local_ttl = min(local_ttl, self.l1_ttl)
+        if self.generation(key) == generation:
+            self.l1.set(_encoded_key(key), payload, local_ttl)
+        return payload
+
+    def invalidate(self, *keys: str):
+        """Delete keys everywhere and tell the other workers to drop their copies"""
+        for key in keys:
+            self.invalidations += 1
+            self._evict_local(key)
+            self._delete_shared(key)
+            self.bus.publish(key)
+        print(f"[Cache] Invalidated {', '.join(keys)}")
+
+    def _delete_shared(self, key: str):
+        if self.l1 is self.backend:
+            return
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            self.errors += 1
+            print(f"[Cache] Backend delete failed for {key}: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.l2_hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "bus": type(self.bus).__name__,
+            "l1_hits": self.hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.l2_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_loads": self.stale_loads,
+            "errors": self.errors,
+            "ttl": self.ttl,
+            "l1_ttl": self.l1_ttl,
+        }
+
+
+# Key helpers, so writers and readers agree on names
+def config_key(config_id) -> str:
+    return f"config:{config_id}"
+
+
+def flows_key(config_id: int) -> str:
+    return f"flows:{config_id}"
+
+
+def bundle_key(config_id: int) -> str:
+    return f"bundle:{config_id}"
+
+
+def config_keys(config_id: int) -> List[str]:
+    """Everything derived from one configuration row"""
+    return [config_key(config_id), config_key("active"), bundle_key(config_id)]
+
+
+def flow_keys(config_id: int) -> List[str]:
+    """Everything derived from one configuration's flow steps"""
+    return [flows_key(config_id), bundle_key(config_id)]
+
+
+def _encoded_key(key: str) -> str:
+    return f"{key}#encoded"
+
+
+def _copy(value: Any) -> Any:
+    """Copy of a JSON-shaped value, so callers cannot change the cached one"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _database_dsn() -> str:
+    from .database import SQLALCHEMY_DATABASE_URL
+    return SQLALCHEMY_DATABASE_URL.replace("postgresql+psycopg2://", "postgresql://", 1)
+
+
+def _build_from_env() -> SharedCache:
+    backend_name = os.getenv("CACHE_BACKEND", "memory").lower()
+    bus_name = os.getenv("CACHE_BUS", "local").lower()
+    redis_url = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    if backend_name == "sqlite":
+        backend = SQLiteCache(os.getenv("CACHE_SQLITE_PATH", "/tmp/aimastermind-cache.sqlite3"))
+    elif backend_name == "redis":
+        backend = RedisCache(redis_url)
+    else:
+        backend = MemoryCache()
+
+    if bus_name == "postgres":
+        bus = PostgresNotifyBus(_database_dsn())
+    elif bus_name == "redis":
+        bus = RedisBus(redis_url)
+    else:
+        bus = LocalBus()
+
+    # Without a bus, other workers' copies only go away when they expire
+    local_bus = isinstance(bus, LocalBus)
+    ttl_default = LOCAL_BUS_TTL_SECONDS if local_bus and isinstance(backend, MemoryCache) else "300"
+    return SharedCache(backend, bus,
+                       ttl=float(os.getenv("CACHE_TTL_SECONDS", ttl_default)),
+                       l1_ttl=float(os.getenv("CACHE_L1_TTL_SECONDS",
+                                              LOCAL_BUS_TTL_SECONDS if local_bus else "30")))
+
+
+shared_cache = _build_from_env()
@@ -0,0 +1,688 @@
+"""
+PASS/FAIL classification of visitor answers through OpenAI.
+
+Both /openai/chat and /chat go through classify(). Concurrent requests for the
+same (system prompt, question, answer) are coalesced by a single-flight group:
+the first caller makes the upstream call and every caller that arrives while it
+is in flight waits for, and receives, the same verdict.
+
+Which model answers is decided by a ClassificationPolicy. The default policy
+comes from the CLASSIFIER_* environment variables and CLASSIFIER_POLICY can
+override it per flow step, e.g.
+
+    CLASSIFIER_POLICY='{"steps": {"10": {"primary_model": "gpt-4o-mini"}}}'
+
+When the primary model has not produced a verdict within hedge_after_ms, the
+same request is also sent to fallback_model and the first valid PASS/FAIL wins.
+
+Valid verdicts are kept in the shared cache for CLASSIFIER_VERDICT_TTL seconds,
+so a repeated answer is served without calling OpenAI at all.
+
+Steps whose rubric is a plain positive/negative/uncertain mapping are first
+scored by the local pre-classifier (local_classifier.py). The default local_mode
+"shadow" only records the local guess against the model's verdict; "auto"
+decides an answer scoring at least local_threshold locally in microseconds and
+sends everything else to OpenAI; "off" skips it. Switch a step to "auto" only
+once its agreement rates support it. A sample (CLASSIFIER_LOCAL_AUDIT_RATE) of
+local decisions is re-checked by the model in the background, and the agreement
+rates are reported in get_stats().
+
+A circuit breaker opens after CLASSIFIER_BREAKER_FAILURES consecutive upstream
+errors or timeouts. While it is open (CLASSIFIER_BREAKER_COOLDOWN_SECONDS, then
+one trial request) answers get the local verdict whatever its confidence,
+marked "degraded"; steps without a yes/no rubric fail fast with CircuitOpenError.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import asdict, dataclass, fields, replace
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from . import local_classifier, tracing
+from .cache import shared_cache
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+VALID_VERDICTS = ("PASS", "FAIL")
+VERDICT_TTL = float(os.getenv("CLASSIFIER_VERDICT_TTL", str(24 * 3600)))
+LOCAL_AUDIT_RATE = float(os.getenv("CLASSIFIER_LOCAL_AUDIT_RATE", "0.05"))
+BREAKER_FAILURES = int(os.getenv("CLASSIFIER_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("CLASSIFIER_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+@dataclass(frozen=True)
+class ClassificationPolicy:
+    primary_model: str = "gpt-4"
+    fallback_model: Optional[str] = "gpt-4o-mini"  # None disables hedging
+    hedge_after_ms: int = 2500
+    max_tokens: int = 3  # PASS/FAIL is a single token; leave room for stray whitespace
+    timeout: float = 25.0  # seconds, overall budget for a classification
+    local_mode: str = "shadow"  # "auto", "shadow" or "off"
+    local_threshold: float = 0.9  # local confidence needed to skip the model
+
+    def override(self, values: dict) -> "ClassificationPolicy":
+        known = {f.name for f in fields(self)}
+        return replace(self, **{k: v for k, v in values.items() if k in known})
+
+
+def _policy_from_env() -> Tuple[ClassificationPolicy, Dict[str, ClassificationPolicy]]:
+    default = ClassificationPolicy(
+        primary_model=os.getenv("CLASSIFIER_MODEL", "gpt-4"),
+        fallback_model=os.getenv("CLASSIFIER_FALLBACK_MODEL", "gpt-4o-mini") or None,
+        hedge_after_ms=int(os.getenv("CLASSIFIER_HEDGE_AFTER_MS", "2500")),
+        max_tokens=int(os.getenv("CLASSIFIER_MAX_TOKENS", "3")),
+        timeout=float(os.getenv("CLASSIFIER_TIMEOUT", "25")),
+        local_mode=os.getenv("CLASSIFIER_LOCAL_MODE", "shadow"),
+        local_threshold=float(os.getenv("CLASSIFIER_LOCAL_THRESHOLD", "0.9")),
+    )
+    raw = os.getenv("CLASSIFIER_POLICY")
+    if not raw:
+        return default, {}
+    try:
+        config = json.loads(raw)
+    except ValueError as e:
+        print(f"[Classifier] Ignoring invalid CLASSIFIER_POLICY: {e}")
+        return default, {}
+    default = default.override(config.get("default", {}))
+    steps = {str(flow_id): default.override(values)
+             for flow_id, values in config.get("steps", {}).items()}
+    return default, steps
+
+
+default_policy, step_policies = _policy_from_env()
+
+
+def policy_for(flow_id: Optional[int]) -> ClassificationPolicy:
+    """Policy for a flow step, falling back to the default tier"""
+    if flow_id is None:
+        return default_policy
+    return step_policies.get(str(flow_id), default_policy)
+
+
+class ModelStats:
+    """Latency and outcome counters for one model"""
+
+    def __init__(self, window: int = 1024):
+        self.calls = 0
+        self.errors = 0
+        self.invalid = 0
+        self.wins = 0
+        self.latencies_ms = deque(maxlen=window)
+
+    def summary(self) -> dict:
+        values = sorted(self.latencies_ms)
+
+        def pct(p):
+            return round(values[min(len(values) - 1, int(p / 100 * len(values)))], 1) if values else 0.0
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "invalid": self.invalid,
+            "wins": self.wins,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+        }
+
+
+class TieringStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models: Dict[str, ModelStats] = {}
+        self.classifications = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        # Pairs where both primary and fallback produced a valid verdict
+        self.compared = 0
+        self.agreed = 0
+
+    def model(self, name: str) -> ModelStats:
+        stats = self.models.get(name)
+        if stats is None:
+            stats = self.models[name] = ModelStats()
+        return stats
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "classifications": self.classifications,
+                "hedges_fired": self.hedges_fired,
+                "hedge_wins": self.hedge_wins,
+                "agreement": {
+                    "compared": self.compared,
+                    "agreed": self.agreed,
+                    "rate": round(self.agreed / self.compared, 4) if self.compared else None,
+                },
+                "models": {name: stats.summary() for name, stats in sorted(self.models.items())},
+            }
+
+
+tiering_stats = TieringStats()
+
+
+class CircuitOpenError(RuntimeError):
+    """OpenAI is failing and the step has no local verdict to fall back on"""
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive upstream errors; lets one trial through per cooldown"""
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a request may go upstream now"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print("[Classifier] Upstream recovered, closing circuit")
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial_in_flight or (self._opened_at is None
+                                         and self._consecutive >= self.failures):
+                if self._opened_at is None:
+                    self.trips += 1
+                    print(f"[Classifier] {self._consecutive} consecutive upstream failures, "
+                          f"opening circuit for {self.cooldown:.0f}s")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive,
+                "failure_threshold": self.failures,
+                "cooldown_seconds": self.cooldown,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+
+
+class LocalStats:
+    """How often the local pre-classifier decides, and how often the model agrees"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.decided = 0
+        self.deferred = 0
+        self.degraded = 0
+        self.audits = 0
+        # "decided": audited local decisions; "deferred": below-threshold guesses
+        self.agreement = {"decided": [0, 0], "deferred": [0, 0]}
+        self.by_confidence: Dict[str, list] = {}
+
+    def record_agreement(self, kind: str, local: "local_classifier.LocalVerdict", verdict: str):
+        bucket = f"{min(0.9, int(local.confidence * 10) / 10):.1f}"
+        agreed = local.verdict == verdict
+        with self.lock:
+            for counts in (self.agreement[kind], self.by_confidence.setdefault(bucket, [0, 0])):
+                counts[0] += 1
+                counts[1] += agreed
+
+    def summary(self) -> dict:
+        def rate(counts):
+            return {"compared": counts[0], "agreed": counts[1],
+                    "rate": round(counts[1] / counts[0], 4) if counts[0] else None}
+
+        with self.lock:
+            return {
+                "decided": self.decided,
+                "deferred": self.deferred,
+                "degraded": self.degraded,
+                "audits": self.audits,
+                "agreement": {kind: rate(counts) for kind, counts in self.agreement.items()},
+                "agreement_by_confidence": {bucket: rate(counts) for bucket, counts
+                                            in sorted(self.by_confidence.items())},
+            }
+
+
+local_stats = LocalStats()
+
+# Model calls run here so a hedge can start while the primary is still waiting
+_model_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CLASSIFIER_MAX_WORKERS", "32")),
+    thread_name_prefix="classifier")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self.max_waiters = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Return the in-flight future for key and whether the caller leads it"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced_calls += 1
+                self._waiters[key] += 1
+                self.max_waiters = max(self.max_waiters, self._waiters[key])
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._waiters[key] = 0
+            self.upstream_calls += 1
+            return future, True
+
+    def _run(self, key: str, future: Future, fn: Callable):
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self._waiters.pop(key, None)
+
+    def do(self, key: str, fn: Callable):
+        """Run fn once for all concurrent callers with the same key (blocking)"""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result()
+
+    async def do_async(self, key: str, fn: Callable):
+        """Async variant; fn runs in the threadpool and followers hold no thread"""
+        future, leader = self._join(key)
+        if leader:
+            await run_in_threadpool(self._run, key, future, fn)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        total = self.upstream_calls + self.coalesced_calls
+        return {
+            "requests": total,
+            "upstream_calls": self.upstream_calls,
+            "upstream_calls_saved": self.coalesced_calls,
+            "saved_ratio": round(self.coalesced_calls / total, 4) if total else 0.0,
+            "in_flight": in_flight,
+            "max_waiters": self.max_waiters,
+        }
+
+
+single_flight = SingleFlight()
+
+_clients: Dict[str, "OpenAI"] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(api_key: str) -> "OpenAI":
+    """Reuse one OpenAI client (and its connection pool) per API key"""
+    # The SDK is slow to import; load it on the first classification
+    from openai import OpenAI
+
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            print("[API] Creating OpenAI client")
+            client = _clients[api_key] = OpenAI(api_key=api_key)
+        return client
+
+
+def _normalize_answer(user_message: str) -> str:
+    return " ".join(user_message.split()).casefold()
+
+
+def classification_key(policy: ClassificationPolicy, system_prompt: str,
+                       agent_question: str, user_message: str) -> str:
+    """Stable key for a classification; answers differing only in case/whitespace collide"""
+    raw = "\x1f".join((policy.primary_model, system_prompt, agent_question,
+                       _normalize_answer(user_message)))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _call_model(api_key: str, model: str, policy: ClassificationPolicy,
+                system_prompt: str, agent_question: str, user_message: str) -> str:
+    """One chat completion; returns the raw text and records latency for the model"""
+    print(f"[API] Sending request to OpenAI ({model})")
+    started = time.perf_counter()
+    try:
+        with tracing.span("openai.chat.completions", kind="client",
+                          **{"gen_ai.request.model": model}):
+            response = _get_client(api_key).chat.completions.create(
+                model=model,
+                messages=[{
+                    "role": "system",
+                    "content": system_prompt
+                }, {
+                    "role": "assistant",
+                    "content": agent_question
+                }, {
+                    "role": "user",
+                    "content": user_message
+                }],
+                max_tokens=policy.max_tokens,
+                timeout=policy.timeout
+            )
+    except Exception:
+        with tiering_stats.lock:
+            stats = tiering_stats.model(model)
+            stats.calls += 1
+            stats.errors += 1
+        raise
+
+    ai_response = response.choices[0].message.content or ""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with tiering_stats.lock:
+        stats = tiering_stats.model(model)
+        stats.calls += 1
+        stats.latencies_ms.append(elapsed_ms)
+        if ai_response.strip() not in VALID_VERDICTS:
+            stats.invalid += 1
+    print(f"[API] OpenAI response received from {model} in {elapsed_ms:.0f}ms: {ai_response}")
+    return ai_response
+
+
+def _record_agreement(primary: Future, fallback: Future):
+    """Once both tiers have answered, count whether their verdicts agree"""
+    counted = threading.Event()
+
+    def check(_):
+        with tiering_stats.lock:
+            if counted.is_set() or not (primary.done() and fallback.done()):
+                return
+            counted.set()
+        if primary.exception() or fallback.exception():
+            return
+        a, b = primary.result().strip(), fallback.result().strip()
+        if a in VALID_VERDICTS and b in VALID_VERDICTS:
+            with tiering_stats.lock:
+                tiering_stats.compared += 1
+                tiering_stats.agreed += a == b
+
+    primary.add_done_callback(check)
+    fallback.add_done_callback(check)
+
+
+def _classify_upstream(api_key: str, policy: ClassificationPolicy, system_prompt: str,
+                       agent_question: str, user_message: str) -> dict:
+    """Ask the primary model, hedging to the fallback once the latency budget is spent"""
+    with tiering_stats.lock:
+        tiering_stats.classifications += 1
+    request = (policy, system_prompt, agent_question, user_message)
+    deadline = time.monotonic() + policy.timeout
+
+    # copy_context() keeps the model calls inside the caller's trace
+    primary = _model_executor.submit(copy_context().run, _call_model, api_key,
+                                     policy.primary_model, *request)
+    pending = {primary: policy.primary_model}
+    fallback = None
+    wait([primary], timeout=policy.hedge_after_ms / 1000)
+
+    invalid_response = None
+    first_error = None
+    while pending:
+        # Fire the hedge if the primary is slow, failed, or answered with junk
+        primary_settled = primary.done() and (
+            primary.exception() is not None
+            or primary.result().strip() not in VALID_VERDICTS)
+        if fallback is None and policy.fallback_model and (not primary.done() or primary_settled):
+            print(f"[API] Hedging classification to {policy.fallback_model}")
+            fallback = _model_executor.submit(copy_context().run, _call_model, api_key,
+                                              policy.fallback_model, *request)
+            pending[fallback] = policy.fallback_model
+            _record_agreement(primary, fallback)
+            with tiering_stats.lock:
+                tiering_stats.hedges_fired += 1
+
+        done, _ = wait(list(pending), timeout=max(0.0, deadline - time.monotonic()),
+                       return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            model = pending.pop(future)
+            if future.exception() is not None:
+                first_error = first_error or future.exception()
+                continue
+            ai_response = future.result()
+            if ai_response.strip() in VALID_VERDICTS:
+                with tiering_stats.lock:
+                    tiering_stats.model(model).wins += 1
+                    if future is fallback:
+                        tiering_stats.hedge_wins += 1
+                status = "pass" if ai_response.strip() == "PASS" else "fail"
+                return {"status": status, "response": ai_response, "model": model}
+            invalid_response = invalid_response or (ai_response, model)
+
+    if invalid_response is not None:
+        # Same rule as before tiering: anything other than exactly PASS is a fail
+        ai_response, model = invalid_response
+        return {"status": "fail", "response": ai_response, "model": model}
+    if first_error is not None:
+        raise first_error
+    raise TimeoutError(f"No classification within {policy.timeout}s")
+
+
+def _cached_verdict(key: str) -> Optional[dict]:
+    result = shared_cache.get(f"verdict:{key}")
+    if result is not None:
+        print(f"[API] Verdict cache hit: {result['status']}")
+        return dict(result, cached=True)
+    return None
+
+
+def _store_verdict(key: str, result: dict):
+    if result["response"].strip() in VALID_VERDICTS:
+        shared_cache.set(f"verdict:{key}", result, VERDICT_TTL)
+
+
+def _local_verdict(policy: ClassificationPolicy, system_prompt: str,
+                   user_message: str) -> Optional[local_classifier.LocalVerdict]:
+    if policy.local_mode not in ("auto", "shadow"):
+        return None
+    return local_classifier.judge(system_prompt, user_message)
+
+
+def _local_result(verdict: str, confidence: float, degraded: bool = False) -> dict:
+    result = {"status": "pass" if verdict == "PASS" else "fail", "response": verdict,
+              "model": "local", "confidence": confidence}
+    if degraded:
+        result["degraded"] = True
+    return result
+
+
+def _audit(api_key: str, policy: ClassificationPolicy, request: tuple,
+           local: local_classifier.LocalVerdict):
+    """Ask the model about a locally decided answer and count whether it agrees"""
+    try:
+        result = _classify_upstream(api_key, policy, *request)
+    except Exception as e:
+        breaker.record_failure()
+        print(f"[Classifier] Audit of a local verdict failed: {e}")
+        return
+    breaker.record_success()
+    _store_verdict(classification_key(policy, *request), result)
+    with local_stats.lock:
+        local_stats.audits += 1
+    local_stats.record_agreement("decided", local, result["status"].upper())
+
+
+def _decide_locally(api_key: Optional[str], policy: ClassificationPolicy, request: tuple,
+                    local: Optional[local_classifier.LocalVerdict]) -> Optional[dict]:
+    """The local verdict when it clears the step's threshold, else None"""
+    if (local is None or local.verdict is None or not local.decidable
+            or policy.local_mode != "auto" or local.confidence < policy.local_threshold):
+        return None
+    with local_stats.lock:
+        local_stats.decided += 1
+    if api_key and random.random() < LOCAL_AUDIT_RATE and breaker.state == "closed":
+        _model_executor.submit(copy_context().run, _audit, api_key, policy, request, local)
+    print(f"[Classifier] Local verdict {local.verdict} ({local.polarity}, "
+          f"confidence {local.confidence})")
+    return _local_result(local.verdict, local.confidence)
+
+
+def _degraded(policy: ClassificationPolicy, system_prompt: str,
+              local: Optional[local_classifier.LocalVerdict]) -> Optional[dict]:
+    """Local verdict at any confidence while the circuit is open, or None if there is none"""
+    if policy.local_mode == "off":
+        return None
+    verdict = local.verdict if local is not None else None
+    if verdict is None:
+        # No lexicon signal counts as an uncertain answer
+        verdict = local_classifier.silent_verdict(system_prompt)
+    if verdict is None:
+        return None
+    with local_stats.lock:
+        local_stats.degraded += 1
+    print(f"[Classifier] Circuit open, serving degraded local verdict {verdict}")
+    return _local_result(verdict, local.confidence if local is not None else 0.0, degraded=True)
+
+
+def _upstream(api_key: str, policy: ClassificationPolicy, key: str, request: tuple,
+              local: Optional[local_classifier.LocalVerdict]) -> Callable[[], dict]:
+    """The single-flight body: classify through OpenAI behind the circuit breaker"""
+
+    def run():
+        if not breaker.allow():
+            result = _degraded(policy, request[0], local)
+            if result is None:
+                raise CircuitOpenError("OpenAI classification is unavailable and this step "
+                                       "has no yes/no rubric to fall back on")
+            return result
+        try:
+            result = _classify_upstream(api_key, policy, *request)
+        except Exception:
+            breaker.record_failure()
+            degraded = _degraded(policy, request[0], local) if breaker.is_open else None
+            if degraded is None:
+                raise
+            return degraded
+        breaker.record_success()
+        _store_verdict(key, result)
+        if local is not None:
+            with local_stats.lock:
+                local_stats.deferred += 1
+            if local.verdict is not None:
+                local_stats.record_agreement("deferred", local, result["status"].upper())
+        return result
+
+    return run
+
+
+def _flight_key(key: str, policy: ClassificationPolicy) -> str:
+    """Single-flight key; callers that may get a degraded local verdict never share with
+    model-only callers (local_mode "off", e.g. batch evaluation and replay)"""
+    return f"{key}:model" if policy.local_mode == "off" else key
+
+
+def cached_classification(system_prompt: str, agent_question: str, user_message: str,
+                          flow_id: Optional[int] = None) -> Optional[dict]:
+    """The cached model verdict for an answer, if any; never a local lexicon verdict"""
+    policy = policy_for(flow_id)
+    return _cached_verdict(classification_key(policy, system_prompt, agent_question,
+                                              user_message))
+
+
+def classify(api_key: str, system_prompt: str, agent_question: str, user_message: str,
+             flow_id: Optional[int] = None) -> dict:
+    """Classify an answer, sharing the upstream call with identical in-flight requests"""
+    policy = policy_for(flow_id)
+    request = (system_prompt, agent_question, user_message)
+    local = _local_verdict(policy, system_prompt, user_message)
+    decided = _decide_locally(api_key, policy, request, local)
+    if decided is not None:
+        return decided
+    key = classification_key(policy, *request)
+    cached = _cached_verdict(key)
+    if cached is not None:
+        return cached
+    return dict(single_flight.do(_flight_key(key, policy),
+                                 _upstream(api_key, policy, key, request, local)))
+
+
+async def classify_async(api_key: str, system_prompt: str, agent_question: str,
+                         user_message: str, flow_id: Optional[int] = None,
+                         use_local: bool = True) -> dict:
+    """Async variant of classify() for use from async endpoints
+
+    use_local=False runs the step with local_mode "off" (prompt evaluation and
+    replay): only the model decides, and the local stats are left untouched.
+    """
+    policy = policy_for(flow_id)
+    if not use_local:
+        policy = replace(policy, local_mode="off")
+    request = (system_prompt, agent_question, user_message)
+    local = _local_verdict(policy, system_prompt, user_message)
+    decided = _decide_locally(api_key, policy, request, local)
+    if decided is not None:
+        return decided
+    key = classification_key(policy, *request)
+    cached = _cached_verdict(key)
+    if cached is not None:
+        return cached
+    return dict(await single_flight.do_async(_flight_key(key, policy),
+                                             _upstream(api_key, policy, key, request, local)))
+
+
+def get_stats() -> dict:
+    return {
+        "single_flight": single_flight.stats(),
+        "tiering": tiering_stats.summary(),
+        "local": local_stats.summary(),
+        "breaker": breaker.summary(),
+        "policy": {
+            "default": asdict(default_policy),
+            "steps": {flow_id: asdict(p) for flow_id, p in step_policies.items()},
+        },
+    }
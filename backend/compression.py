@@ -0,0 +1,281 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+CompressionMiddleware compresses JSON, CSV and text responses of at least
+COMPRESS_MIN_BYTES with brotli (when the optional `brotli` package is installed)
+or gzip, whichever the client prefers. Bodies are buffered up to the minimum
+size; a body that keeps streaming past it is compressed chunk by chunk with a
+flush after each chunk, so streamed exports still arrive incrementally.
+Responses that already carry a Content-Encoding are passed through untouched.
+
+Cacheable payloads (e.g. the config bundle) are held as EncodedPayload objects
+next to their shared cache entry (SharedCache.get_or_load_encoded). Each
+encoding is compressed once, at the highest level, when first asked for and then
+served as stored bytes with an ETag until the cache entry is invalidated.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency; without it only gzip is offered
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() != "false"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "500"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+# Stored payloads are compressed once, so they can afford the slowest settings
+PAYLOAD_GZIP_LEVEL = 9
+PAYLOAD_BROTLI_QUALITY = 11
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Live progress streams (NDJSON batch results) must not wait for the minimum size
+NEVER_COMPRESS_TYPES = ("application/x-ndjson",)
+
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred supported encoding from an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    # Listed in preference order, so brotli wins ties
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY if level is None else level)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, COMPRESS_GZIP_LEVEL if level is None else level, mtime=0)
+
+
+class _StreamEncoder:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses: Dict[str, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.skipped_small = 0
+        self.payloads_built = 0
+        self.payload_variants_built = 0
+        self.payloads_served = 0
+        self.not_modified = 0
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int):
+        with self._lock:
+            self.responses[encoding] = self.responses.get(encoding, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": COMPRESSION_ENABLED,
+            "encodings": list(supported_encodings()),
+            "min_bytes": COMPRESS_MIN_BYTES,
+            "compressed_responses": dict(self.responses),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "skipped_small": self.skipped_small,
+            "payloads_built": self.payloads_built,
+            "payload_variants_built": self.payload_variants_built,
+            "payloads_served": self.payloads_served,
+            "not_modified": self.not_modified,
+        }
+
+
+stats = CompressionStats()
+
+
+class _Responder:
+    """Wraps `send` for one response, deciding whether and how to compress it"""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.passthrough = False
+        self.buffer = bytearray()
+        self.encoder: Optional[_StreamEncoder] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _eligible(self, headers: Headers, status_code: int) -> bool:
+        if status_code < 200 or status_code in (204, 206, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if content_type.startswith(NEVER_COMPRESS_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _encoded_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=list(self.start_message["headers"]))
+        self.start_message["headers"] = headers.raw
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            # A strong validator must differ between representations
+            headers["ETag"] = headers["etag"].rstrip('"') + f'-{self.encoding}"'
+        del headers["content-length"]
+        return headers
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._eligible(Headers(raw=message["headers"]),
+                                                  message["status"])
+            if self.passthrough:
+                await self.send(message)
+            return
+        if self.passthrough or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is not None:
+            await self._send_chunk(body, final=not more_body)
+            return
+
+        self.buffer.extend(body)
+        if not more_body:
+            await self._send_whole()
+        elif len(self.buffer) >= self.minimum_size:
+            # Still streaming past the threshold: commit to chunked compression
+            self._encoded_headers()
+            await self.send(self.start_message)
+            self.encoder = _StreamEncoder(self.encoding)
+            data, self.buffer = bytes(self.buffer), bytearray()
+            await self._send_chunk(data, final=False)
+
+    async def _send_whole(self):
+        data = bytes(self.buffer)
+        if len(data) < self.minimum_size:
+            stats.skipped_small += 1
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": data})
+            return
+        compressed = compress(data, self.encoding)
+        headers = self._encoded_headers()
+        headers["Content-Length"] = str(len(compressed))
+        stats.record(self.encoding, len(data), len(compressed))
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": compressed})
+
+    async def _send_chunk(self, data: bytes, final: bool):
+        out = self.encoder.chunk(data, final)
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        if final:
+            stats.record(self.encoding, self.bytes_in, self.bytes_out)
+        await self.send({"type": "http.response.body", "body": out, "more_body": not final})
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses per Accept-Encoding"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(send, encoding, self.minimum_size))
+
+
+def encode_json(value) -> bytes:
+    """Serialize the way JSONResponse does"""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class EncodedPayload:
+    """A serialized body with its compressed variants, built once per encoding"""
+    __slots__ = ("body", "digest", "media_type", "_variants")
+
+    def __init__(self, body: bytes, media_type: str = "application/json"):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.media_type = media_type
+        self._variants: Dict[str, bytes] = {}
+        stats.payloads_built += 1
+
+    def variant(self, encoding: str) -> bytes:
+        data = self._variants.get(encoding)
+        if data is None:
+            level = PAYLOAD_BROTLI_QUALITY if encoding == "br" else PAYLOAD_GZIP_LEVEL
+            data = self._variants[encoding] = compress(self.body, encoding, level)
+            stats.payload_variants_built += 1
+        return data
+
+    def response(self, request: Request) -> Response:
+        """Response for `request` using the stored bytes, or 304 if the ETag matches"""
+        encoding = None
+        if COMPRESSION_ENABLED and len(self.body) >= COMPRESS_MIN_BYTES:
+            encoding = negotiate(request.headers.get("accept-encoding"))
+        etag = f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if self.digest in request.headers.get("if-none-match", ""):
+            stats.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        stats.payloads_served += 1
+        if encoding is None:
+            return Response(self.body, media_type=self.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(self.variant(encoding), media_type=self.media_type, headers=headers)
@@ -1,11 +1,19 @@
 import os
-from sqlalchemy import create_engine, text
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+# Also loaded by backend/__init__.py; repeated so this module never depends on import order
 load_dotenv()
 
+from . import dbpool
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
@@ -14,26 +22,53 @@ if not SQLALCHEMY_DATABASE_URL:
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Create SQLAlchemy engine with proper PostgreSQL URL handling
+# Optional read replica for read-only routes (see get_read_db)
+SQLALCHEMY_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+if SQLALCHEMY_REPLICA_URL and SQLALCHEMY_REPLICA_URL.startswith("postgres://"):
+    SQLALCHEMY_REPLICA_URL = SQLALCHEMY_REPLICA_URL.replace("postgres://", "postgresql://", 1)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # Limit pool size for remote connections
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))  # Extra connections when pool is full
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "10"))
+# Seconds to wait for a replica connection (libpq connect_timeout) before giving up
+DB_REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "2"))
+
+# Create SQLAlchemy engine with proper PostgreSQL URL handling. The pool is
+# instrumented, and pre-ping can be traded for idle recycling (see dbpool.py)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  # Enable connection health checks
-    pool_size=5,  # Limit pool size for remote connections
-    max_overflow=10,  # Allow up to 10 connections when pool is full
+    **dbpool.pool_options("primary", DB_POOL_SIZE, DB_MAX_OVERFLOW),
     echo=True  # Enable SQL query logging
 )
+dbpool.instrument(engine, "primary", DB_POOL_SIZE, DB_MAX_OVERFLOW)
+
+# Reads are most of the traffic, so the replica pool is sized on its own
+read_engine = create_engine(
+    SQLALCHEMY_REPLICA_URL,
+    **dbpool.pool_options("replica", DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW),
+    connect_args=({"connect_timeout": DB_REPLICA_CONNECT_TIMEOUT}
+                  if SQLALCHEMY_REPLICA_URL.startswith("postgresql") else {}),
+    echo=True
+) if SQLALCHEMY_REPLICA_URL else None
+if read_engine is not None:
+    dbpool.instrument(read_engine, "replica", DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW)
 
-# Test database connection
-try:
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-        print("[Database] Successfully connected to the database")
-except Exception as e:
-    print("[Database] Error connecting to database:", str(e))
-    raise
+
+def check_connection():
+    """Open one connection to fail fast on a bad DATABASE_URL; run from the app lifespan"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            print("[Database] Successfully connected to the database")
+    except Exception as e:
+        print("[Database] Error connecting to database:", str(e))
+        raise
 
 # Configure session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False,
+                                bind=read_engine) if read_engine is not None else None
 
 # Create declarative base class
 Base = declarative_base()
@@ -41,6 +76,174 @@ Base = declarative_base()
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class ReplicaRouter:
+    """
+    Decides whether a read may go to the replica.
+
+    Reads fall back to the primary when no replica is configured, when the last
+    health probe failed or measured more than max_lag seconds of replication
+    lag, and for `sticky_seconds` after the same client committed a write, so
+    visitors always read their own writes. Stickiness is tracked per worker.
+
+    The probe runs on a background thread, at most one at a time; requests only
+    read its last result and never wait on the replica themselves.
+    """
+
+    def __init__(self, replica, max_lag: float, sticky_seconds: float, check_interval: float):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._sticky: Dict[str, float] = {}
+        self._checked_at = 0.0
+        self._probing = False
+        self.healthy = replica is not None
+        self.lag: Optional[float] = None
+        self.reads = {"replica": 0, "primary": 0}
+
+    def mark_write(self, client: str):
+        with self._lock:
+            now = time.monotonic()
+            self._sticky[client] = now + self.sticky_seconds
+            if len(self._sticky) > 10_000:
+                self._sticky = {k: v for k, v in self._sticky.items() if v > now}
+
+    def is_sticky(self, client: str) -> bool:
+        with self._lock:
+            until = self._sticky.get(client)
+            return until is not None and until > time.monotonic()
+
+    def mark_down(self, reason: str):
+        with self._lock:
+            if self.healthy:
+                print(f"[Database] Replica marked down: {reason}")
+            self.healthy = False
+            self._checked_at = time.monotonic()
+
+    def _measure_lag(self) -> float:
+        with self.replica.connect() as conn:
+            if self.replica.dialect.name != "postgresql":
+                conn.execute(text("SELECT 1"))
+                return 0.0
+            # NULL when the server is not a streaming standby, e.g. a second test database
+            lag = conn.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )).scalar()
+            return float(lag or 0.0)
+
+    def _probe(self):
+        try:
+            lag = self._measure_lag()
+        except Exception as e:
+            with self._lock:
+                self.lag = None
+            self.mark_down(str(e).splitlines()[0])
+            return
+        with self._lock:
+            self.lag = lag
+            was_healthy = self.healthy
+            self.healthy = lag <= self.max_lag
+            self._checked_at = time.monotonic()
+        if self.healthy != was_healthy:
+            state = "healthy" if self.healthy else f"lagging {lag:.1f}s"
+            print(f"[Database] Replica is {state}")
+
+    def _run_probe(self):
+        try:
+            self._probe()
+        finally:
+            with self._lock:
+                self._probing = False
+
+    def _probe_if_due(self):
+        """Start a background probe when the last one is check_interval old and none is running"""
+        with self._lock:
+            if self._probing or time.monotonic() - self._checked_at < self.check_interval:
+                return
+            self._probing = True
+        threading.Thread(target=self._run_probe, name="replica-probe", daemon=True).start()
+
+    def use_replica(self, client: str) -> bool:
+        if self.replica is None:
+            return False
+        self._probe_if_due()
+        with self._lock:
+            until = self._sticky.get(client)
+            use = self.healthy and not (until is not None and until > time.monotonic())
+            self.reads["replica" if use else "primary"] += 1
+        return use
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            healthy, lag, reads = self.healthy, self.lag, dict(self.reads)
+            sticky = sum(1 for v in self._sticky.values() if v > now)
+        return {
+            "replica_configured": self.replica is not None,
+            "replica_healthy": healthy,
+            "replica_lag_seconds": lag,
+            "sticky_clients": sticky,
+            "reads": reads,
+            "pools": {
+                "primary": engine.pool.status(),
+                "replica": self.replica.pool.status() if self.replica is not None else None,
+            },
+        }
+
+
+replica_router = ReplicaRouter(
+    read_engine,
+    max_lag=float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5")),
+    sticky_seconds=float(os.getenv("DB_STICKY_SECONDS", "5")),
+    check_interval=float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5")),
+)
+
+if read_engine is not None:
+    @event.listens_for(read_engine, "handle_error")
+    def _replica_error(context):
+        if context.is_disconnect or context.connection is None:
+            replica_router.mark_down(str(context.original_exception).splitlines()[0])
+
+
+def _client_key(request: Request) -> str:
+    """Stickiness key set by the request layer (main.tag_client), else the socket address"""
+    key = getattr(request.state, "client_key", None)
+    if key is None:
+        key = request.client.host if request.client else "unknown"
+    return key
+
+
+def get_write_db(request: Request):
+    """Primary session; a commit makes this client's reads sticky to the primary"""
+    db = SessionLocal()
+    db.info["client"] = _client_key(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _mark_client_write(session):
+    client = session.info.get("client")
+    if client is not None:
+        replica_router.mark_write(client)
+
+
+def get_read_db(request: Request):
+    """Session for read-only routes: the replica when healthy and not sticky, else the primary"""
+    if replica_router.use_replica(_client_key(request)):
+        db = ReadSessionLocal()
+    else:
+        db = SessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,334 @@
+"""
+Connection-pool instrumentation and adaptive sizing.
+
+Both engines in database.py use InstrumentedQueuePool, a QueuePool that records:
+
+- a checkout latency histogram (queue wait, connect and any pre-ping), plus slow
+  checkouts (over DB_POOL_TARGET_WAIT_MS) and pool timeouts;
+- in-use / idle / overflow gauges and the peak in use;
+- how long each checkout is held, tagged with the route that holds it. The
+  route comes from RouteLabelMiddleware (e.g. "GET /configs/2/bundle") and,
+  outside requests, from the thread name (e.g. "session-flusher"). Holds longer
+  than DB_LONG_HOLD_MS are logged and counted per route; the ones still open
+  are listed live in GET /db/pool/stats.
+
+Pre-ping costs a round trip per checkout. Setting DB_POOL_IDLE_RECYCLE_SECONDS
+replaces it: a connection idle in the pool for longer than that is reconnected
+at checkout instead of being pinged, so only connections old enough to have
+been dropped by the server or a proxy pay for a new connection.
+
+With DB_POOL_ADAPTIVE=true, PoolMonitor resizes each pool every
+DB_POOL_ADAPT_INTERVAL_SECONDS between DB_POOL_MIN and DB_POOL_MAX total
+connections: it grows when checkouts had to wait with every connection in use,
+and shrinks by one when the peak in use stayed under half the capacity. The
+pool keeps `min` connections warm; the rest is overflow, closed on return.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+DB_POOL_IDLE_RECYCLE = float(os.getenv("DB_POOL_IDLE_RECYCLE_SECONDS", "0"))
+# Idle recycling replaces pre-ping unless pre-ping is asked for explicitly
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING",
+                             "false" if DB_POOL_IDLE_RECYCLE else "true").lower() != "false"
+DB_LONG_HOLD_MS = float(os.getenv("DB_LONG_HOLD_MS", "2000"))
+DB_POOL_TARGET_WAIT_MS = float(os.getenv("DB_POOL_TARGET_WAIT_MS", "5"))
+DB_POOL_ADAPTIVE = os.getenv("DB_POOL_ADAPTIVE", "false").lower() == "true"
+DB_POOL_ADAPT_INTERVAL = float(os.getenv("DB_POOL_ADAPT_INTERVAL_SECONDS", "10"))
+
+# Upper bounds of the checkout latency buckets, in milliseconds
+CHECKOUT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_LONG_HOLD_ROUTES = 200
+
+current_route: ContextVar[Optional[str]] = ContextVar("db_route", default=None)
+
+
+def _holder() -> str:
+    return current_route.get() or f"thread:{threading.current_thread().name}"
+
+
+class Histogram:
+    def __init__(self, bounds=CHECKOUT_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets[f"le_{bound}"] = cumulative
+        buckets["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkout_ms = Histogram()
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.recycled_idle = 0
+        self.peak_in_use = 0
+        self.held: Dict[int, tuple] = {}  # id(record) -> (checked out at, holder)
+        self.long_holds: Dict[str, list] = defaultdict(lambda: [0, 0.0])  # holder -> [count, max ms]
+        self.long_hold_total = 0
+        # Since the last adaptive resize
+        self.window_slow = 0
+        self.window_peak = 0
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording checkout latency, hold times and idle recycling"""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.metrics = PoolMetrics()
+        self.role = "pool"
+        self.adaptive_bounds: Optional[tuple] = None
+        self.resizes: List[dict] = []
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        pool.role = self.role
+        pool.adaptive_bounds = self.adaptive_bounds
+        pool.resizes = self.resizes
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self.metrics.lock:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self.metrics.lock:
+                self.metrics.checkout_ms.observe(elapsed_ms)
+                if elapsed_ms > DB_POOL_TARGET_WAIT_MS:
+                    self.metrics.slow_checkouts += 1
+                    self.metrics.window_slow += 1
+
+    def _do_get(self):
+        record = super()._do_get()
+        now = time.monotonic()
+        checked_in_at = record.info.pop("checked_in_at", None)
+        if DB_POOL_IDLE_RECYCLE and checked_in_at is not None \
+                and now - checked_in_at > DB_POOL_IDLE_RECYCLE:
+            # Reconnects in get_connection() instead of pinging a possibly dead socket
+            record.invalidate()
+            with self.metrics.lock:
+                self.metrics.recycled_idle += 1
+        in_use = self.checkedout()
+        with self.metrics.lock:
+            self.metrics.held[id(record)] = (now, _holder())
+            self.metrics.peak_in_use = max(self.metrics.peak_in_use, in_use)
+            self.metrics.window_peak = max(self.metrics.window_peak, in_use)
+        return record
+
+    def _do_return_conn(self, record):
+        now = time.monotonic()
+        record.info["checked_in_at"] = now
+        with self.metrics.lock:
+            held = self.metrics.held.pop(id(record), None)
+        if held is not None:
+            held_ms = (now - held[0]) * 1000
+            if held_ms > DB_LONG_HOLD_MS:
+                self._record_long_hold(held[1], held_ms)
+        super()._do_return_conn(record)
+
+    def _record_long_hold(self, holder: str, held_ms: float):
+        print(f"[Database] {self.role} connection held {held_ms:.0f}ms by {holder}")
+        with self.metrics.lock:
+            self.metrics.long_hold_total += 1
+            if holder in self.metrics.long_holds or \
+                    len(self.metrics.long_holds) < MAX_LONG_HOLD_ROUTES:
+                entry = self.metrics.long_holds[holder]
+                entry[0] += 1
+                entry[1] = max(entry[1], held_ms)
+
+    @property
+    def capacity(self) -> int:
+        return self.size() + self._max_overflow
+
+    def resize(self, capacity: int, reason: str):
+        """Set the total connection limit by adjusting the overflow allowance"""
+        previous = self.capacity
+        self._max_overflow = max(0, capacity - self.size())
+        self.resizes.append({"at": time.time(), "from": previous, "to": self.capacity,
+                             "reason": reason})
+        del self.resizes[:-20]
+        print(f"[Database] Resized {self.role} pool {previous} -> {self.capacity} ({reason})")
+
+    def adapt(self):
+        """One adaptive sizing step within adaptive_bounds"""
+        low, high = self.adaptive_bounds
+        with self.metrics.lock:
+            slow, peak = self.metrics.window_slow, self.metrics.window_peak
+            self.metrics.window_slow = 0
+            self.metrics.window_peak = self.checkedout()
+        capacity = self.capacity
+        if slow and peak >= capacity and capacity < high:
+            self.resize(min(high, capacity + max(1, capacity // 4)),
+                        f"{slow} slow checkouts at full use")
+        elif peak < capacity // 2 and capacity > low:
+            self.resize(capacity - 1, f"peak use {peak}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        m = self.metrics
+        with m.lock:
+            current = sorted(((now - started) * 1000, holder)
+                             for started, holder in m.held.values())
+            return {
+                "size": self.size(),
+                "capacity": self.capacity,
+                "in_use": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": max(0, self.overflow()),
+                "peak_in_use": m.peak_in_use,
+                "pre_ping": self._pre_ping,
+                "idle_recycle_seconds": DB_POOL_IDLE_RECYCLE or None,
+                "recycled_idle": m.recycled_idle,
+                "checkout_ms": m.checkout_ms.summary(),
+                "slow_checkouts": m.slow_checkouts,
+                "timeouts": m.timeouts,
+                "long_holds": {
+                    "threshold_ms": DB_LONG_HOLD_MS,
+                    "total": m.long_hold_total,
+                    "by_route": {holder: {"count": count, "max_ms": round(max_ms)}
+                                 for holder, (count, max_ms) in m.long_holds.items()},
+                    "open": [{"route": holder, "held_ms": round(held_ms)}
+                             for held_ms, holder in reversed(current)
+                             if held_ms > DB_LONG_HOLD_MS],
+                },
+                "adaptive": {
+                    "min": self.adaptive_bounds[0],
+                    "max": self.adaptive_bounds[1],
+                    "resizes": list(self.resizes),
+                } if self.adaptive_bounds else None,
+            }
+
+
+# role -> engine; the engine's current pool survives dispose()/recreate()
+_engines: Dict[str, object] = {}
+
+
+def pool_options(role: str, pool_size: int, max_overflow: int) -> dict:
+    """create_engine() pool arguments; adaptive pools keep DB_POOL_MIN warm"""
+    if DB_POOL_ADAPTIVE:
+        low, high = adaptive_bounds(role, pool_size, max_overflow)
+        pool_size, max_overflow = low, min(max_overflow, high - low)
+    return {"poolclass": InstrumentedQueuePool, "pool_size": pool_size,
+            "max_overflow": max_overflow, "pool_pre_ping": DB_POOL_PRE_PING}
+
+
+def adaptive_bounds(role: str, pool_size: int, max_overflow: int) -> tuple:
+    prefix = "DB_READ_POOL" if role == "replica" else "DB_POOL"
+    low = int(os.getenv(f"{prefix}_MIN", str(pool_size)))
+    high = int(os.getenv(f"{prefix}_MAX", str(pool_size + max_overflow)))
+    return max(1, low), max(low, high)
+
+
+def instrument(engine, role: str, pool_size: int, max_overflow: int):
+    """Label an engine's pool and enable adaptive sizing on it if configured"""
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return
+    _engines[role] = engine
+    pool.role = role
+    if DB_POOL_ADAPTIVE:
+        pool.adaptive_bounds = adaptive_bounds(role, pool_size, max_overflow)
+
+
+class PoolMonitor:
+    """Background thread running adapt() on adaptive pools"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for engine in list(_engines.values()):
+                pool = engine.pool
+                if pool.adaptive_bounds is None:
+                    continue
+                try:
+                    pool.adapt()
+                except Exception as e:
+                    print(f"[Database] Adaptive sizing error: {e}")
+
+    def start(self):
+        if DB_POOL_ADAPTIVE and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-pool-monitor",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+pool_monitor = PoolMonitor(DB_POOL_ADAPT_INTERVAL)
+
+
+def stats() -> dict:
+    return {"adaptive": DB_POOL_ADAPTIVE,
+            "pools": {role: engine.pool.stats() for role, engine in list(_engines.items())}}
+
+
+class RouteLabelMiddleware:
+    """ASGI middleware naming the route for connections checked out while serving it"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            method = scope.get("method", "WS")
+            token = current_route.set(f"{method} {scope['path']}")
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                current_route.reset(token)
+            return
+        await self.app(scope, receive, send)
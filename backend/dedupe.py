@@ -0,0 +1,134 @@
+"""
+Fast rejection of duplicate and spammy form submissions.
+
+Visitors and bots double-submit the interest/reconsideration forms. Before the
+insert and the SMTP send, create_form_submission checks:
+
+- RecentSubmissions: a time-windowed map of normalized (form_name, email) to the
+  id of the submission already stored. A repeat inside FORM_DEDUPE_WINDOW_SECONDS
+  is answered idempotently with that id.
+- BurstDetector: how many distinct emails one client IP submitted within
+  FORM_BURST_SECONDS; more than FORM_BURST_LIMIT looks like a bot cycling
+  addresses and is rejected.
+
+Both are per worker. The unique partial index on
+(form_name, lower(email), dedupe_window) is the cross-worker backstop: a
+duplicate that slips past the memory check fails the insert with an
+IntegrityError and gets the same idempotent answer. dedupe_window is the
+submission time divided into FORM_DEDUPE_WINDOW_SECONDS buckets, so the index
+only catches repeats within the same bucket; the in-memory window is sliding.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+DEDUPE_WINDOW_SECONDS = float(os.getenv("FORM_DEDUPE_WINDOW_SECONDS", "600"))
+BURST_LIMIT = int(os.getenv("FORM_BURST_LIMIT", "3"))
+BURST_SECONDS = float(os.getenv("FORM_BURST_SECONDS", "60"))
+
+# Placeholder id while the first submission for a key is still being stored
+PENDING = -1
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def dedupe_key(form_name: str, email: str) -> Tuple[str, str]:
+    return form_name.strip(), normalize_email(email)
+
+
+def dedupe_window(now: Optional[float] = None) -> int:
+    """Bucket number stored on the row and covered by the unique index"""
+    return int((time.time() if now is None else now) // DEDUPE_WINDOW_SECONDS)
+
+
+class RecentSubmissions:
+    def __init__(self, window: float, max_entries: int = 50_000):
+        self.window = window
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+        self.duplicates = 0
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def reserve(self, key: Tuple[str, str]) -> Optional[int]:
+        """
+        Claim `key` for a new submission. Returns None if the caller should store
+        it, otherwise the id of the earlier submission (PENDING if still in flight).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.duplicates += 1
+                return entry[1]
+            self._entries[key] = (now + self.window, PENDING)
+            return None
+
+    def remember(self, key: Tuple[str, str], submission_id: int):
+        with self._lock:
+            expires = self._entries.get(key, (time.monotonic() + self.window, 0))[0]
+            self._entries[key] = (expires, submission_id)
+
+    def release(self, key: Tuple[str, str]):
+        """Forget a reservation whose insert failed so a retry is not treated as a duplicate"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == PENDING:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class BurstDetector:
+    def __init__(self, limit: int, seconds: float, max_clients: int = 50_000):
+        self.limit = limit
+        self.seconds = seconds
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, Deque[Tuple[float, str]]]" = OrderedDict()
+        self.rejected = 0
+
+    def check(self, client: str, email: str) -> bool:
+        """Record a submission; False if `client` sent too many distinct emails recently"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent.pop(client, None) or deque()
+            while events and events[0][0] <= now - self.seconds:
+                events.popleft()
+            emails = {address for _, address in events}
+            if email not in emails and len(emails) >= self.limit:
+                self._recent[client] = events
+                self.rejected += 1
+                return False
+            events.append((now, email))
+            self._recent[client] = events
+            while len(self._recent) > self.max_clients:
+                self._recent.popitem(last=False)
+            return True
+
+
+recent_submissions = RecentSubmissions(DEDUPE_WINDOW_SECONDS)
+burst_detector = BurstDetector(BURST_LIMIT, BURST_SECONDS)
+
+
+def stats() -> Dict[str, float]:
+    return {
+        "tracked_submissions": len(recent_submissions),
+        "duplicates": recent_submissions.duplicates,
+        "burst_rejected": burst_detector.rejected,
+        "window_seconds": DEDUPE_WINDOW_SECONDS,
+        "burst_limit": BURST_LIMIT,
+        "burst_seconds": BURST_SECONDS,
+    }
@@ -0,0 +1,185 @@
+"""
+Whole-graph operations on a configuration's conversation flows.
+
+The bulk endpoint and the CSV import both end up in apply_flows(): the incoming
+steps are validated as a graph first, then matched to existing rows by `order`
+and written with one batched UPDATE, one batched INSERT and one DELETE inside a
+single transaction.
+"""
+import csv
+import io
+from typing import AsyncIterator, Collection, Dict, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# Same layout as the exported sheet in attached_assets/conversation_flows.csv
+CSV_COLUMNS = ["id", "config_id", "order", "video_filename", "system_prompt",
+               "agent_question", "pass_next", "fail_next", "video_only", "show_form",
+               "form_name", "input_delay", "created_at", "updated_at"]
+STEP_FIELDS = ["order", "video_filename", "system_prompt", "agent_question", "pass_next",
+               "fail_next", "video_only", "show_form", "form_name", "input_delay"]
+
+
+def validate_flow_graph(items: List[schemas.ConversationFlowBulkItem],
+                        kept_orders: Collection[int] = ()) -> List[str]:
+    """Problems that would leave visitors stuck: duplicate orders and dangling next steps
+
+    kept_orders are the orders of existing steps that stay in place (a partial
+    upsert with delete_missing=False); next steps may point at them too.
+    """
+    errors = []
+    seen: Dict[int, int] = {}
+    for index, item in enumerate(items):
+        if item.order in seen:
+            errors.append(f"flows[{index}]: duplicate order {item.order} "
+                          f"(also used by flows[{seen[item.order]}])")
+        else:
+            seen[item.order] = index
+
+    for index, item in enumerate(items):
+        for field in ("pass_next", "fail_next"):
+            target = getattr(item, field)
+            if target is not None and target not in seen and target not in kept_orders:
+                errors.append(f"flows[{index}] (order {item.order}): {field}={target} "
+                              f"does not match any step order")
+        if item.show_form and not item.form_name:
+            errors.append(f"flows[{index}] (order {item.order}): show_form requires form_name")
+    return errors
+
+
+def apply_flows(db: Session, config_id: int, items: List[schemas.ConversationFlowBulkItem],
+                delete_missing: bool = True) -> Tuple[int, int, int]:
+    """Upsert steps by order in one transaction; returns (inserted, updated, deleted)"""
+    existing = db.query(models.ConversationFlow.id, models.ConversationFlow.order).filter(
+        models.ConversationFlow.config_id == config_id).order_by(
+            models.ConversationFlow.id).all()
+    existing_by_order: Dict[int, int] = {}
+    duplicate_ids = []
+    for flow_id, order in existing:
+        if order in existing_by_order:
+            duplicate_ids.append(flow_id)
+        else:
+            existing_by_order[order] = flow_id
+
+    updates, inserts = [], []
+    for item in items:
+        values = item.model_dump(include=set(STEP_FIELDS))
+        flow_id = existing_by_order.get(item.order)
+        if flow_id is None:
+            inserts.append(dict(values, config_id=config_id))
+        else:
+            updates.append(dict(values, id=flow_id))
+
+    stale_ids = list(duplicate_ids)
+    if delete_missing:
+        incoming = {item.order for item in items}
+        stale_ids += [flow_id for order, flow_id in existing_by_order.items()
+                      if order not in incoming]
+
+    try:
+        if updates:
+            db.execute(update(models.ConversationFlow), updates)
+        if inserts:
+            db.execute(insert(models.ConversationFlow), inserts)
+        if stale_ids:
+            db.execute(delete(models.ConversationFlow).where(
+                models.ConversationFlow.id.in_(stale_ids)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(inserts), len(updates), len(stale_ids)
+
+
+def export_flows_csv(flows: List[models.ConversationFlow]) -> Iterator[str]:
+    """Yield the CSV header and then one row per step, quoted like the exported sheet"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    for flow in flows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([getattr(flow, column) for column in CSV_COLUMNS])
+        yield buffer.getvalue()
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, List[str]]]:
+    """
+    Parse CSV records from a byte stream as they arrive, yielding (line, fields).
+
+    A record may span lines when a quoted field contains newlines; lines are
+    joined until the quote count is even, which is exact for RFC 4180 quoting.
+    """
+    pending = ""
+    record = ""
+    record_line = line_number = 0
+    async for chunk in chunks:
+        pending += chunk.decode("utf-8-sig" if line_number == 0 and not record else "utf-8")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line_number += 1
+            if not record:
+                record_line = line_number
+            record += line + "\n"
+            if record.count('"') % 2 == 0:
+                if record.strip():
+                    yield record_line, next(csv.reader([record]))
+                record = ""
+    if pending or record:
+        record += pending
+        if record.strip():
+            yield record_line or line_number + 1, next(csv.reader([record]))
+
+
+def _parse_bool(value: str) -> bool:
+    return value.strip().lower() in ("true", "t", "1", "yes")
+
+
+def _parse_int(value: str):
+    value = value.strip()
+    return int(value) if value else None
+
+
+def csv_row_to_item(row: Dict[str, str]) -> schemas.ConversationFlowBulkItem:
+    """Convert one CSV row to a bulk item; ids and timestamps in the sheet are ignored"""
+    data = {
+        "order": _parse_int(row.get("order", "")),
+        "video_filename": row.get("video_filename", ""),
+        "system_prompt": row.get("system_prompt", ""),
+        "agent_question": row.get("agent_question", ""),
+        "pass_next": _parse_int(row.get("pass_next", "")),
+        "fail_next": _parse_int(row.get("fail_next", "")),
+        "video_only": _parse_bool(row.get("video_only", "")),
+        "show_form": _parse_bool(row.get("show_form", "")),
+        "form_name": row.get("form_name") or None,
+        "input_delay": _parse_int(row.get("input_delay", "")) or 0,
+    }
+    return schemas.ConversationFlowBulkItem(**data)
+
+
+async def read_flows_csv(chunks: AsyncIterator[bytes]) -> Tuple[List[schemas.ConversationFlowBulkItem], List[str]]:
+    """Parse an uploaded flows CSV into bulk items plus per-line errors"""
+    items, errors = [], []
+    header = None
+    async for line, fields in iter_csv_records(chunks):
+        if header is None:
+            header = [name.strip() for name in fields]
+            missing = {"order", "video_filename", "system_prompt", "agent_question"} - set(header)
+            if missing:
+                errors.append(f"line {line}: missing columns {', '.join(sorted(missing))}")
+                break
+            continue
+        row = dict(zip(header, fields))
+        try:
+            items.append(csv_row_to_item(row))
+        except (ValidationError, ValueError) as e:
+            message = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+            errors.append(f"line {line}: {message}")
+    if header is None:
+        errors.append("CSV is empty")
+    return items, errors
@@ -0,0 +1,322 @@
+"""
+Pre-warmed HeyGen streaming sessions.
+
+Minting a streaming token and negotiating a session (streaming.create_token +
+streaming.new) used to happen after the visitor arrived, before the avatar could
+speak. AvatarSessionPool does both ahead of time for every configured
+(heygen_scene_id, voice_id) pair and POST /avatar/session hands out a ready
+session; the client only has to start it and join the room.
+
+- Entries are replaced before they expire: anything within
+  HEYGEN_REFRESH_MARGIN_SECONDS of HEYGEN_SESSION_TTL_SECONDS is stopped and
+  re-minted by the background refill loop, never handed out.
+- Pool size per key follows recent demand. With arrival rate r (hand-outs per
+  second over HEYGEN_POOL_WINDOW_SECONDS) and lead time L (measured time to mint
+  one entry), the target is r*L + 2*sqrt(r*L) rounded up, enough to cover a
+  Poisson burst while replacements are minted, clamped to
+  [HEYGEN_POOL_MIN, HEYGEN_POOL_MAX]. Pairs with no recent demand keep the minimum.
+- An empty pool falls back to minting on demand, so a miss costs what every
+  request used to.
+
+The pool lives in the worker's event loop; with several uvicorn workers each
+keeps its own and sizes it from its own share of the traffic. Point
+HEYGEN_API_BASE at loadtest.fakes.FakeHeyGenServer to exercise it locally.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+import httpx
+
+HEYGEN_API_BASE = os.getenv("HEYGEN_API_BASE", "https://api.heygen.com")
+HEYGEN_POOL_ENABLED = os.getenv("HEYGEN_POOL_ENABLED", "true").lower() != "false"
+HEYGEN_POOL_MIN = int(os.getenv("HEYGEN_POOL_MIN", "1"))
+HEYGEN_POOL_MAX = int(os.getenv("HEYGEN_POOL_MAX", "8"))
+HEYGEN_POOL_WINDOW_SECONDS = float(os.getenv("HEYGEN_POOL_WINDOW_SECONDS", "300"))
+HEYGEN_POOL_MINT_CONCURRENCY = int(os.getenv("HEYGEN_POOL_MINT_CONCURRENCY", "4"))
+HEYGEN_SESSION_TTL_SECONDS = float(os.getenv("HEYGEN_SESSION_TTL_SECONDS", "300"))
+HEYGEN_REFRESH_MARGIN_SECONDS = float(os.getenv("HEYGEN_REFRESH_MARGIN_SECONDS", "60"))
+HEYGEN_QUALITY = os.getenv("HEYGEN_QUALITY", "medium")
+
+REFILL_INTERVAL = 1.0  # seconds between refill passes when nothing wakes the loop
+KEYS_RELOAD_INTERVAL = 60.0  # seconds between reloads of the configured pairs
+INITIAL_MINT_SECONDS = 2.0  # lead-time estimate until a mint has been measured
+
+PoolKey = Tuple[str, Optional[str]]  # (heygen_scene_id, voice_id)
+
+
+class HeyGenError(Exception):
+    pass
+
+
+class HeyGenClient:
+    """The streaming endpoints the pool needs"""
+
+    def __init__(self, api_key: str, base_url: str = HEYGEN_API_BASE, timeout: float = 15.0):
+        self.api_key = api_key
+        self._http = httpx.AsyncClient(base_url=base_url.rstrip("/"), timeout=timeout)
+
+    async def _post(self, path: str, payload: dict, token: Optional[str] = None) -> dict:
+        headers = ({"Authorization": f"Bearer {token}"} if token
+                   else {"X-Api-Key": self.api_key})
+        response = await self._http.post(path, json=payload, headers=headers)
+        if response.status_code >= 400:
+            raise HeyGenError(f"{path} returned HTTP {response.status_code}: {response.text[:200]}")
+        return response.json().get("data") or {}
+
+    async def create_token(self) -> str:
+        data = await self._post("/v1/streaming.create_token", {})
+        if not data.get("token"):
+            raise HeyGenError("streaming.create_token returned no token")
+        return data["token"]
+
+    async def new_session(self, token: str, avatar_id: str, voice_id: Optional[str]) -> dict:
+        payload = {"quality": HEYGEN_QUALITY, "avatar_id": avatar_id, "version": "v2",
+                   "video_encoding": "H264"}
+        if voice_id:
+            payload["voice"] = {"voice_id": voice_id}
+        data = await self._post("/v1/streaming.new", payload, token=token)
+        if not data.get("session_id"):
+            raise HeyGenError("streaming.new returned no session_id")
+        return data
+
+    async def stop_session(self, session_id: str):
+        await self._post("/v1/streaming.stop", {"session_id": session_id})
+
+    async def close(self):
+        await self._http.aclose()
+
+
+class PooledSession:
+    __slots__ = ("key", "token", "data", "created_at", "expires_at")
+
+    def __init__(self, key: PoolKey, token: str, data: dict, created_at: float):
+        self.key = key
+        self.token = token
+        self.data = data
+        self.created_at = created_at
+        self.expires_at = created_at + HEYGEN_SESSION_TTL_SECONDS
+
+    def fresh(self, now: float) -> bool:
+        return self.expires_at - now > HEYGEN_REFRESH_MARGIN_SECONDS
+
+    def to_client(self, now: float, pooled: bool) -> dict:
+        return {**self.data, "token": self.token, "pooled": pooled,
+                "expires_in": round(self.expires_at - now, 1)}
+
+
+class AvatarSessionPool:
+    def __init__(self, client: HeyGenClient):
+        self.client = client
+        self._entries: Dict[PoolKey, Deque[PooledSession]] = {}
+        self._arrivals: Dict[PoolKey, Deque[float]] = {}
+        self._minting: Dict[PoolKey, int] = {}
+        self._configured: Set[PoolKey] = set()
+        self._keys_loaded_at = 0.0
+        self._mint_seconds = INITIAL_MINT_SECONDS
+        self._mint_slots = asyncio.Semaphore(HEYGEN_POOL_MINT_CONCURRENCY)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self._started_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.minted = 0
+        self.refreshed = 0
+        self.errors = 0
+
+    # Demand
+
+    def _record_arrival(self, key: PoolKey, now: float):
+        arrivals = self._arrivals.setdefault(key, deque())
+        arrivals.append(now)
+        while arrivals and arrivals[0] < now - HEYGEN_POOL_WINDOW_SECONDS:
+            arrivals.popleft()
+
+    def arrival_rate(self, key: PoolKey, now: float) -> float:
+        arrivals = self._arrivals.get(key)
+        if not arrivals:
+            return 0.0
+        while arrivals and arrivals[0] < now - HEYGEN_POOL_WINDOW_SECONDS:
+            arrivals.popleft()
+        window = min(HEYGEN_POOL_WINDOW_SECONDS, max(now - self._started_at, 1.0))
+        return len(arrivals) / window
+
+    def target_size(self, key: PoolKey, now: float) -> int:
+        demand = self.arrival_rate(key, now) * (self._mint_seconds + REFILL_INTERVAL)
+        minimum = HEYGEN_POOL_MIN if key in self._configured else 0
+        if demand <= 0:
+            return minimum
+        return max(minimum, min(HEYGEN_POOL_MAX, math.ceil(demand + 2 * math.sqrt(demand))))
+
+    # Hand-out
+
+    async def acquire(self, key: PoolKey) -> dict:
+        """A ready session for `key`, from the pool if one is fresh, otherwise minted now"""
+        now = time.monotonic()
+        self._record_arrival(key, now)
+        entries = self._entries.get(key)
+        while entries:
+            entry = entries.popleft()
+            if entry.fresh(now):
+                self.hits += 1
+                self._wake.set()
+                return entry.to_client(now, pooled=True)
+            self._retire(entry)
+        self.misses += 1
+        self._wake.set()
+        print(f"[HeyGen] Pool empty for avatar {key[0]}, minting on demand")
+        entry = await self._mint(key)
+        return entry.to_client(time.monotonic(), pooled=False)
+
+    async def stop(self, session_id: str):
+        await self.client.stop_session(session_id)
+
+    # Minting and refresh
+
+    async def _mint(self, key: PoolKey) -> PooledSession:
+        started = time.monotonic()
+        async with self._mint_slots:
+            token = await self.client.create_token()
+            data = await self.client.new_session(token, key[0], key[1])
+        finished = time.monotonic()
+        self._mint_seconds = 0.8 * self._mint_seconds + 0.2 * (finished - started)
+        self.minted += 1
+        return PooledSession(key, token, data, finished)
+
+    async def _fill_one(self, key: PoolKey):
+        try:
+            entry = await self._mint(key)
+            self._entries.setdefault(key, deque()).append(entry)
+        except Exception as e:
+            self.errors += 1
+            print(f"[HeyGen] Failed to pre-warm a session for avatar {key[0]}: {e}")
+        finally:
+            self._minting[key] -= 1
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _retire(self, entry: PooledSession):
+        self.refreshed += 1
+        self._spawn(self._stop_quietly(entry.data["session_id"]))
+
+    async def _stop_quietly(self, session_id: str):
+        try:
+            await self.client.stop_session(session_id)
+        except Exception as e:
+            print(f"[HeyGen] Could not stop pooled session {session_id}: {e}")
+
+    async def _reload_keys(self, now: float):
+        try:
+            self._configured = await asyncio.to_thread(_configured_keys)
+            self._keys_loaded_at = now
+        except Exception as e:
+            # Keep the previous set and try again on the next interval
+            self._keys_loaded_at = now
+            print(f"[HeyGen] Could not load avatar configurations: {e}")
+
+    async def _refill(self):
+        now = time.monotonic()
+        if now - self._keys_loaded_at >= KEYS_RELOAD_INTERVAL:
+            await self._reload_keys(now)
+        for key in self._configured | set(self._entries) | set(self._arrivals):
+            entries = self._entries.setdefault(key, deque())
+            for entry in [e for e in entries if not e.fresh(now)]:
+                entries.remove(entry)
+                self._retire(entry)
+            target = self.target_size(key, now)
+            while len(entries) > target:
+                self._retire(entries.pop())
+            missing = target - len(entries) - self._minting.get(key, 0)
+            for _ in range(max(0, missing)):
+                self._minting[key] = self._minting.get(key, 0) + 1
+                self._spawn(self._fill_one(key))
+
+    async def _run(self):
+        while True:
+            try:
+                await self._refill()
+            except Exception as e:
+                print(f"[HeyGen] Refill pass failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), REFILL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print(f"[HeyGen] Session pool started against {HEYGEN_API_BASE}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._background):
+            task.cancel()
+        pooled = [entry for entries in self._entries.values() for entry in entries]
+        self._entries.clear()
+        await asyncio.gather(*(self._stop_quietly(entry.data["session_id"])
+                               for entry in pooled))
+        await self.client.close()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "running": self._task is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "minted": self.minted,
+            "refreshed": self.refreshed,
+            "errors": self.errors,
+            "mint_seconds": round(self._mint_seconds, 3),
+            "pools": [{
+                "avatar_id": key[0],
+                "voice_id": key[1],
+                "ready": len(self._entries.get(key, ())),
+                "minting": self._minting.get(key, 0),
+                "target": self.target_size(key, now),
+                "arrivals_per_minute": round(self.arrival_rate(key, now) * 60, 2),
+            } for key in sorted(self._configured | set(self._entries) | set(self._arrivals),
+                                key=lambda k: (k[0], k[1] or ""))],
+        }
+
+
+def _configured_keys() -> Set[PoolKey]:
+    from . import models
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.query(models.Configurations.heygen_scene_id,
+                        models.Configurations.voice_id).all()
+    finally:
+        db.close()
+    return {(scene_id, voice_id or None) for scene_id, voice_id in rows if scene_id}
+
+
+avatar_pool: Optional[AvatarSessionPool] = None
+
+
+def start_pool(api_key: Optional[str]) -> Optional[AvatarSessionPool]:
+    """Create and start the worker's pool; called from the FastAPI lifespan"""
+    global avatar_pool
+    if avatar_pool is None and api_key:
+        avatar_pool = AvatarSessionPool(HeyGenClient(api_key))
+        if HEYGEN_POOL_ENABLED:
+            avatar_pool.start()
+    return avatar_pool
+
+
+async def stop_pool():
+    global avatar_pool
+    if avatar_pool is not None:
+        await avatar_pool.close()
+        avatar_pool = None
@@ -0,0 +1,242 @@
+"""
+Bulk NDJSON ingestion for backfilling conversations and form submissions.
+
+POST /admin/ingest/conversations and /admin/ingest/form-submissions stream the
+request body and split it into lines. Each non-blank line is one JSON object,
+validated on its own against the target's schema. A line that fails validation
+is reported with its line number and skipped. The other lines are collected into
+chunks of INGEST_CHUNK_ROWS rows, and the next chunk is read while the previous
+one loads.
+
+Each chunk is loaded in its own transaction. PostgreSQL gets COPY ... FROM
+STDIN (CSV). Other databases (SQLite in tests) get one multi-row executemany
+INSERT. Foreign keys are checked for the whole chunk with a single query first,
+so a row with an unknown config_id does not abort the COPY. If a chunk is still
+rejected as a whole, it is retried row by row, and only the rows that fail are
+reported. Committed chunks stay committed; the error list says which lines to
+send again.
+
+Ingested rows skip the side effects of the single-row endpoints: there is no
+notification email unless the caller asks for it, and no dedupe. Form
+submissions are stored with dedupe_window NULL, so they are outside the unique
+index in backend/dedupe.py. A backfill keeps every row it is given, and a live
+submission is not matched against backfilled rows.
+"""
+import asyncio
+import io
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import JSON, Column, Table, select
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from . import models, schemas
+
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))
+INGEST_MAX_ERRORS = int(os.getenv("INGEST_MAX_ERRORS", "1000"))
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(1024 * 1024)))
+
+COPY_NULL = "\\N"
+
+
+@dataclass(frozen=True)
+class IngestTarget:
+    table: Table
+    schema: Type[BaseModel]
+    columns: Tuple[str, ...]
+    # field -> referenced primary key column, checked once per chunk
+    references: Dict[str, Column] = field(default_factory=dict)
+
+
+CONVERSATIONS = IngestTarget(
+    table=models.Conversations.__table__,
+    schema=schemas.ConversationIngest,
+    columns=("config_id", "messages", "status", "created_at", "updated_at"),
+    references={"config_id": models.Configurations.id},
+)
+
+FORM_SUBMISSIONS = IngestTarget(
+    table=models.FormSubmissions.__table__,
+    schema=schemas.FormSubmissionIngest,
+    columns=("form_name", "name", "email", "phone", "message", "ip_address",
+             "additional_data", "created_at"),
+)
+
+
+def quote_csv(value: str) -> str:
+    """
+    Quote a non-null COPY field. PostgreSQL only reads the NULL marker from an
+    unquoted field, so a string equal to \\N still loads as that string.
+    """
+    return '"' + value.replace('"', '""') + '"'
+
+
+def format_errors(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, error['loc'])) or 'line'}: {error['msg']}"
+                     for error in exc.errors())
+
+
+async def iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Lines of a streamed body, without their terminators"""
+    rest = b""
+    async for data in body:
+        lines = (rest + data).split(b"\n")
+        rest = lines.pop()
+        if len(rest) > INGEST_MAX_LINE_BYTES:
+            raise ValueError(f"Line longer than {INGEST_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+
+class IngestRun:
+    """Counters and error list of one ingestion request; chunks are processed one at a time"""
+
+    def __init__(self, target: IngestTarget, engine: Engine,
+                 on_loaded: Optional[Callable[[List[dict]], None]] = None):
+        self.target = target
+        self.engine = engine
+        self.on_loaded = on_loaded
+        self.method = ("copy" if engine.dialect.name == "postgresql"
+                       and engine.dialect.driver == "psycopg2" else "insert")
+        self.received = self.inserted = self.failed = self.chunks = 0
+        self.errors: List[dict] = []
+        self._known: Dict[str, Set] = {name: set() for name in target.references}
+        self._started = time.perf_counter()
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < INGEST_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def validate(self, lines: List[Tuple[int, bytes]]) -> List[Tuple[int, dict]]:
+        now = datetime.now(timezone.utc)
+        rows = []
+        for number, line in lines:
+            try:
+                row = self.target.schema.model_validate_json(line).model_dump()
+            except ValidationError as e:
+                self.error(number, format_errors(e))
+                continue
+            if row.get("created_at") is None:
+                row["created_at"] = now
+            rows.append((number, {name: row.get(name) for name in self.target.columns}))
+        return rows
+
+    def check_references(self, conn, rows: List[Tuple[int, dict]]) -> List[Tuple[int, dict]]:
+        for name, column in self.target.references.items():
+            known = self._known[name]
+            missing = {row[name] for _, row in rows} - known
+            if missing:
+                known.update(conn.execute(select(column).where(column.in_(missing))).scalars())
+            unknown = [(number, row) for number, row in rows if row[name] not in known]
+            for number, row in unknown:
+                self.error(number, f"{name}: {row[name]} does not exist")
+            if unknown:
+                rows = [(number, row) for number, row in rows if row[name] in known]
+        return rows
+
+    def copy(self, conn, rows: List[dict]):
+        buffer = io.StringIO()
+        json_columns = {name for name in self.target.columns
+                        if isinstance(self.target.table.c[name].type, JSON)}
+        for row in rows:
+            buffer.write(",".join(
+                COPY_NULL if row[name] is None
+                else quote_csv(json.dumps(row[name]) if name in json_columns
+                               else row[name].isoformat() if isinstance(row[name], datetime)
+                               else str(row[name]))
+                for name in self.target.columns) + "\n")
+        buffer.seek(0)
+        preparer = conn.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(name) for name in self.target.columns)
+        sql = (f"COPY {preparer.format_table(self.target.table)} ({columns}) "
+               f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')")
+        conn.connection.cursor().copy_expert(sql, buffer)
+
+    def load(self, rows: List[Tuple[int, dict]]) -> List[dict]:
+        """Insert a chunk in one transaction, or row by row if the chunk is rejected"""
+        try:
+            with self.engine.begin() as conn:
+                rows = self.check_references(conn, rows)
+                if not rows:
+                    return []
+                values = [row for _, row in rows]
+                if self.method == "copy":
+                    self.copy(conn, values)
+                else:
+                    conn.execute(self.target.table.insert(), values)
+            return values
+        except Exception as e:
+            print(f"[Ingest] Chunk of {len(rows)} {self.target.table.name} rows rejected "
+                  f"({type(e).__name__}), retrying row by row")
+        loaded = []
+        for number, row in rows:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(self.target.table.insert(), [row])
+                loaded.append(row)
+            except Exception as e:
+                self.error(number, str(getattr(e, "orig", e)).strip().splitlines()[0])
+        return loaded
+
+    def process(self, lines: List[Tuple[int, bytes]]):
+        loaded = self.load(self.validate(lines))
+        self.inserted += len(loaded)
+        self.chunks += 1
+        if loaded and self.on_loaded is not None:
+            self.on_loaded(loaded)
+
+    def result(self) -> dict:
+        seconds = time.perf_counter() - self._started
+        return {
+            "table": self.target.table.name,
+            "method": self.method,
+            "received": self.received,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.inserted / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+
+async def ingest_ndjson(body: AsyncIterator[bytes], target: IngestTarget, engine: Engine,
+                        chunk_rows: int = INGEST_CHUNK_ROWS,
+                        on_loaded: Optional[Callable[[List[dict]], None]] = None) -> dict:
+    """Validate and load an NDJSON stream chunk by chunk; returns counts and per-line errors"""
+    run = IngestRun(target, engine, on_loaded)
+    pending: List[Tuple[int, bytes]] = []
+    loading = None
+    number = 0
+    try:
+        async for line in iter_lines(body):
+            number += 1
+            if not line.strip():
+                continue
+            run.received += 1
+            pending.append((number, line))
+            if len(pending) >= chunk_rows:
+                if loading is not None:
+                    await loading
+                loading = asyncio.ensure_future(run_in_threadpool(run.process, pending))
+                pending = []
+    finally:
+        if loading is not None:
+            await loading
+    if pending:
+        await run_in_threadpool(run.process, pending)
+    result = run.result()
+    print(f"[Ingest] {result['table']}: {result['inserted']}/{result['received']} rows "
+          f"via {result['method']} in {result['seconds']}s "
+          f"({result['rows_per_second']} rows/s, {result['failed']} failed)")
+    return result
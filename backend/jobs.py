@@ -0,0 +1,410 @@
+"""
+Durable job queue for lead scoring and outreach batches.
+
+Jobs live in the `jobs` table of the application database (Postgres or SQLite),
+so an import survives crashes and restarts. Each job is one batch of lead ids
+for a named queue; the function that processes a queue is looked up in
+JOB_HANDLERS (queue -> "module:function"), which defaults to the adapters in
+attached_assets/lead_jobs.py around gpt_messages.score_leads and the outreach
+functions. A handler takes the job payload and returns a JSON-able result, or
+raises to fail the attempt.
+
+- Claiming marks a job running under a lease (JOB_LEASE_SECONDS) for one worker.
+  On Postgres the candidate rows are selected FOR UPDATE SKIP LOCKED so workers
+  never wait on each other; SQLite serializes writers, so the same
+  UPDATE ... WHERE id IN (SELECT ... LIMIT n) RETURNING is atomic there too.
+- Workers extend their leases while a handler runs. A job whose lease lapses
+  (worker killed) is claimed again by another worker.
+- A failed attempt is retried after JOB_RETRY_BASE_SECONDS * 2^(attempt-1)
+  (capped at an hour). After max_attempts it is dead-lettered (status "dead")
+  with its last error, and can be requeued from POST /admin/jobs/requeue.
+- Completion and failure only apply while the worker still holds the lease, so
+  a worker that lost its job to a reclaim cannot overwrite the new result.
+
+Workers are separate processes (spawned, each with its own DB pool), so JSON
+parsing and DB writes in the handlers use every core:
+
+    python -m backend.jobs enqueue --queue score_leads --ids-file leads.txt --batch-size 10
+    python -m backend.jobs work --queue score_leads --processes 4
+    python -m backend.jobs status --run-id <run id>
+"""
+import importlib
+import json
+import os
+import secrets
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.engine import Engine
+
+from . import models
+
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", str(os.cpu_count() or 2)))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+JOB_THROUGHPUT_WINDOW = float(os.getenv("JOB_THROUGHPUT_WINDOW_SECONDS", "300"))
+
+DEFAULT_HANDLERS = {
+    "score_leads": "attached_assets.lead_jobs:score_lead_batch",
+    "lead_outreach": "attached_assets.lead_jobs:outreach_batch",
+}
+JOB_HANDLERS = {**DEFAULT_HANDLERS, **json.loads(os.getenv("JOB_HANDLERS", "{}"))}
+
+MAX_RETRY_DELAY = 3600.0
+MAX_ERROR_LENGTH = 2000
+
+jobs_table = models.Jobs.__table__
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def resolve_handler(queue: str) -> Callable[[dict], object]:
+    path = JOB_HANDLERS.get(queue)
+    if path is None:
+        raise KeyError(f"No handler configured for queue {queue!r}; set JOB_HANDLERS")
+    module_name, _, function_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def retry_delay(attempts: int) -> float:
+    return min(MAX_RETRY_DELAY, JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def enqueue(self, queue: str, item_ids: List, batch_size: int = JOB_BATCH_SIZE,
+                max_attempts: int = JOB_MAX_ATTEMPTS, extra: Optional[dict] = None) -> dict:
+        """Split item_ids into batches and insert one job per batch in one statement"""
+        run_id = secrets.token_hex(8)
+        now = _now()
+        rows = [{
+            "queue": queue,
+            "run_id": run_id,
+            "payload": {**(extra or {}), "lead_ids": item_ids[start:start + batch_size]},
+            "batch_size": len(item_ids[start:start + batch_size]),
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_after": now,
+        } for start in range(0, len(item_ids), batch_size)]
+        if rows:
+            with self.engine.begin() as conn:
+                conn.execute(insert(jobs_table), rows)
+        print(f"[Jobs] Enqueued {len(item_ids)} items as {len(rows)} {queue} jobs (run {run_id})")
+        return {"run_id": run_id, "jobs": len(rows), "items": len(item_ids)}
+
+    def claim(self, queue: str, worker: str, limit: int = 1) -> List[dict]:
+        """Lease up to `limit` runnable jobs to `worker`"""
+        now = _now()
+        candidates = select(jobs_table.c.id).where(
+            jobs_table.c.queue == queue,
+            or_(and_(jobs_table.c.status == "queued", jobs_table.c.run_after <= now),
+                and_(jobs_table.c.status == "running", jobs_table.c.lease_expires_at < now,
+                     jobs_table.c.attempts < jobs_table.c.max_attempts)),
+        ).order_by(jobs_table.c.id).limit(limit).with_for_update(skip_locked=True)
+        statement = update(jobs_table).where(jobs_table.c.id.in_(candidates)).values(
+            status="running",
+            lease_owner=worker,
+            lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+            attempts=jobs_table.c.attempts + 1,
+            updated_at=now,
+        ).returning(jobs_table.c.id, jobs_table.c.payload, jobs_table.c.attempts,
+                    jobs_table.c.max_attempts, jobs_table.c.batch_size)
+        with self.engine.begin() as conn:
+            return [dict(row._mapping) for row in conn.execute(statement)]
+
+    def extend_leases(self, worker: str) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(update(jobs_table).where(
+                jobs_table.c.lease_owner == worker, jobs_table.c.status == "running",
+            ).values(lease_expires_at=_now() + timedelta(seconds=JOB_LEASE_SECONDS))).rowcount
+
+    def complete(self, job_id: int, worker: str, result) -> bool:
+        now = _now()
+        with self.engine.begin() as conn:
+            return conn.execute(update(jobs_table).where(
+                jobs_table.c.id == job_id, jobs_table.c.lease_owner == worker,
+                jobs_table.c.status == "running",
+            ).values(status="done", result=result, lease_owner=None, lease_expires_at=None,
+                     last_error=None, finished_at=now, updated_at=now)).rowcount == 1
+
+    def fail(self, job: dict, worker: str, error: str) -> str:
+        """Schedule a retry, or dead-letter the job once its attempts are used up.
+
+        Returns "retry", "dead", or "lost" if the worker no longer held the lease.
+        """
+        now = _now()
+        dead = job["attempts"] >= job["max_attempts"]
+        values = {"lease_owner": None, "lease_expires_at": None,
+                  "last_error": error[:MAX_ERROR_LENGTH], "updated_at": now}
+        if dead:
+            values.update(status="dead", finished_at=now)
+        else:
+            values.update(status="queued",
+                          run_after=now + timedelta(seconds=retry_delay(job["attempts"])))
+        with self.engine.begin() as conn:
+            updated = conn.execute(update(jobs_table).where(
+                jobs_table.c.id == job["id"], jobs_table.c.lease_owner == worker,
+                jobs_table.c.status == "running").values(**values)).rowcount
+        if not updated:
+            return "lost"  # reclaimed by another worker, which now owns the outcome
+        return "dead" if dead else "retry"
+
+    def reap(self) -> int:
+        """Dead-letter jobs whose lease lapsed on their last allowed attempt"""
+        now = _now()
+        with self.engine.begin() as conn:
+            return conn.execute(update(jobs_table).where(
+                jobs_table.c.status == "running", jobs_table.c.lease_expires_at < now,
+                jobs_table.c.attempts >= jobs_table.c.max_attempts,
+            ).values(status="dead", lease_owner=None, lease_expires_at=None, finished_at=now,
+                     updated_at=now,
+                     last_error=func.coalesce(jobs_table.c.last_error,
+                                              "lease expired on the final attempt"))).rowcount
+
+    def requeue_dead(self, queue: Optional[str] = None, run_id: Optional[str] = None) -> int:
+        conditions = [jobs_table.c.status == "dead"]
+        if queue:
+            conditions.append(jobs_table.c.queue == queue)
+        if run_id:
+            conditions.append(jobs_table.c.run_id == run_id)
+        now = _now()
+        with self.engine.begin() as conn:
+            return conn.execute(update(jobs_table).where(*conditions).values(
+                status="queued", attempts=0, run_after=now, finished_at=None,
+                updated_at=now)).rowcount
+
+    def status(self, queue: Optional[str] = None, run_id: Optional[str] = None,
+               window: float = JOB_THROUGHPUT_WINDOW) -> dict:
+        """Progress, throughput over the last `window` seconds, and dead letters"""
+        conditions = []
+        if queue:
+            conditions.append(jobs_table.c.queue == queue)
+        if run_id:
+            conditions.append(jobs_table.c.run_id == run_id)
+        since = _now() - timedelta(seconds=window)
+        t = jobs_table
+        with self.engine.connect() as conn:
+            by_status = conn.execute(
+                select(t.c.status, func.count(), func.coalesce(func.sum(t.c.batch_size), 0))
+                .where(*conditions).group_by(t.c.status)).all()
+            recent = conn.execute(
+                select(func.count(), func.coalesce(func.sum(t.c.batch_size), 0))
+                .where(*conditions, t.c.status == "done", t.c.finished_at >= since)).one()
+            retrying = conn.execute(select(func.count()).where(
+                *conditions, t.c.status == "queued", t.c.attempts > 0)).scalar_one()
+            workers = conn.execute(
+                select(t.c.lease_owner, func.count())
+                .where(*conditions, t.c.status == "running").group_by(t.c.lease_owner)).all()
+            dead = conn.execute(
+                select(t.c.id, t.c.run_id, t.c.attempts, t.c.batch_size, t.c.last_error,
+                       t.c.finished_at)
+                .where(*conditions, t.c.status == "dead").order_by(t.c.id.desc())
+                .limit(20)).all()
+
+        jobs = {"queued": 0, "running": 0, "done": 0, "dead": 0}
+        items = dict(jobs)
+        for job_status, count, item_count in by_status:
+            jobs[job_status] = count
+            items[job_status] = int(item_count)
+        total_items = sum(items.values())
+        items_per_second = int(recent[1]) / window
+        remaining = items["queued"] + items["running"]
+        return {
+            "queue": queue,
+            "run_id": run_id,
+            "jobs": jobs,
+            "items": items,
+            "progress": round((items["done"] + items["dead"]) / total_items, 4)
+            if total_items else None,
+            "retrying": retrying,
+            "throughput": {
+                "window_seconds": window,
+                "jobs_per_minute": round(recent[0] * 60 / window, 2),
+                "items_per_second": round(items_per_second, 3),
+            },
+            "eta_seconds": round(remaining / items_per_second) if items_per_second and remaining
+            else None,
+            "workers": {owner: count for owner, count in workers},
+            "dead_letters": [{
+                "id": row.id, "run_id": row.run_id, "attempts": row.attempts,
+                "items": row.batch_size, "last_error": row.last_error,
+                "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+            } for row in dead],
+        }
+
+
+# Worker processes
+
+def _work(queue: str, worker: str, stop) -> None:
+    """Body of one worker process: claim, run, complete or fail, until stopped"""
+    from .database import engine
+
+    # The parent handles Ctrl-C; workers finish their current job on stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    job_queue = JobQueue(engine)
+    handler = resolve_handler(queue)
+    print(f"[Jobs] Worker {worker} started for {queue}")
+
+    heartbeat_stop = threading.Event()
+
+    def heartbeat():
+        while not heartbeat_stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                job_queue.extend_leases(worker)
+            except Exception as e:
+                print(f"[Jobs] Worker {worker} could not extend its leases: {e}")
+
+    threading.Thread(target=heartbeat, name="job-lease-heartbeat", daemon=True).start()
+    try:
+        while not stop.is_set():
+            try:
+                claimed = job_queue.claim(queue, worker)
+            except Exception as e:
+                print(f"[Jobs] Worker {worker} could not claim jobs: {e}")
+                stop.wait(JOB_POLL_SECONDS)
+                continue
+            if not claimed:
+                stop.wait(JOB_POLL_SECONDS)
+                continue
+            for job in claimed:
+                started = time.perf_counter()
+                try:
+                    result = handler(job["payload"])
+                except Exception as e:
+                    outcome = job_queue.fail(job, worker, f"{type(e).__name__}: {e}")
+                    print(f"[Jobs] Job {job['id']} attempt {job['attempts']} failed "
+                          f"({outcome}): {e}")
+                    continue
+                if not job_queue.complete(job["id"], worker, result):
+                    print(f"[Jobs] Job {job['id']} finished after its lease was lost; "
+                          "result discarded")
+                    continue
+                print(f"[Jobs] Job {job['id']} done: {job['batch_size']} items in "
+                      f"{time.perf_counter() - started:.1f}s")
+    finally:
+        heartbeat_stop.set()
+        engine.dispose()
+
+
+def run_workers(queue: str, processes: int = JOB_WORKER_PROCESSES):
+    """Supervise `processes` worker processes, restarting any that die, until SIGINT/SIGTERM"""
+    import multiprocessing
+
+    from .database import engine
+
+    resolve_handler(queue)  # fail fast on a bad JOB_HANDLERS entry
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    workers: Dict[int, object] = {}
+
+    def spawn(slot: int):
+        name = f"{prefix}:{slot}:{secrets.token_hex(2)}"
+        process = context.Process(target=_work, args=(queue, name, stop),
+                                  name=f"job-worker-{slot}")
+        process.start()
+        workers[slot] = process
+
+    # Signal handlers only record the request; setting the shared Event from a
+    # handler can deadlock against a wait() already holding its lock
+    stopping = []
+
+    def request_stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    job_queue = JobQueue(engine)
+    for slot in range(processes):
+        spawn(slot)
+    print(f"[Jobs] Running {processes} workers for {queue}")
+    next_reap = time.monotonic()
+    while not stopping:
+        time.sleep(0.5)
+        if time.monotonic() >= next_reap:
+            next_reap = time.monotonic() + JOB_POLL_SECONDS * 5
+            try:
+                reaped = job_queue.reap()
+                if reaped:
+                    print(f"[Jobs] Dead-lettered {reaped} jobs whose final lease expired")
+            except Exception as e:
+                print(f"[Jobs] Reaper error: {e}")
+        for slot, process in list(workers.items()):
+            if not process.is_alive() and not stopping:
+                print(f"[Jobs] Worker {slot} exited with code {process.exitcode}, restarting")
+                spawn(slot)
+    print("[Jobs] Stopping workers after their current jobs")
+    stop.set()
+    for process in workers.values():
+        process.join()
+    print("[Jobs] All workers stopped")
+
+
+def _read_ids(path: str) -> List:
+    ids = []
+    with open(path) as f:
+        for line in f:
+            value = line.strip()
+            if value:
+                ids.append(int(value) if value.isdigit() else value)
+    return ids
+
+
+def main():
+    import argparse
+
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Durable lead job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Queue a list of lead ids in batches")
+    enqueue.add_argument("--queue", default="score_leads")
+    enqueue.add_argument("--ids-file", required=True, help="One lead id per line")
+    enqueue.add_argument("--batch-size", type=int, default=JOB_BATCH_SIZE)
+    enqueue.add_argument("--max-attempts", type=int, default=JOB_MAX_ATTEMPTS)
+    enqueue.add_argument("--extra", default="{}",
+                         help="JSON merged into every payload, e.g. an assistant_id")
+
+    work = commands.add_parser("work", help="Run worker processes for a queue")
+    work.add_argument("--queue", default="score_leads")
+    work.add_argument("--processes", type=int, default=JOB_WORKER_PROCESSES)
+
+    status = commands.add_parser("status", help="Print progress for a queue or run")
+    status.add_argument("--queue")
+    status.add_argument("--run-id")
+
+    requeue = commands.add_parser("requeue", help="Retry dead-lettered jobs")
+    requeue.add_argument("--queue")
+    requeue.add_argument("--run-id")
+
+    args = parser.parse_args()
+    job_queue = JobQueue(engine)
+    if args.command == "enqueue":
+        result = job_queue.enqueue(args.queue, _read_ids(args.ids_file), args.batch_size,
+                                   args.max_attempts, json.loads(args.extra))
+        print(json.dumps(result))
+    elif args.command == "work":
+        run_workers(args.queue, args.processes)
+    elif args.command == "status":
+        print(json.dumps(job_queue.status(args.queue, args.run_id), indent=2))
+    else:
+        print(json.dumps({"requeued": job_queue.requeue_dead(args.queue, args.run_id)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Local PASS/FAIL pre-classifier for yes/no style flow steps.
+
+Many steps carry a rubric such as
+
+    ### For this question: a positive response = PASS, a negative or uncertain response = FAIL ###
+
+parse_rubric() reduces a rubric like that to a polarity -> verdict map
+({"positive": "PASS", "negative": "FAIL", "uncertain": "FAIL"}). Rubrics that
+say anything beyond positive/negative/uncertain (e.g. "describes a project that
+uses AI") are not reducible and always go to the model.
+
+score_answer() matches the answer against positive, negative and uncertain
+phrase lexicons (longest phrase first, so "not sure" is uncertain and "no
+problem" positive) and returns the dominant polarity with a confidence in
+[0, 1]. Confidence drops when polarities are mixed, when the answer hedges with
+a contrast word ("yes, but ..."), asks a question back, or is long enough that
+the matched words are unlikely to carry its meaning.
+
+Negation is only understood inside whole idioms ("can't wait", "won't let you
+down", "no reason not to"). With two or more negators outside an idiom ("I
+don't think I can't") negative phrases count as uncertain, since a double
+negative is as likely a yes as a no. An answer of more than one word that
+contains any negator (including a leading "no") is never decidable locally (LocalVerdict.decidable): the
+lexicon does not know the negator's scope, so only the model may judge it.
+
+classifier.py decides locally when the confidence reaches the step's threshold
+and the answer is decidable, and uses these verdicts as the degraded mode while
+OpenAI is unavailable.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+POSITIVE, NEGATIVE, UNCERTAIN = "positive", "negative", "uncertain"
+
+# phrase -> (polarity, weight); weight 1.0 is a clear signal on its own
+LEXICON: Dict[str, Tuple[str, float]] = {}
+
+
+def _add(polarity: str, weight: float, *phrases: str):
+    for phrase in phrases:
+        LEXICON[phrase] = (polarity, weight)
+
+
+_add(POSITIVE, 1.0, "yes", "yeah", "yea", "yep", "yup", "ya", "sure", "absolutely", "definitely",
+     "certainly", "of course", "for sure", "ok", "okay", "i can", "i could", "i will",
+     "uh huh", "mhm", "count me in", "i'm in", "sounds good", "no problem",
+     "not a problem", "no doubt", "without a doubt", "no question", "why not", "totally",
+     "can do", "100", "agreed", "consistently", "always", "of course i can", "yes i can",
+     # idioms built on a negator
+     "can't wait", "cannot wait", "can not wait", "won't let you down", "can't say no",
+     "never miss", "never missed", "never say no", "no reason not to", "can't imagine not",
+     "wouldn't miss it", "couldn't agree more", "can't complain", "no complaints",
+     "not a doubt", "don't see why not", "no reason why not")
+_add(POSITIVE, 0.5, "i'll", "i would", "i'd", "i do", "i think i can", "should be fine",
+     "should be able to", "right", "correct", "likely")
+_add(NEGATIVE, 1.0, "no", "nope", "nah", "never", "not really", "can't", "cannot", "can not",
+     "won't", "wouldn't", "couldn't", "no way", "not at all", "unable", "impossible",
+     "not interested", "doubt it", "i doubt", "definitely not", "absolutely not",
+     "of course not", "certainly not", "i don't think so", "not possible", "unlikely")
+_add(NEGATIVE, 0.5, "not", "don't", "probably not", "hardly")
+_add(UNCERTAIN, 1.0, "maybe", "perhaps", "possibly", "not sure", "unsure", "i don't know",
+     "dunno", "idk", "not certain", "it depends", "depends", "hard to say", "we'll see",
+     "not always", "maybe not", "i'm not sure", "no idea", "not sure yet", "undecided")
+_add(UNCERTAIN, 0.5, "might", "hopefully", "probably", "i think so", "sometimes", "i'll try",
+     "try", "kind of", "sort of", "i guess")
+
+_PHRASES = {tuple(phrase.split()): value for phrase, value in LEXICON.items()}
+_MAX_PHRASE = max(len(words) for words in _PHRASES)
+
+CONTRAST_WORDS = frozenset(("but", "however", "although", "though", "unless", "except",
+                            "depending", "if"))
+# Common spellings without the apostrophe
+_SPELLINGS = {"cant": "can't", "dont": "don't", "wont": "won't", "wouldnt": "wouldn't",
+              "couldnt": "couldn't", "im": "i'm", "id": "i'd", "ive": "i've",
+              "didnt": "didn't", "isnt": "isn't", "doesnt": "doesn't"}
+# Words that negate what follows; any "...n't" token counts as well
+NEGATORS = frozenset(("no", "not", "never", "cannot", "none", "nobody", "nothing", "nor",
+                      "neither", "nowhere", "without"))
+LONG_ANSWER_TOKENS = 12
+CONTRAST_PENALTY = 0.6
+QUESTION_PENALTY = 0.5
+
+_TOKEN = re.compile(r"[a-z0-9']+|\?")
+
+
+def tokenize(text: str) -> list:
+    text = text.casefold().replace("’", "'").replace("%", "")
+    return [_SPELLINGS.get(token, token) for token in _TOKEN.findall(text)]
+
+
+def is_negator(word: str) -> bool:
+    return word in NEGATORS or word.endswith("n't")
+
+
+def has_negation(text: str) -> bool:
+    """Whether an answer of more than one word contains a negator"""
+    words = [token for token in tokenize(text) if token != "?"]
+    return len(words) > 1 and any(is_negator(word) for word in words)
+
+
+def _negations(words: list, start: int, end: int) -> int:
+    # An answer-initial "no" is an interjection, not a second negation
+    return sum(is_negator(words[i]) for i in range(start, end)
+               if i > 0 or words[i] != "no")
+
+
+def score_answer(text: str) -> Tuple[Optional[str], float]:
+    """Dominant polarity of an answer and the confidence in it"""
+    tokens = tokenize(text)
+    words = [token for token in tokens if token != "?"]
+    matches = []
+    negators = 0  # outside positive idioms
+    i = 0
+    while i < len(words):
+        for size in range(min(_MAX_PHRASE, len(words) - i), 0, -1):
+            match = _PHRASES.get(tuple(words[i:i + size]))
+            if match is not None:
+                matches.append(match)
+                if match[0] != POSITIVE:
+                    negators += _negations(words, i, i + size)
+                i += size
+                break
+        else:
+            negators += _negations(words, i, i + 1)
+            i += 1
+    scores = {POSITIVE: 0.0, NEGATIVE: 0.0, UNCERTAIN: 0.0}
+    for polarity, weight in matches:
+        if polarity == NEGATIVE and negators >= 2:
+            polarity = UNCERTAIN
+        scores[polarity] += weight
+    total = sum(scores.values())
+    if total == 0:
+        return None, 0.0
+    polarity = max(scores, key=scores.get)
+    confidence = scores[polarity] / total * min(1.0, scores[polarity])
+    if CONTRAST_WORDS.intersection(words):
+        confidence *= CONTRAST_PENALTY
+    if "?" in tokens:
+        confidence *= QUESTION_PENALTY
+    if len(words) > LONG_ANSWER_TOKENS:
+        confidence *= (LONG_ANSWER_TOKENS / len(words)) ** 0.5
+    return polarity, round(confidence, 4)
+
+
+_RUBRIC_SECTION = re.compile(r"###(.*?)###", re.S)
+_RUBRIC_CLAUSE = re.compile(r"([^=]+?)=\s*(PASS|FAIL)\b")
+_RUBRIC_TERMS = {"positive": POSITIVE, "affirmative": POSITIVE, "yes": POSITIVE,
+                 "negative": NEGATIVE, "no": NEGATIVE,
+                 "uncertain": UNCERTAIN, "unsure": UNCERTAIN, "unclear": UNCERTAIN,
+                 "ambiguous": UNCERTAIN, "maybe": UNCERTAIN, "neutral": UNCERTAIN}
+_RUBRIC_FILLER = frozenset(("a", "an", "the", "or", "and", "any", "response", "responses",
+                            "answer", "answers", "reply", "is"))
+
+
+@dataclass(frozen=True)
+class Rubric:
+    verdicts: Dict[str, str]  # polarity -> "PASS" / "FAIL"
+
+
+@lru_cache(maxsize=256)
+def parse_rubric(system_prompt: Optional[str]) -> Optional[Rubric]:
+    """The polarity -> verdict map of a yes/no rubric, or None if it says more than that"""
+    if not system_prompt:
+        return None
+    section = _RUBRIC_SECTION.search(system_prompt)
+    if section is None:
+        return None
+    text = section.group(1).rsplit(":", 1)[-1]
+    verdicts: Dict[str, str] = {}
+    for clause, verdict in _RUBRIC_CLAUSE.findall(text):
+        words = [word for word in re.findall(r"[a-z]+", clause.lower().split(",")[-1])
+                 if word not in _RUBRIC_FILLER]
+        if not words:
+            return None
+        for word in words:
+            polarity = _RUBRIC_TERMS.get(word)
+            if polarity is None or verdicts.get(polarity, verdict) != verdict:
+                return None
+            verdicts[polarity] = verdict
+    if POSITIVE not in verdicts or NEGATIVE not in verdicts:
+        return None
+    return Rubric(verdicts)
+
+
+@dataclass(frozen=True)
+class LocalVerdict:
+    polarity: Optional[str]
+    confidence: float
+    verdict: Optional[str]  # None when the rubric does not cover the polarity
+    decidable: bool = True  # False when negation makes the lexicon unreliable
+
+
+def judge(system_prompt: Optional[str], user_message: str) -> Optional[LocalVerdict]:
+    """Local verdict for an answer, or None when the step's rubric is not yes/no"""
+    rubric = parse_rubric(system_prompt)
+    if rubric is None:
+        return None
+    polarity, confidence = score_answer(user_message)
+    return LocalVerdict(polarity, confidence, rubric.verdicts.get(polarity),
+                        not has_negation(user_message))
+
+
+def silent_verdict(system_prompt: Optional[str]) -> Optional[str]:
+    """Verdict for an answer with no lexicon signal: the rubric's uncertain case"""
+    rubric = parse_rubric(system_prompt)
+    return rubric.verdicts.get(UNCERTAIN) if rubric is not None else None
@@ -1,25 +1,40 @@
-import os
 import time
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends, Request, status
+
+# Start of the "import backend.main" startup phase
+_import_started = time.perf_counter()
+
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple, Union
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, Query, Request, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-import uvicorn
-from openai import OpenAI
-from . import models, schemas
-from .database import engine, get_db
+from sqlalchemy import cast, desc, func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from .startup import startup_timer
+from . import (batch, classifier, compression, dbpool, dedupe, flows as flow_graph, heygen,
+               ingest, models, profiler, ratelimit, schemas, session_channel, tracing)
+from .jobs import JobQueue
+from .admin import require_admin
+from .archive import archive_conversations, conversation_archive
+from .cache import bundle_key, config_key, config_keys, flow_keys, flows_key, shared_cache
+from .database import (check_connection, engine, get_db, get_read_db, get_write_db,
+                       replica_router)
+from .session_store import session_store
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from dotenv import load_dotenv
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Environment variables are loaded from .env by backend.database
 
 # Configure API keys
 api_key = os.getenv("OPENAI_API_KEY")
@@ -30,8 +45,52 @@ HEYGEN_API_KEY = os.getenv("HEYGEN_API_KEY")
 if not HEYGEN_API_KEY:
     print("[WARNING] HEYGEN_API_KEY environment variable is not set")
 
+# "full" checks the DB connection and runs create_all on every boot.
+# "fast" expects `python -m backend.migrate` to have run and leaves the
+# connection check to the first checkout.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "full").lower()
+
+videos_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "videos")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Worker startup work that does not need to happen at import time"""
+    print(f"[FastAPI] Starting up in {STARTUP_MODE} mode")
+    with startup_timer.phase("videos directory"):
+        if not os.path.exists(videos_path):
+            os.makedirs(videos_path)
+            print(f"[FastAPI] Created videos directory at {videos_path}")
+
+    if STARTUP_MODE != "fast":
+        with startup_timer.phase("database connection check"):
+            await run_in_threadpool(check_connection)
+        with startup_timer.phase("create database tables"):
+            await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+
+    with startup_timer.phase("shared cache"):
+        shared_cache.start()
+
+    if profiler.PROFILE_CONTINUOUS:
+        profiler.continuous_profiler.start()
+
+    heygen.start_pool(HEYGEN_API_KEY)
+    session_store.start()
+    dbpool.pool_monitor.start()
+
+    startup_timer.mark_ready()
+    yield
+    # Write back in-progress sessions before the worker exits
+    await run_in_threadpool(session_store.stop)
+    await heygen.stop_pool()
+    dbpool.pool_monitor.stop()
+    profiler.continuous_profiler.stop()
+    shared_cache.stop()
+
+
 # Create FastAPI app instance
-app = FastAPI(title="AI Landing Page Generator", debug=True)
+app = FastAPI(title="AI Landing Page Generator", debug=True, lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -42,23 +101,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount videos directory
-videos_path = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "videos")
-if not os.path.exists(videos_path):
-    os.makedirs(videos_path)
-    print(f"[FastAPI] Created videos directory at {videos_path}")
-app.mount("/videos", StaticFiles(directory=videos_path), name="videos")
+# Mount videos directory; it is created in the lifespan hook if missing
+app.mount("/videos", StaticFiles(directory=videos_path, check_dir=False), name="videos")
 print(f"[FastAPI] Mounted videos directory at {videos_path}")
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
-# Email sending configuration
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
 # Email configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
@@ -66,13 +112,20 @@ SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 EMAIL_RECIPIENT = os.getenv("EMAIL_RECIPIENT", "jason@audiencesynergy.com")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "submissions@agentsynergy.ai")
+# Set to "false" for local SMTP sinks that do not offer STARTTLS
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
 
 def send_email(subject, recipient, html_content):
     """Send an email with the form submission details"""
     if not SMTP_USERNAME or not SMTP_PASSWORD:
         logger.warning("SMTP credentials not configured. Email not sent.")
         return False
-    
+
+    # Imported on first send so workers that never email do not pay for them
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
     try:
         msg = MIMEMultipart()
         msg['From'] = FROM_EMAIL
@@ -83,10 +136,13 @@ def send_email(subject, recipient, html_content):
         msg.attach(MIMEText(html_content, 'html'))
         
         # Connect to SMTP server and send email
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
+        with tracing.span("smtp.send", kind="client", **{"server.address": SMTP_SERVER,
+                                                          "server.port": SMTP_PORT}):
+            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+                if SMTP_STARTTLS:
+                    server.starttls()
+                server.login(SMTP_USERNAME, SMTP_PASSWORD)
+                server.send_message(msg)
         
         logger.info(f"Email sent successfully to {recipient}")
         return True
@@ -95,11 +151,28 @@ def send_email(subject, recipient, html_content):
         return False
 
 
+def config_to_dict(config: models.Configurations) -> dict:
+    """Shape a configuration row the way the Config schema expects"""
+    return {
+        "id": config.id,
+        "page_title": config.page_title,
+        "heygen_scene_id": config.heygen_scene_id,
+        "voice_id": config.voice_id,
+        "openai_agent_config": {
+            "assistant_id": config.openai_agent_config["assistantId"]
+        } if config.openai_agent_config else None,
+        "pass_response": config.pass_response,
+        "fail_response": config.fail_response,
+        "created_at": config.created_at,
+        "updated_at": config.updated_at
+    }
+
+
 # Configuration Endpoints
 @app.get("/configurations", response_model=List[schemas.Config])
 async def get_configurations(skip: int = 0,
                              limit: int = 100,
-                             db: Session = Depends(get_db)):
+                             db: Session = Depends(get_read_db)):
     """Get all configurations with pagination"""
     try:
         logger.info("[API] Fetching all configurations")
@@ -139,70 +212,112 @@ async def get_configurations(skip: int = 0,
                             detail=f"Database error: {str(e)}")
 
 
+# Cached reads load from the primary: a miss refills the shared cache, which must
+# not be seeded from a lagging replica. Hits never check out a connection.
 @app.get("/configurations/active", response_model=schemas.Config)
 async def get_active_config(db: Session = Depends(get_db)):
     """Get the active configuration (first one by ID)"""
     print("\n[API] Fetching active configuration")
-    config = db.query(models.Configurations).order_by(
-        models.Configurations.id.asc()).first()
 
-    if not config:
-        return {}  # Return empty object instead of 404 error
+    def load():
+        config = db.query(models.Configurations).order_by(
+            models.Configurations.id.asc()).first()
+        return config_to_dict(config) if config else None
 
-    config_dict = {
-        "id": config.id,
-        "page_title": config.page_title,
-        "heygen_scene_id": config.heygen_scene_id,
-        "voice_id": config.voice_id,
-        "openai_agent_config": {
-            "assistant_id": config.openai_agent_config["assistantId"]
-        } if config.openai_agent_config else None,
-        "pass_response": config.pass_response,
-        "fail_response": config.fail_response,
-        "created_at": config.created_at,
-        "updated_at": config.updated_at
-    }
+    config_dict = shared_cache.get_or_load(config_key("active"), load)
+    if not config_dict:
+        return {}  # Return empty object instead of 404 error
 
-    print(f"[API] Found active config: {config.id} - {config.page_title}")
+    print(f"[API] Found active config: {config_dict['id']} - {config_dict['page_title']}")
     return config_dict
 
 
+QUESTION_PREVIEW_CHARS = int(os.getenv("QUESTION_PREVIEW_CHARS", "120"))
+ListView = Query("full", pattern="^(full|summary)$",
+                 description="'summary' returns compact rows without the large columns")
+
+
+def flow_summary_query(db: Session):
+    """Flow rows for the summary listing; system_prompt is measured in SQL, never loaded"""
+    flow = models.ConversationFlow
+    return db.query(
+        flow.id, flow.config_id, flow.order, flow.video_filename,
+        func.substr(flow.agent_question, 1, QUESTION_PREVIEW_CHARS).label("agent_question_preview"),
+        func.length(flow.system_prompt).label("system_prompt_length"),
+        flow.pass_next, flow.fail_next, flow.video_only, flow.show_form, flow.form_name,
+        flow.updated_at)
+
+
+def conversation_summary_query(db: Session):
+    """Conversation rows for the summary listing; messages are read in SQL, never loaded
+
+    Messages carry no timestamps, so last_activity_at is the row's last write.
+    last_question_preview is the content of the last assistant message.
+    """
+    conversation = models.Conversations
+    messages = conversation.messages
+    if db.get_bind().dialect.name == "postgresql":
+        # The column is jsonb in databases created from db/schema.ts
+        messages = cast(messages, postgresql.JSON)
+        elements = func.json_array_elements(messages).table_valued(
+            "value", with_ordinality="position").render_derived()
+        role = elements.c.value.op("->>")("role")
+        content = elements.c.value.op("->>")("content")
+        position = elements.c.position
+    else:
+        elements = func.json_each(messages).table_valued("key", "value")
+        role = func.json_extract(elements.c.value, "$.role")
+        content = func.json_extract(elements.c.value, "$.content")
+        position = elements.c.key
+    last_question = (select(func.substr(content, 1, QUESTION_PREVIEW_CHARS))
+                     .select_from(elements)
+                     .where(role == "assistant")
+                     .order_by(position.desc())
+                     .limit(1)
+                     .scalar_subquery())
+    return db.query(
+        conversation.id, conversation.config_id, conversation.status,
+        func.coalesce(func.json_array_length(messages), 0).label("message_count"),
+        last_question.label("last_question_preview"),
+        func.coalesce(conversation.updated_at,
+                      conversation.created_at).label("last_activity_at"),
+        conversation.created_at)
+
+
 @app.get("/conversation-flows",
-         response_model=List[schemas.ConversationFlow])
+         response_model=Union[List[schemas.ConversationFlow],
+                              List[schemas.ConversationFlowSummary]])
 async def get_conversation_flows(config_id: Optional[int] = None,
                                  skip: int = 0,
                                  limit: int = 100,
-                                 db: Session = Depends(get_db)):
+                                 view: str = ListView,
+                                 db: Session = Depends(get_read_db)):
     """Get all conversation flows with optional filtering by config_id"""
-    query = db.query(models.ConversationFlow)
+    if view == "summary":
+        query = flow_summary_query(db)
+    else:
+        query = db.query(models.ConversationFlow)
     if config_id:
         query = query.filter(models.ConversationFlow.config_id == config_id)
     flows = query.offset(skip).limit(limit).all()
     return flows or []
 
 
+# Cached read, loads from the primary (see get_active_config)
 @app.get("/configurations/{config_id}", response_model=schemas.Config)
 async def get_configuration(config_id: int, db: Session = Depends(get_db)):
     """Get a specific configuration by ID"""
-    config = db.query(models.Configurations).filter(
-        models.Configurations.id == config_id).first()
-    if not config:
+
+    def load():
+        config = db.query(models.Configurations).filter(
+            models.Configurations.id == config_id).first()
+        return config_to_dict(config) if config else None
+
+    config_dict = shared_cache.get_or_load(config_key(config_id), load)
+    if not config_dict:
         raise HTTPException(status_code=404, detail="Configuration not found")
-    config_dict = {
-        "id": config.id,
-        "page_title": config.page_title,
-        "heygen_scene_id": config.heygen_scene_id,
-        "voice_id": config.voice_id,
-        "openai_agent_config": {
-            "assistant_id": config.openai_agent_config["assistantId"]
-        } if config.openai_agent_config else None,
-        "pass_response": config.pass_response,
-        "fail_response": config.fail_response,
-        "created_at": config.created_at,
-        "updated_at": config.updated_at
-    }
 
-    print(f"[API] Found active config: {config.id} - {config.page_title}")
+    print(f"[API] Found active config: {config_dict['id']} - {config_dict['page_title']}")
     return config_dict
 
 
@@ -210,19 +325,20 @@ async def get_configuration(config_id: int, db: Session = Depends(get_db)):
           response_model=schemas.Config,
           status_code=status.HTTP_201_CREATED)
 async def create_configuration(config: schemas.ConfigCreate,
-                               db: Session = Depends(get_db)):
+                               db: Session = Depends(get_write_db)):
     """Create a new configuration"""
     db_config = models.Configurations(**config.model_dump())
     db.add(db_config)
     db.commit()
     db.refresh(db_config)
+    shared_cache.invalidate(*config_keys(db_config.id))
     return db_config
 
 
 @app.put("/configurations/{config_id}", response_model=schemas.Config)
 async def update_configuration(config_id: int,
                                config: schemas.ConfigUpdate,
-                               db: Session = Depends(get_db)):
+                               db: Session = Depends(get_write_db)):
     """Update an existing configuration"""
     db_config = db.query(models.Configurations).filter(
         models.Configurations.id == config_id).first()
@@ -234,12 +350,13 @@ async def update_configuration(config_id: int,
 
     db.commit()
     db.refresh(db_config)
+    shared_cache.invalidate(*config_keys(config_id))
     return db_config
 
 
 @app.delete("/configurations/{config_id}",
             status_code=status.HTTP_204_NO_CONTENT)
-async def delete_configuration(config_id: int, db: Session = Depends(get_db)):
+async def delete_configuration(config_id: int, db: Session = Depends(get_write_db)):
     """Delete a configuration"""
     db_config = db.query(models.Configurations).filter(
         models.Configurations.id == config_id).first()
@@ -248,13 +365,14 @@ async def delete_configuration(config_id: int, db: Session = Depends(get_db)):
 
     db.delete(db_config)
     db.commit()
+    shared_cache.invalidate(*config_keys(config_id), flows_key(config_id))
     return None
 
 
 # Conversation Flow Endpoints
 @app.get("/conversation-flows/{flow_id}",
          response_model=schemas.ConversationFlow)
-async def get_conversation_flow(flow_id: int, db: Session = Depends(get_db)):
+async def get_conversation_flow(flow_id: int, db: Session = Depends(get_read_db)):
     """Get a specific conversation flow by ID"""
     flow = db.query(models.ConversationFlow).filter(
         models.ConversationFlow.id == flow_id).first()
@@ -268,12 +386,13 @@ async def get_conversation_flow(flow_id: int, db: Session = Depends(get_db)):
           response_model=schemas.ConversationFlow,
           status_code=status.HTTP_201_CREATED)
 async def create_conversation_flow(flow: schemas.ConversationFlowCreate,
-                                   db: Session = Depends(get_db)):
+                                   db: Session = Depends(get_write_db)):
     """Create a new conversation flow"""
     db_flow = models.ConversationFlow(**flow.model_dump())
     db.add(db_flow)
     db.commit()
     db.refresh(db_flow)
+    shared_cache.invalidate(*flow_keys(db_flow.config_id))
     return db_flow
 
 
@@ -281,7 +400,7 @@ async def create_conversation_flow(flow: schemas.ConversationFlowCreate,
          response_model=schemas.ConversationFlow)
 async def update_conversation_flow(flow_id: int,
                                    flow: schemas.ConversationFlowUpdate,
-                                   db: Session = Depends(get_db)):
+                                   db: Session = Depends(get_write_db)):
     """Update an existing conversation flow"""
     db_flow = db.query(models.ConversationFlow).filter(
         models.ConversationFlow.id == flow_id).first()
@@ -289,18 +408,20 @@ async def update_conversation_flow(flow_id: int,
         raise HTTPException(status_code=404,
                             detail="Conversation flow not found")
 
+    previous_config_id = db_flow.config_id
     for key, value in flow.model_dump().items():
         setattr(db_flow, key, value)
 
     db.commit()
     db.refresh(db_flow)
+    shared_cache.invalidate(*{*flow_keys(previous_config_id), *flow_keys(db_flow.config_id)})
     return db_flow
 
 
 @app.delete("/conversation-flows/{flow_id}",
             status_code=status.HTTP_204_NO_CONTENT)
 async def delete_conversation_flow(flow_id: int,
-                                   db: Session = Depends(get_db)):
+                                   db: Session = Depends(get_write_db)):
     """Delete a conversation flow"""
     db_flow = db.query(models.ConversationFlow).filter(
         models.ConversationFlow.id == flow_id).first()
@@ -310,17 +431,24 @@ async def delete_conversation_flow(flow_id: int,
 
     db.delete(db_flow)
     db.commit()
+    shared_cache.invalidate(*flow_keys(db_flow.config_id))
     return None
 
 
 # Conversation Endpoints
-@app.get("/conversations", response_model=List[schemas.Conversation])
+@app.get("/conversations",
+         response_model=Union[List[schemas.Conversation],
+                              List[schemas.ConversationSummary]])
 async def get_conversations(config_id: Optional[int] = None,
                             skip: int = 0,
                             limit: int = 100,
-                            db: Session = Depends(get_db)):
+                            view: str = ListView,
+                            db: Session = Depends(get_read_db)):
     """Get all conversations with optional filtering by config_id"""
-    query = db.query(models.Conversations)
+    if view == "summary":
+        query = conversation_summary_query(db)
+    else:
+        query = db.query(models.Conversations)
     if config_id:
         query = query.filter(models.Conversations.config_id == config_id)
     conversations = query.order_by(desc(
@@ -331,20 +459,103 @@ async def get_conversations(config_id: Optional[int] = None,
 @app.get("/conversations/{conversation_id}",
          response_model=schemas.Conversation)
 async def get_conversation(conversation_id: int,
-                           db: Session = Depends(get_db)):
+                           db: Session = Depends(get_read_db)):
     """Get a specific conversation by ID"""
     conversation = db.query(models.Conversations).filter(
         models.Conversations.id == conversation_id).first()
+    if not conversation:
+        conversation = await run_in_threadpool(conversation_archive.get, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
 
 
+@app.post("/admin/archive/run", dependencies=[Depends(require_admin)])
+def run_conversation_archival(older_than_days: Optional[float] = None,
+                              max_batches: Optional[int] = None,
+                              db: Session = Depends(get_write_db)):
+    """Move inactive conversations into compressed cold storage"""
+    kwargs = {"max_batches": max_batches}
+    if older_than_days is not None:
+        kwargs["older_than_days"] = older_than_days
+    try:
+        return archive_conversations(db, **kwargs)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/archive/stats", dependencies=[Depends(require_admin)])
+def get_archive_stats():
+    """Size of the conversation archive"""
+    return conversation_archive.stats()
+
+
+# Shared by the /admin/jobs endpoints; worker processes build their own
+job_queue = JobQueue(engine)
+
+
+@app.post("/admin/jobs", response_model=schemas.JobEnqueueResult,
+          status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+def enqueue_lead_jobs(request: schemas.JobEnqueue):
+    """Queue lead ids in batches for the workers (python -m backend.jobs work)"""
+    return job_queue.enqueue(request.queue, request.lead_ids, request.batch_size,
+                                    request.max_attempts, request.extra)
+
+
+@app.get("/admin/jobs/status", dependencies=[Depends(require_admin)])
+def get_job_status(queue: Optional[str] = None, run_id: Optional[str] = None,
+                   window_seconds: float = Query(300, gt=0, le=86400)):
+    """Progress, throughput and dead letters for a queue or one enqueue run"""
+    return job_queue.status(queue, run_id, window_seconds)
+
+
+@app.post("/admin/jobs/requeue", dependencies=[Depends(require_admin)])
+def requeue_dead_jobs(queue: Optional[str] = None, run_id: Optional[str] = None):
+    """Give dead-lettered jobs a fresh set of attempts"""
+    return {"requeued": job_queue.requeue_dead(queue, run_id)}
+
+
+IngestChunkRows = Query(ingest.INGEST_CHUNK_ROWS, ge=1, le=100000,
+                        description="Rows per chunk; each chunk is one transaction")
+
+
+@app.post("/admin/ingest/conversations", response_model=schemas.IngestResult,
+          dependencies=[Depends(require_admin)])
+async def ingest_conversations(request: Request, chunk_rows: int = IngestChunkRows):
+    """Bulk-load conversations from an NDJSON body, one ConversationIngest per line"""
+    try:
+        return await ingest.ingest_ndjson(request.stream(), ingest.CONVERSATIONS, engine,
+                                          chunk_rows)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.post("/admin/ingest/form-submissions", response_model=schemas.IngestResult,
+          dependencies=[Depends(require_admin)])
+async def ingest_form_submissions(request: Request, background_tasks: BackgroundTasks,
+                                  notify: bool = Query(False, description="Email each stored submission"),
+                                  chunk_rows: int = IngestChunkRows):
+    """
+    Bulk-load form submissions from an NDJSON body; no emails are sent unless notify=true.
+    Rows bypass the dedupe window and are stored with dedupe_window NULL.
+    """
+    stored: List[dict] = []
+    try:
+        result = await ingest.ingest_ndjson(request.stream(), ingest.FORM_SUBMISSIONS, engine,
+                                            chunk_rows, stored.extend if notify else None)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if stored:
+        background_tasks.add_task(send_submission_emails, stored)
+    result["notified"] = len(stored)
+    return result
+
+
 @app.post("/conversations",
           response_model=schemas.Conversation,
           status_code=status.HTTP_201_CREATED)
 async def create_conversation(conversation: schemas.ConversationCreate,
-                              db: Session = Depends(get_db)):
+                              db: Session = Depends(get_write_db)):
     """Create a new conversation"""
     db_conversation = models.Conversations(**conversation.model_dump())
     db.add(db_conversation)
@@ -353,15 +564,22 @@ async def create_conversation(conversation: schemas.ConversationCreate,
     return db_conversation
 
 
+async def reject_if_archived(conversation_id: int):
+    """409 for writes to an archived conversation; the archive is read-only"""
+    if await run_in_threadpool(conversation_archive.contains, conversation_id):
+        raise HTTPException(status_code=409, detail="Conversation is archived and read-only")
+
+
 @app.put("/conversations/{conversation_id}",
          response_model=schemas.Conversation)
 async def update_conversation(conversation_id: int,
                               conversation: schemas.ConversationUpdate,
-                              db: Session = Depends(get_db)):
+                              db: Session = Depends(get_write_db)):
     """Update an existing conversation"""
     db_conversation = db.query(models.Conversations).filter(
         models.Conversations.id == conversation_id).first()
     if not db_conversation:
+        await reject_if_archived(conversation_id)
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     for key, value in conversation.model_dump().items():
@@ -375,11 +593,12 @@ async def update_conversation(conversation_id: int,
 @app.delete("/conversations/{conversation_id}",
             status_code=status.HTTP_204_NO_CONTENT)
 async def delete_conversation(conversation_id: int,
-                              db: Session = Depends(get_db)):
+                              db: Session = Depends(get_write_db)):
     """Delete a conversation"""
     db_conversation = db.query(models.Conversations).filter(
         models.Conversations.id == conversation_id).first()
     if not db_conversation:
+        await reject_if_archived(conversation_id)
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     db.delete(db_conversation)
@@ -417,47 +636,105 @@ async def process_chat(request: schemas.ChatRequest):
                             detail="OpenAI API key not configured")
 
     try:
-        print("[API] Creating OpenAI client")
-        client = OpenAI(api_key=api_key)
-
-        print("[API] Sending request to OpenAI")
-        print(f"[API] System prompt: {request.system_prompt}")
-        print(f"[API] Agent question: {request.agent_question}")
-        print(f"[API] User message: {request.user_message}")
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{
-                "role": "system",
-                "content": request.system_prompt
-            }, {
-                "role": "assistant",
-                "content": request.agent_question
-            }, {
-                "role": "user",
-                "content": request.user_message
-            }],
-            timeout=25  # 25 second timeout
-        )
-
-        ai_response = response.choices[0].message.content
-        print(f"[API] OpenAI response received: {ai_response}")
-
-        # Determine the status based on the response
-        status = "pass" if ai_response.strip() == "PASS" else "fail"
-        result = {"status": status, "response": ai_response}
+        result = await classifier.classify_async(api_key,
+                                                 request.system_prompt,
+                                                 request.agent_question,
+                                                 request.user_message,
+                                                 flow_id=request.flow_id)
         print(f"[API] Returning result: {result}")
         return result
 
+    except classifier.CircuitOpenError as e:
+        print(f"[API] Classification unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"[API] Error processing chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/openai/chat/batch", dependencies=[Depends(require_admin)])
+async def process_chat_batch(request: schemas.ChatBatchRequest,
+                             db: Session = Depends(get_read_db)):
+    """Classify many answers concurrently, streaming NDJSON results as they finish"""
+    print(f"\n[API] Batch classification of {len(request.items)} items")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    if len(request.items) > batch.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422,
+                            detail=f"At most {batch.BATCH_MAX_ITEMS} items per batch")
+
+    flow_ids = {item.flow_id for item in request.items if item.flow_id is not None}
+    flows = {flow.id: flow for flow in db.query(models.ConversationFlow).filter(
+        models.ConversationFlow.id.in_(flow_ids)).all()} if flow_ids else {}
+
+    items, errors = [], []
+    for index, item in enumerate(request.items):
+        flow = flows.get(item.flow_id)
+        if item.flow_id is not None and flow is None:
+            errors.append(f"items[{index}]: flow {item.flow_id} not found")
+            continue
+        system_prompt = item.system_prompt or (flow.system_prompt if flow else None)
+        agent_question = item.agent_question or (flow.agent_question if flow else None)
+        if not system_prompt or agent_question is None:
+            errors.append(f"items[{index}]: needs a flow_id or system_prompt and agent_question")
+            continue
+        items.append(batch.BatchItem(index, item.id, item.flow_id, system_prompt,
+                                     agent_question, item.user_message))
+    if errors:
+        raise HTTPException(status_code=422, detail={"errors": errors})
+
+    concurrency = min(request.concurrency or batch.BATCH_MAX_CONCURRENCY,
+                      batch.BATCH_MAX_CONCURRENCY)
+
+    async def ndjson():
+        async for result in batch.classify_batch(api_key, items, concurrency):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.websocket("/ws/session")
+async def session_socket(websocket: WebSocket):
+    """Persistent channel for a visitor's conversation; see backend/session_channel.py"""
+    await session_channel.serve(websocket, os.getenv("OPENAI_API_KEY"))
+
+
+@app.get("/ws/stats", dependencies=[Depends(require_admin)])
+async def get_session_socket_stats():
+    """Live WebSocket sessions on this worker"""
+    return session_channel.registry.stats()
+
+
+@app.get("/session-store/stats", dependencies=[Depends(require_admin)])
+async def get_session_store_stats():
+    """In-memory sessions, how many await a flush, and flusher counters"""
+    return session_store.stats()
+
+
+@app.get("/openai/chat/stats", dependencies=[Depends(require_admin)])
+async def get_chat_stats():
+    """Classification counters, including upstream calls saved by coalescing"""
+    return classifier.get_stats()
+
+
+@app.middleware("http")
+async def tag_client(request: Request, call_next):
+    """Key for read-your-writes stickiness in database.py: the visitor session, else the IP"""
+    request.state.client_key = ratelimit.session_id(request) or ratelimit.client_ip(request)
+    return await call_next(request)
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Log all incoming requests and their responses"""
     print(f"\n[FastAPI] {request.method} {request.url.path}")
+    if request.url.path.startswith("/admin/ingest/"):
+        # Bulk bodies are streamed by the endpoint; reading them here would buffer it all
+        print(f"[FastAPI] Request body: {request.headers.get('content-length', 'streamed')} bytes")
+        response = await call_next(request)
+        print(f"[FastAPI] Response status: {response.status_code}")
+        return response
     try:
         body = await request.body()
         if body:
@@ -470,11 +747,130 @@ async def log_requests(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def limit_expensive_requests(request: Request, call_next):
+    """Token-bucket rate limiting and load shedding for OpenAI/SMTP-backed routes"""
+    limiter = ratelimit.limiter
+    rule = limiter.rule_for(request) if ratelimit.RATE_LIMIT_ENABLED else None
+    if rule is None:
+        return await call_next(request)
+
+    allowed, retry_after = limiter.check(request, rule)
+    if not allowed:
+        print(f"[RateLimit] {request.url.path} limited for {ratelimit.client_ip(request)}")
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Rate limit exceeded"},
+            headers={"Retry-After": ratelimit.retry_after_header(retry_after)})
+
+    if not await limiter.concurrency.acquire():
+        print(f"[RateLimit] Shedding {request.url.path}: "
+              f"{limiter.concurrency.in_flight} requests in flight")
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Server busy, please retry"},
+            headers={"Retry-After": "1"})
+    try:
+        return await call_next(request)
+    finally:
+        limiter.concurrency.release()
+
+
+if tracing.TRACING_ENABLED:
+    tracing.instrument_sqlalchemy()
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request, continuing the proxy's traceparent"""
+    if not tracing.TRACING_ENABLED:
+        return await call_next(request)
+
+    root, token = tracing.start_trace(f"{request.method} {request.url.path}",
+                                      request.headers.get("traceparent"), {
+                                          "http.method": request.method,
+                                          "http.target": request.url.path,
+                                          "client.address": ratelimit.client_ip(request),
+                                      })
+    error = None
+    try:
+        response = await call_next(request)
+        root.set("http.status_code", response.status_code)
+        route = request.scope.get("route")
+        if route is not None:
+            root.name = f"{request.method} {route.path}"
+            root.set("http.route", route.path)
+        response.headers["X-Trace-Id"] = root.trace.trace_id
+        return response
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        tracing.end_trace(root, token, error)
+
+
+@app.middleware("http")
+async def profile_slow_requests(request: Request, call_next):
+    """Hand slow requests to the continuous profiler so it dumps their samples"""
+    if not profiler.continuous_profiler.running:
+        return await call_next(request)
+    started = time.monotonic()
+    try:
+        return await call_next(request)
+    finally:
+        profiler.continuous_profiler.request_finished(
+            started, (time.monotonic() - started) * 1000,
+            f"{request.method} {request.url.path}")
+
+
+# Names the route holding each pooled connection (dbpool long-hold detection)
+app.add_middleware(dbpool.RouteLabelMiddleware)
+
+# Registered last so it is the outermost middleware and sees the final body
+app.add_middleware(compression.CompressionMiddleware)
+
+
+@app.get("/compression/stats", dependencies=[Depends(require_admin)])
+async def get_compression_stats():
+    """Responses compressed per encoding, bytes saved and precompressed payload use"""
+    return compression.stats.as_dict()
+
+
+@app.get("/tracing/stats", dependencies=[Depends(require_admin)])
+async def get_tracing_stats():
+    """Traces seen, kept per sampling reason, and exported"""
+    return tracing.sampler.stats()
+
+
+@app.get("/cache/stats", dependencies=[Depends(require_admin)])
+async def get_cache_stats():
+    """Shared cache hit ratios and invalidation counters for this worker"""
+    return shared_cache.stats()
+
+
+@app.get("/db/stats", dependencies=[Depends(require_admin)])
+async def get_db_stats():
+    """Replica routing decisions, health and pool status per role"""
+    return replica_router.stats()
+
+
+@app.get("/db/pool/stats", dependencies=[Depends(require_admin)])
+async def get_db_pool_stats():
+    """Checkout latency, in-use/idle gauges, long-held connections and resizes per pool"""
+    return dbpool.stats()
+
+
+@app.get("/rate-limit/stats", dependencies=[Depends(require_admin)])
+async def get_rate_limit_stats():
+    """Admission control counters and configured rules"""
+    return ratelimit.limiter.stats()
+
+
 @app.post("/configs/{config_id}/flows",
           response_model=schemas.ConversationFlow)
 async def create_conversation_flow(config_id: int,
                                    flow: schemas.ConversationFlowCreate,
-                                   db: Session = Depends(get_db)):
+                                   db: Session = Depends(get_write_db)):
     """Create a new conversation flow"""
     print(f"\n[API] Creating new flow for config {config_id}")
     print(f"[API] Flow data received: {flow.model_dump_json()}")
@@ -488,6 +884,7 @@ async def create_conversation_flow(config_id: int,
         db.add(db_flow)
         db.commit()
         db.refresh(db_flow)
+        shared_cache.invalidate(*flow_keys(config_id))
         print(f"[API] Flow created successfully with ID: {db_flow.id}")
         return db_flow
 
@@ -497,29 +894,134 @@ async def create_conversation_flow(config_id: int,
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Cached read, loads from the primary (see get_active_config)
 @app.get("/configs/{config_id}/flows",
          response_model=List[schemas.ConversationFlow])
 async def get_conversation_flows(config_id: int,
                                  db: Session = Depends(get_db)):
     """Get all conversation flows for a configuration"""
     print(f"\n[API] Fetching flows for config {config_id}")
-    flows = db.query(models.ConversationFlow).filter(
-        models.ConversationFlow.config_id == config_id).order_by(
-            models.ConversationFlow.order).all()
+
+    def load():
+        flows = db.query(models.ConversationFlow).filter(
+            models.ConversationFlow.config_id == config_id).order_by(
+                models.ConversationFlow.order).all()
+        return [schemas.ConversationFlow.model_validate(flow) for flow in flows]
+
+    flows = shared_cache.get_or_load(flows_key(config_id), load)
     print(f"[API] Found {len(flows)} flows")
     for flow in flows:
         print(
-            f"[API] Flow {flow.id}: order={flow.order}, video_only={flow.video_only}"
+            f"[API] Flow {flow['id']}: order={flow['order']}, video_only={flow['video_only']}"
         )
     return flows
 
 
+# Cached read, loads from the primary (see get_active_config)
+@app.get("/configs/{config_id}/bundle", response_model=schemas.ConfigBundle)
+def get_config_bundle(config_id: int, request: Request, db: Session = Depends(get_db)):
+    """Configuration and its ordered flow steps in one response, served precompressed"""
+
+    def load():
+        config = db.query(models.Configurations).filter(
+            models.Configurations.id == config_id).first()
+        if config is None:
+            return None
+        flows = db.query(models.ConversationFlow).filter(
+            models.ConversationFlow.config_id == config_id).order_by(
+                models.ConversationFlow.order).all()
+        return schemas.ConfigBundle(
+            config=config_to_dict(config),
+            flows=[schemas.ConversationFlow.model_validate(flow) for flow in flows])
+
+    payload = shared_cache.get_or_load_encoded(bundle_key(config_id), load)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Configuration not found")
+    return payload.response(request)
+
+
+def _apply_flow_graph(db: Session, config_id: int,
+                      items: List[schemas.ConversationFlowBulkItem],
+                      delete_missing: bool) -> schemas.ConversationFlowBulkResult:
+    """Validate and apply a complete set of flow steps for one configuration"""
+    config = db.query(models.Configurations).filter(
+        models.Configurations.id == config_id).first()
+    if not config:
+        raise HTTPException(status_code=404, detail="Configuration not found")
+
+    kept_orders = set()
+    if not delete_missing:
+        kept_orders = {order for (order,) in db.query(models.ConversationFlow.order).filter(
+            models.ConversationFlow.config_id == config_id)}
+    errors = flow_graph.validate_flow_graph(items, kept_orders)
+    if errors:
+        print(f"[API] Rejected flow graph for config {config_id}: {errors}")
+        raise HTTPException(status_code=422, detail={"errors": errors})
+
+    try:
+        inserted, updated, deleted = flow_graph.apply_flows(db, config_id, items,
+                                                            delete_missing)
+    except Exception as e:
+        print(f"[API] Error applying flows: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        shared_cache.invalidate(*flow_keys(config_id))
+
+    print(f"[API] Applied flows for config {config_id}: "
+          f"{inserted} inserted, {updated} updated, {deleted} deleted")
+    flows = db.query(models.ConversationFlow).filter(
+        models.ConversationFlow.config_id == config_id).order_by(
+            models.ConversationFlow.order).all()
+    return schemas.ConversationFlowBulkResult(inserted=inserted, updated=updated,
+                                              deleted=deleted, flows=flows)
+
+
+@app.put("/configs/{config_id}/flows:bulk",
+         response_model=schemas.ConversationFlowBulkResult)
+def bulk_upsert_conversation_flows(config_id: int,
+                                   payload: schemas.ConversationFlowBulkUpsert,
+                                   db: Session = Depends(get_write_db)):
+    """Replace a configuration's flow graph in one transaction"""
+    print(f"\n[API] Bulk upsert of {len(payload.flows)} flows for config {config_id}")
+    return _apply_flow_graph(db, config_id, payload.flows, payload.delete_missing)
+
+
+@app.get("/configs/{config_id}/flows.csv")
+def export_conversation_flows_csv(config_id: int, db: Session = Depends(get_read_db)):
+    """Download a configuration's flows as CSV"""
+    flows = db.query(models.ConversationFlow).filter(
+        models.ConversationFlow.config_id == config_id).order_by(
+            models.ConversationFlow.order).all()
+    print(f"[API] Exporting {len(flows)} flows for config {config_id} as CSV")
+    return StreamingResponse(
+        flow_graph.export_flows_csv(flows),
+        media_type="text/csv",
+        headers={"Content-Disposition":
+                 f'attachment; filename="config_{config_id}_flows.csv"'})
+
+
+@app.put("/configs/{config_id}/flows.csv",
+         response_model=schemas.ConversationFlowBulkResult)
+async def import_conversation_flows_csv(config_id: int,
+                                        request: Request,
+                                        delete_missing: bool = True,
+                                        db: Session = Depends(get_write_db)):
+    """Replace a configuration's flow graph from an uploaded CSV body"""
+    print(f"\n[API] Importing flows CSV for config {config_id}")
+    items, errors = await flow_graph.read_flows_csv(request.stream())
+    if errors:
+        print(f"[API] Rejected flows CSV for config {config_id}: {errors}")
+        raise HTTPException(status_code=422, detail={"errors": errors})
+    return await run_in_threadpool(_apply_flow_graph, db, config_id, items,
+                                   delete_missing)
+
+
 @app.put("/configs/{config_id}/flows/{flow_id}",
          response_model=schemas.ConversationFlow)
 async def update_conversation_flow(config_id: int,
                                    flow_id: int,
                                    flow_update: schemas.ConversationFlowCreate,
-                                   db: Session = Depends(get_db)):
+                                   db: Session = Depends(get_write_db)):
     """Update an existing conversation flow"""
     print(f"\n[API] Updating flow {flow_id} for config {config_id}")
     print(f"[API] Update data received: {flow_update.model_dump_json()}")
@@ -540,6 +1042,7 @@ async def update_conversation_flow(config_id: int,
 
         db.commit()
         db.refresh(db_flow)
+        shared_cache.invalidate(*{*flow_keys(config_id), *flow_keys(db_flow.config_id)})
         print(f"[API] Flow updated successfully")
         return db_flow
 
@@ -549,6 +1052,57 @@ async def update_conversation_flow(config_id: int,
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/avatar/session")
+async def create_avatar_session(request: Optional[schemas.AvatarSessionRequest] = None,
+                                db: Session = Depends(get_db)):
+    """Hand out a pre-warmed HeyGen streaming session for a configuration's avatar"""
+    pool = heygen.avatar_pool
+    if pool is None:
+        raise HTTPException(status_code=503, detail="HeyGen is not configured")
+    config_id = request.config_id if request else None
+
+    def load():
+        query = db.query(models.Configurations)
+        if config_id is None:
+            config = query.order_by(models.Configurations.id.asc()).first()
+        else:
+            config = query.filter(models.Configurations.id == config_id).first()
+        return config_to_dict(config) if config else None
+
+    config_dict = shared_cache.get_or_load(
+        config_key("active" if config_id is None else config_id), load)
+    if not config_dict:
+        raise HTTPException(status_code=404, detail="Configuration not found")
+
+    try:
+        return await pool.acquire((config_dict["heygen_scene_id"], config_dict["voice_id"] or None))
+    except Exception as e:
+        print(f"[HeyGen] Could not create a streaming session: {e}")
+        raise HTTPException(status_code=502, detail="Could not create a HeyGen streaming session")
+
+
+@app.delete("/avatar/session/{session_id}")
+async def stop_avatar_session(session_id: str):
+    """Stop a streaming session handed out by POST /avatar/session"""
+    pool = heygen.avatar_pool
+    if pool is None:
+        raise HTTPException(status_code=503, detail="HeyGen is not configured")
+    try:
+        await pool.stop(session_id)
+    except Exception as e:
+        print(f"[HeyGen] Could not stop session {session_id}: {e}")
+        raise HTTPException(status_code=502, detail="Could not stop the HeyGen streaming session")
+    return {"stopped": session_id}
+
+
+@app.get("/avatar/pool/stats", dependencies=[Depends(require_admin)])
+async def get_avatar_pool_stats():
+    """Pre-warmed sessions per avatar, their targets and the hit ratio"""
+    if heygen.avatar_pool is None:
+        return {"running": False}
+    return heygen.avatar_pool.stats()
+
+
 @app.get("/videos")
 async def get_available_videos():
     """Get list of available video files"""
@@ -576,7 +1130,7 @@ async def get_available_videos():
 
 
 @app.get("/configs", response_model=List[schemas.Config])
-async def get_all_configs(db: Session = Depends(get_db)):
+async def get_all_configs(db: Session = Depends(get_read_db)):
     """
     Fetch all configurations from the database.
     """
@@ -613,6 +1167,7 @@ class ChatRequest(BaseModel):
     system_prompt: str
     agent_question: str
     user_message: str
+    flow_id: Optional[int] = None
 
 
 @app.post("/chat")
@@ -627,119 +1182,141 @@ def process_chat(request: ChatRequest):
             raise HTTPException(status_code=500,
                                 detail="OpenAI API key not configured")
 
-        print("[API] Creating OpenAI client")
-        client = OpenAI(api_key=api_key)
-
-        print("[API] Sending request to OpenAI")
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{
-                "role": "system",
-                "content": request.system_prompt
-            }, {
-                "role": "assistant",
-                "content": request.agent_question
-            }, {
-                "role": "user",
-                "content": request.user_message
-            }],
-            timeout=25  # 25 second timeout
-        )
-
-        ai_response = response.choices[0].message.content
-        print(f"[API] OpenAI response received: {ai_response}")
-
-        # Determine the status based on the response
-        status = "pass" if ai_response.strip() == "PASS" else "fail"
-        result = {"status": status, "response": ai_response}
+        result = classifier.classify(api_key, request.system_prompt,
+                                     request.agent_question,
+                                     request.user_message,
+                                     flow_id=request.flow_id)
         print(f"[API] Returning result: {result}")
         return result
 
+    except classifier.CircuitOpenError as e:
+        print(f"[API] Classification unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"[API] Error processing chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # Form Submission Endpoints
+def form_submission_email(fields: dict) -> Tuple[str, str]:
+    """Subject and HTML body of the notification for a stored form submission"""
+    # Determine email subject based on form name
+    if fields["form_name"] == "SubmitInterestForm":
+        email_subject = "AI Mastermind Interest"
+    elif fields["form_name"] == "SubmitReconsiderationForm":
+        email_subject = "AI Mastermind Reconsideration Request"
+    else:
+        email_subject = f"Form Submission: {fields['form_name']}"
+    
+    # Create HTML content for the email
+    html_content = f"""
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            h2 {{ color: #333; border-bottom: 1px solid #ddd; padding-bottom: 10px; }}
+            .field {{ margin-bottom: 15px; }}
+            .label {{ font-weight: bold; color: #555; }}
+            .value {{ margin-top: 5px; }}
+            .footer {{ margin-top: 30px; font-size: 0.9em; color: #777; border-top: 1px solid #ddd; padding-top: 10px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h2>{email_subject}</h2>
+            <div class="field">
+                <div class="label">Name:</div>
+                <div class="value">{fields["name"]}</div>
+            </div>
+            <div class="field">
+                <div class="label">Email:</div>
+                <div class="value">{fields["email"]}</div>
+            </div>
+            <div class="field">
+                <div class="label">Phone:</div>
+                <div class="value">{fields.get("phone") or "Not provided"}</div>
+            </div>
+            <div class="field">
+                <div class="label">Message:</div>
+                <div class="value">{fields.get("message") or "Not provided"}</div>
+            </div>
+            <div class="field">
+                <div class="label">IP Address:</div>
+                <div class="value">{fields.get("ip_address") or "Unknown"}</div>
+            </div>
+            <div class="field">
+                <div class="label">Submission Time:</div>
+                <div class="value">{fields["created_at"]}</div>
+            </div>
+            <div class="footer">
+                This is an automated email from your AI Mastermind application.
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    return email_subject, html_content
+
+
+def send_submission_emails(submissions: List[dict]):
+    """Notify about bulk-ingested submissions, after the ingest response has been sent"""
+    failed = 0
+    for fields in submissions:
+        subject, html_content = form_submission_email(fields)
+        if not send_email(subject=subject, recipient=EMAIL_RECIPIENT, html_content=html_content):
+            failed += 1
+    if failed:
+        logger.warning(f"[API] {failed} of {len(submissions)} ingest notifications could not be sent")
+
+
 @app.post("/form-submissions", status_code=status.HTTP_201_CREATED)
 async def create_form_submission(submission: schemas.FormSubmissionCreate, 
                                 request: Request,
-                                db: Session = Depends(get_db)):
+                                db: Session = Depends(get_write_db)):
     """Save a form submission and send email notification"""
     logger.info(f"[API] Received form submission for form: {submission.form_name}")
-    
+
+    key = dedupe.dedupe_key(submission.form_name, submission.email)
+    # The visitor's address behind the proxy, as the rate limiter sees it
+    client_ip = ratelimit.client_ip(request)
+    if not dedupe.burst_detector.check(client_ip, key[1]):
+        logger.warning(f"[API] Rejected form submission burst from {client_ip}")
+        raise HTTPException(status_code=429, detail="Too many submissions, please try again later")
+    previous_id = dedupe.recent_submissions.reserve(key)
+    if previous_id is not None:
+        return duplicate_submission_response(previous_id)
+
     try:
-        # Get client IP address
-        client_ip = request.client.host if request.client else None
         submission_dict = submission.model_dump()
+        submission_dict["dedupe_window"] = dedupe.dedupe_window()
         
         # Add IP address to the submission
-        if client_ip:
+        if client_ip != "unknown":
             submission_dict["ip_address"] = client_ip
         
         # Create database model
         db_submission = models.FormSubmissions(**submission_dict)
         db.add(db_submission)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same (form, email) in this window
+            db.rollback()
+            existing = db.query(models.FormSubmissions.id).filter(
+                models.FormSubmissions.form_name == submission.form_name,
+                func.lower(models.FormSubmissions.email) == key[1],
+                models.FormSubmissions.dedupe_window == submission_dict["dedupe_window"]).first()
+            if existing is None:
+                raise
+            dedupe.recent_submissions.remember(key, existing.id)
+            return duplicate_submission_response(existing.id)
         db.refresh(db_submission)
+        dedupe.recent_submissions.remember(key, db_submission.id)
         
-        # Determine email subject based on form name
-        if submission.form_name == "SubmitInterestForm":
-            email_subject = "AI Mastermind Interest"
-        elif submission.form_name == "SubmitReconsiderationForm":
-            email_subject = "AI Mastermind Reconsideration Request"
-        else:
-            email_subject = f"Form Submission: {submission.form_name}"
-        
-        # Create HTML content for the email
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                h2 {{ color: #333; border-bottom: 1px solid #ddd; padding-bottom: 10px; }}
-                .field {{ margin-bottom: 15px; }}
-                .label {{ font-weight: bold; color: #555; }}
-                .value {{ margin-top: 5px; }}
-                .footer {{ margin-top: 30px; font-size: 0.9em; color: #777; border-top: 1px solid #ddd; padding-top: 10px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h2>{email_subject}</h2>
-                <div class="field">
-                    <div class="label">Name:</div>
-                    <div class="value">{submission.name}</div>
-                </div>
-                <div class="field">
-                    <div class="label">Email:</div>
-                    <div class="value">{submission.email}</div>
-                </div>
-                <div class="field">
-                    <div class="label">Phone:</div>
-                    <div class="value">{submission.phone or "Not provided"}</div>
-                </div>
-                <div class="field">
-                    <div class="label">Message:</div>
-                    <div class="value">{submission.message or "Not provided"}</div>
-                </div>
-                <div class="field">
-                    <div class="label">IP Address:</div>
-                    <div class="value">{client_ip or "Unknown"}</div>
-                </div>
-                <div class="field">
-                    <div class="label">Submission Time:</div>
-                    <div class="value">{db_submission.created_at}</div>
-                </div>
-                <div class="footer">
-                    This is an automated email from your AI Mastermind application.
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+        email_subject, html_content = form_submission_email(
+            {**submission_dict, "created_at": db_submission.created_at})
+
         # Send email notification
         email_sent = send_email(
             subject=email_subject,
@@ -759,9 +1336,78 @@ async def create_form_submission(submission: schemas.FormSubmissionCreate,
         }
         
     except Exception as e:
+        dedupe.recent_submissions.release(key)
         logger.error(f"[API] Error processing form submission: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error saving form submission: {str(e)}")
 
 
+def duplicate_submission_response(submission_id: int) -> JSONResponse:
+    """Idempotent answer for a repeat of a submission that is already stored"""
+    logger.info(f"[API] Duplicate form submission (original id {submission_id})")
+    return JSONResponse(status_code=status.HTTP_200_OK, content={
+        "success": True,
+        "id": submission_id if submission_id != dedupe.PENDING else None,
+        "message": "Form submission already received",
+        "email_sent": False,
+        "duplicate": True,
+    })
+
+
+@app.get("/form-submissions/stats", dependencies=[Depends(require_admin)])
+async def get_form_submission_stats():
+    """Duplicate and burst rejection counters for this worker"""
+    return dedupe.stats()
+
+
+@app.get("/debug/startup", dependencies=[Depends(require_admin)])
+async def get_startup_timing():
+    """Per-phase startup timing for this worker"""
+    return {"mode": STARTUP_MODE, **startup_timer.report()}
+
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(seconds: float = Query(5, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+                         interval_ms: float = Query(profiler.PROFILE_INTERVAL_MS, ge=1, le=1000),
+                         include_idle: bool = False,
+                         format: str = Query("json", pattern="^(json|collapsed)$")):
+    """Sample this worker's thread stacks for `seconds` and return a profile"""
+    sampler = profiler.begin_profile(interval_ms, include_idle)
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    print(f"[Profiler] Profiling worker {os.getpid()} for {seconds}s every {interval_ms}ms")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        result = await run_in_threadpool(profiler.end_profile, sampler, seconds)
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return result
+
+
+@app.get("/debug/profile/continuous", dependencies=[Depends(require_admin)])
+async def get_continuous_profile(seconds: Optional[float] = Query(None, gt=0),
+                                 format: str = Query("json", pattern="^(json|collapsed)$")):
+    """Profile from the continuous sampler's recent window"""
+    result = await run_in_threadpool(profiler.continuous_profiler.window_profile, seconds)
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return result
+
+
+@app.post("/debug/profile/continuous", dependencies=[Depends(require_admin)])
+async def toggle_continuous_profile(enabled: bool):
+    """Start or stop continuous sampling on this worker"""
+    if enabled:
+        profiler.continuous_profiler.start()
+    else:
+        await run_in_threadpool(profiler.continuous_profiler.stop)
+    return {"running": profiler.continuous_profiler.running, "pid": os.getpid()}
+
+
+startup_timer.phases.append(
+    ("import backend.main", (time.perf_counter() - _import_started) * 1000))
+
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,22 @@
+"""
+Explicit schema creation step.
+
+Run once per deploy, before starting the workers:
+
+    python -m backend.migrate
+
+Workers started with STARTUP_MODE=fast then skip create_all on boot.
+"""
+from . import models
+from .database import check_connection, engine
+
+
+def migrate():
+    check_connection()
+    print("[Migrate] Creating missing tables")
+    models.Base.metadata.create_all(bind=engine)
+    print("[Migrate] Schema is up to date")
+
+
+if __name__ == "__main__":
+    migrate()
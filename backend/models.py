@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -53,10 +53,18 @@ class Conversations(Base):
     status = Column(String, nullable=False, default='ongoing')
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set for /ws/session conversations, written by backend/session_store.py
+    session_id = Column(String, nullable=True)
+    current_order = Column(Integer, nullable=True)
+    verdicts = Column(JSON, nullable=True)
 
     # Relationships
     configuration = relationship("Configurations", back_populates="conversations")
 
+    __table_args__ = (
+        Index("conversations_session_id_idx", "session_id", unique=True),
+    )
+
 
 class FormSubmissions(Base):
     __tablename__ = "form_submissions"
@@ -69,4 +77,39 @@ class FormSubmissions(Base):
     message = Column(String, nullable=True)
     ip_address = Column(String, nullable=True)
     additional_data = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Submission time bucket; see backend/dedupe.py
+    dedupe_window = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("form_submissions_dedupe_idx", "form_name", func.lower(email), "dedupe_window",
+              unique=True,
+              postgresql_where=dedupe_window.isnot(None),
+              sqlite_where=dedupe_window.isnot(None)),
+    )
+
+class Jobs(Base):
+    """Lead batch jobs; claimed, retried and dead-lettered by backend/jobs.py"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    queue = Column(String, nullable=False)
+    run_id = Column(String, nullable=True)
+    payload = Column(JSON, nullable=False)
+    batch_size = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default='queued')
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+    result = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("jobs_claim_idx", "queue", "status", "run_after"),
+        Index("jobs_run_idx", "run_id", "status"),
+    )
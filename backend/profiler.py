@@ -0,0 +1,253 @@
+"""
+Sampling profiler for a running worker.
+
+A background thread reads every thread's stack with sys._current_frames() at a
+fixed interval, so nothing is instrumented and the overhead is one stack walk
+per thread per tick. Results are collapsed stacks ("a;b;c 42", the input format
+of flamegraph.pl and speedscope) plus the leaf frames with the most samples,
+i.e. the top frames by self time.
+
+Stacks whose leaf is a blocking wait (idle threadpool workers, the event loop
+sitting in select) are left out unless asked for, since they would otherwise
+dominate every profile.
+
+- profile(): on-demand, for GET /debug/profile?seconds=N
+- ContinuousProfiler: optional low-rate sampler (PROFILE_CONTINUOUS=true) that
+  keeps the last PROFILE_WINDOW_SECONDS of samples and, when a request takes
+  longer than PROFILE_SLOW_REQUEST_MS, writes the samples taken during that
+  request to PROFILE_DIR.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_CONTINUOUS = os.getenv("PROFILE_CONTINUOUS", "false").lower() == "true"
+PROFILE_CONTINUOUS_INTERVAL_MS = float(os.getenv("PROFILE_CONTINUOUS_INTERVAL_MS", "50"))
+PROFILE_WINDOW_SECONDS = float(os.getenv("PROFILE_WINDOW_SECONDS", "60"))
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "2000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MIN_DUMP_INTERVAL = float(os.getenv("PROFILE_MIN_DUMP_INTERVAL", "10"))
+
+# (filename, function) pairs where a thread is blocked rather than running
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+}
+
+Stack = Tuple[str, ...]
+
+_labels: Dict[Tuple[object, int], str] = {}
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    key = (code, frame.f_lineno)
+    label = _labels.get(key)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = _labels[key] = f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+    return label
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def sample_stacks(skip_thread: int, include_idle: bool = False) -> List[Stack]:
+    """Current stack of every other thread, root first"""
+    stacks = []
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == skip_thread or (not include_idle and _is_idle(frame)):
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_label(frame))
+            frame = frame.f_back
+        labels.reverse()
+        stacks.append(tuple(labels))
+    return stacks
+
+
+def summarize(stacks: Counter, samples: int, interval_ms: float, top: int = 25) -> dict:
+    """Collapsed-stack text and top self-time frames for a set of stack counts"""
+    self_counts: Counter = Counter()
+    for stack, count in stacks.items():
+        self_counts[stack[-1]] += count
+    total = sum(stacks.values())
+    return {
+        "samples": samples,
+        "interval_ms": interval_ms,
+        "stacks_sampled": total,
+        "collapsed": "\n".join(f"{';'.join(stack)} {count}"
+                               for stack, count in stacks.most_common()),
+        "top_self": [{
+            "frame": frame,
+            "samples": count,
+            "percent": round(100 * count / total, 1),
+            "estimated_ms": round(count * interval_ms, 1),
+        } for frame, count in self_counts.most_common(top)],
+    }
+
+
+class StackSampler:
+    """Samples all threads every `interval` seconds until stopped"""
+
+    def __init__(self, interval: float, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.stacks.update(sample_stacks(me, self.include_idle))
+            self.samples += 1
+            next_tick += self.interval
+            self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+
+_on_demand_lock = threading.Lock()
+
+
+def begin_profile(interval_ms: float = PROFILE_INTERVAL_MS,
+                  include_idle: bool = False) -> Optional[StackSampler]:
+    """Start an on-demand sampler, or None if one is already running on this worker"""
+    if not _on_demand_lock.acquire(blocking=False):
+        return None
+    return StackSampler(interval_ms / 1000, include_idle).start()
+
+
+def end_profile(sampler: StackSampler, seconds: float) -> dict:
+    try:
+        sampler.stop()
+    finally:
+        _on_demand_lock.release()
+    result = summarize(sampler.stacks, sampler.samples, sampler.interval * 1000)
+    result["seconds"] = seconds
+    result["pid"] = os.getpid()
+    return result
+
+
+class ContinuousProfiler:
+    """Low-rate sampler that keeps a time window of samples for slow-request dumps"""
+
+    def __init__(self, interval_ms: float, window_seconds: float, slow_ms: float,
+                 directory: str, min_dump_interval: float):
+        self.interval = interval_ms / 1000
+        self.window = window_seconds
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self.min_dump_interval = min_dump_interval
+        self._samples: Deque[Tuple[float, Stack]] = deque()
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[float, float, str]] = []
+        self._last_dump = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dumps = 0
+        self.skipped_dumps = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="continuous-profiler",
+                                        daemon=True)
+        self._thread.start()
+        print(f"[Profiler] Continuous sampling every {self.interval * 1000:.0f}ms, "
+              f"dumping requests slower than {self.slow_ms:.0f}ms to {self.directory}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            stacks = sample_stacks(me)
+            with self._lock:
+                self._samples.extend((now, stack) for stack in stacks)
+                while self._samples and self._samples[0][0] < now - self.window:
+                    self._samples.popleft()
+                pending, self._pending = self._pending, []
+            for started, ended, label in pending:
+                self._dump(started, ended, label)
+
+    def request_finished(self, started: float, duration_ms: float, label: str):
+        """Called per request (monotonic start time); queues a dump if it was slow"""
+        if duration_ms < self.slow_ms or not self.running:
+            return
+        with self._lock:
+            if started - self._last_dump < self.min_dump_interval:
+                self.skipped_dumps += 1
+                return
+            self._last_dump = started
+            self._pending.append((started, started + duration_ms / 1000, label))
+
+    def _dump(self, started: float, ended: float, label: str):
+        with self._lock:
+            stacks = Counter(stack for at, stack in self._samples if started <= at <= ended)
+        if not stacks:
+            return
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")[:60]
+        path = os.path.join(self.directory, time.strftime("slow-%Y%m%dT%H%M%S", time.gmtime())
+                            + f"-{os.getpid()}-{safe_label}.collapsed")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w") as f:
+                f.write("\n".join(f"{';'.join(stack)} {count}"
+                                  for stack, count in stacks.most_common()) + "\n")
+            self.dumps += 1
+            print(f"[Profiler] Slow request {label} ({(ended - started) * 1000:.0f}ms) "
+                  f"profile written to {path}")
+        except OSError as e:
+            print(f"[Profiler] Could not write {path}: {e}")
+
+    def window_profile(self, seconds: Optional[float] = None) -> dict:
+        """Summary of the samples held for the last `seconds` (default: whole window)"""
+        since = time.monotonic() - (seconds or self.window)
+        with self._lock:
+            stacks = Counter(stack for at, stack in self._samples if at >= since)
+        result = summarize(stacks, int((seconds or self.window) / self.interval),
+                           self.interval * 1000)
+        result.update({"running": self.running, "dumps": self.dumps,
+                       "skipped_dumps": self.skipped_dumps, "pid": os.getpid()})
+        return result
+
+
+continuous_profiler = ContinuousProfiler(PROFILE_CONTINUOUS_INTERVAL_MS, PROFILE_WINDOW_SECONDS,
+                                         PROFILE_SLOW_REQUEST_MS, PROFILE_DIR,
+                                         PROFILE_MIN_DUMP_INTERVAL)
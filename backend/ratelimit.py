@@ -0,0 +1,220 @@
+"""
+Admission control for the expensive endpoints.
+
+Every request to a limited route must take a token from two buckets, one keyed
+by client IP and one by visitor session (X-Session-Id header), before it runs.
+A global in-flight cap sheds excess load with 429 + Retry-After instead of
+letting requests queue without bound behind OpenAI and the DB pool.
+
+Bucket state lives behind RateLimitBackend so a shared store (e.g. Redis) can
+replace InMemoryRateLimitBackend when several workers need one budget.
+
+Rules are configured with RATE_LIMITS, a JSON object of path -> rule:
+
+    RATE_LIMITS='{"/openai/chat": {"rate": 0.5, "burst": 10}}'
+
+rate is tokens per second and burst the bucket size.
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    rate: float  # tokens added per second
+    burst: int  # bucket capacity
+
+
+DEFAULT_RULES = {
+    "/openai/chat": RateLimitRule(rate=20 / 60, burst=10),
+    "/chat": RateLimitRule(rate=20 / 60, burst=10),
+    "/form-submissions": RateLimitRule(rate=5 / 60, burst=3),
+    "/avatar/session": RateLimitRule(rate=6 / 60, burst=3),
+    # "start" messages on /ws/session, per client IP (session_channel.py)
+    "/ws/session": RateLimitRule(rate=10 / 60, burst=5),
+}
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, rule: RateLimitRule, now: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Refill, then try to spend `cost` tokens; returns (allowed, retry_after_seconds)"""
+        self.tokens = min(rule.burst, self.tokens + (now - self.updated) * rule.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        if rule.rate <= 0:
+            return False, 60.0
+        return False, (cost - self.tokens) / rule.rate
+
+
+class RateLimitBackend(ABC):
+    """Storage for bucket state; implementations must be safe to call from any thread"""
+
+    @abstractmethod
+    def acquire(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets, least recently used keys are dropped beyond max_keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.max_keys = max_keys
+
+    def acquire(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rule.burst, now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(rule, now, cost)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tracked_keys": len(self._buckets)}
+
+
+class ConcurrencyLimiter:
+    """Global cap on in-flight expensive requests with a short, bounded wait"""
+
+    def __init__(self, max_in_flight: int, max_wait: float):
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+def _rules_from_env() -> Dict[str, RateLimitRule]:
+    rules = dict(DEFAULT_RULES)
+    raw = os.getenv("RATE_LIMITS")
+    if raw:
+        try:
+            for path, values in json.loads(raw).items():
+                rules[path] = RateLimitRule(rate=float(values["rate"]), burst=int(values["burst"]))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[RateLimit] Ignoring invalid RATE_LIMITS: {e}")
+    return rules
+
+
+def client_ip(request: Request) -> str:
+    """Originating client address.
+
+    Each trusted proxy appends the address it saw to X-Forwarded-For, so only the
+    last TRUSTED_PROXY_HOPS entries can be believed; anything left of them was
+    sent by the client. With no trusted hops the header is ignored.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+            if entries:
+                return entries[-min(TRUSTED_PROXY_HOPS, len(entries))]
+    return request.client.host if request.client else "unknown"
+
+
+def session_id(request: Request) -> Optional[str]:
+    return request.headers.get("x-session-id") or request.cookies.get("session_id")
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, rules: Dict[str, RateLimitRule],
+                 concurrency: ConcurrencyLimiter):
+        self.backend = backend
+        self.rules = rules
+        self.concurrency = concurrency
+        self.allowed = 0
+        self.limited: Dict[str, int] = {}
+
+    def rule_for(self, request: Request) -> Optional[RateLimitRule]:
+        if request.method != "POST":
+            return None
+        return self.rules.get(request.url.path)
+
+    def check(self, request: Request, rule: RateLimitRule) -> Tuple[bool, float]:
+        """Take a token from the IP bucket and, when known, the session bucket"""
+        path = request.url.path
+        keys = [f"ip:{client_ip(request)}:{path}"]
+        session = session_id(request)
+        if session:
+            keys.append(f"session:{session}:{path}")
+
+        for key in keys:
+            allowed, retry_after = self.backend.acquire(key, rule)
+            if not allowed:
+                self.limited[path] = self.limited.get(path, 0) + 1
+                return False, retry_after
+        self.allowed += 1
+        return True, 0.0
+
+    def stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "rate_limited": dict(self.limited),
+            "shed": self.concurrency.shed,
+            "in_flight": self.concurrency.in_flight,
+            "max_in_flight": self.concurrency.max_in_flight,
+            "rules": {path: {"rate": r.rate, "burst": r.burst} for path, r in self.rules.items()},
+            "backend": self.backend.stats(),
+        }
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+# Proxies in front of the API that append to X-Forwarded-For (the Express server
+# is one). RATE_LIMIT_TRUST_FORWARDED=true is shorthand for a single hop.
+TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+TRUSTED_PROXY_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_PROXY_HOPS", "1" if TRUST_FORWARDED else "0"))
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+
+limiter = RateLimiter(
+    backend=InMemoryRateLimitBackend(),
+    rules=_rules_from_env(),
+    concurrency=ConcurrencyLimiter(
+        max_in_flight=int(os.getenv("RATE_LIMIT_MAX_IN_FLIGHT", "32")),
+        max_wait=float(os.getenv("RATE_LIMIT_MAX_WAIT_MS", "250")) / 1000,
+    ),
+)
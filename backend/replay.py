@@ -0,0 +1,256 @@
+"""
+Replay stored conversations against a candidate prompt.
+
+Before a flow step's system_prompt is changed, replay_flow() finds every answer
+given to that step in conversations.messages and re-classifies it under the
+candidate prompt, reporting the answers whose verdict would flip.
+
+- Conversations are read in keyset pages (id > last id, ORDER BY id), selecting
+  only id and messages, so memory stays flat however large the table is.
+- Answers are (assistant message == the step's agent_question, following user
+  message) pairs. The original verdict is inferred from the next question the
+  visitor was shown: the pass_next step's question means PASS, fail_next's
+  means FAIL. When that is ambiguous the answer is also classified under the
+  current prompt as the baseline.
+- Classification goes through batch.classify_batch, so it shares the verdict
+  cache, single-flight, hedging and the batch upstream rate budget.
+- After each page the flips are appended to the JSONL report and a checkpoint
+  (last conversation id and running totals) is written atomically; rerunning
+  with the same checkpoint resumes after that id.
+
+    python -m backend.replay --flow-id 3 --prompt-file candidate.txt \\
+        --checkpoint replay-3.json --report replay-3-flips.jsonl
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from . import batch, models
+
+REPLAY_PAGE_SIZE = int(os.getenv("REPLAY_PAGE_SIZE", "500"))
+
+
+def iter_conversation_pages(engine: Engine, config_id: Optional[int], after_id: int,
+                            page_size: int) -> Iterator[List[Tuple[int, list]]]:
+    """Yield pages of (id, messages) with id > after_id, in id order"""
+    table = models.Conversations.__table__
+    while True:
+        query = select(table.c.id, table.c.messages).where(
+            table.c.id > after_id).order_by(table.c.id).limit(page_size)
+        if config_id is not None:
+            query = query.where(table.c.config_id == config_id)
+        with engine.connect() as conn:
+            rows = [(row.id, row.messages) for row in conn.execute(query)]
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def _norm(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def extract_answers(messages: list, question: str, pass_question: Optional[str],
+                    fail_question: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+    """(answer, inferred verdict or None) for each time `question` was answered"""
+    question = _norm(question)
+    pass_question = _norm(pass_question) if pass_question else None
+    fail_question = _norm(fail_question) if fail_question else None
+    answers = []
+    for i, message in enumerate(messages or []):
+        if message.get("role") != "assistant" or _norm(message.get("content")) != question:
+            continue
+        if i + 1 >= len(messages) or messages[i + 1].get("role") != "user":
+            continue
+        answer = messages[i + 1].get("content") or ""
+        verdict = None
+        following = next((m for m in messages[i + 2:] if m.get("role") == "assistant"), None)
+        if following is not None and pass_question != fail_question:
+            shown = _norm(following.get("content"))
+            if shown == pass_question:
+                verdict = "pass"
+            elif shown == fail_question:
+                verdict = "fail"
+        answers.append((answer, verdict))
+    return answers
+
+
+class Checkpoint:
+    def __init__(self, path: Optional[str], key: str):
+        self.path = path
+        self.key = key
+        self.last_id = 0
+        self.totals: Dict[str, int] = {
+            "conversations": 0, "answers": 0, "unchanged": 0, "pass_to_fail": 0,
+            "fail_to_pass": 0, "baseline_from_history": 0, "baseline_reclassified": 0,
+            "errors": 0,
+        }
+
+    def load(self) -> "Checkpoint":
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("key") != self.key:
+                raise ValueError(f"{self.path} belongs to a different flow or prompt; "
+                                 "use a new checkpoint file")
+            self.last_id = saved["last_conversation_id"]
+            self.totals.update(saved["totals"])
+            print(f"[Replay] Resuming after conversation {self.last_id}")
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": self.key, "last_conversation_id": self.last_id,
+                       "totals": self.totals, "updated_at": time.time()}, f)
+        os.replace(tmp, self.path)
+
+
+async def replay_flow(engine: Engine, api_key: str, flow: models.ConversationFlow,
+                      candidate_prompt: str, pass_question: Optional[str],
+                      fail_question: Optional[str], checkpoint: Checkpoint,
+                      report_path: Optional[str] = None, concurrency: int = 8,
+                      page_size: int = REPLAY_PAGE_SIZE,
+                      max_conversations: Optional[int] = None) -> dict:
+    """Re-classify every stored answer to `flow` under `candidate_prompt`"""
+    report = open(report_path, "a") if report_path else None
+    started = time.perf_counter()
+    replayed = 0
+    try:
+        for page in iter_conversation_pages(engine, flow.config_id, checkpoint.last_id,
+                                            page_size):
+            if max_conversations is not None and replayed >= max_conversations:
+                break
+            page = page[:max_conversations - replayed] if max_conversations else page
+            items, meta = [], []
+            for conversation_id, messages in page:
+                for answer, verdict in extract_answers(messages, flow.agent_question,
+                                                       pass_question, fail_question):
+                    meta.append((conversation_id, answer, verdict))
+                    items.append(batch.BatchItem(len(items), str(conversation_id), flow.id,
+                                                 candidate_prompt, flow.agent_question, answer))
+            # Answers whose original verdict cannot be inferred get a baseline run
+            baseline_index = {}
+            for index, (conversation_id, answer, verdict) in enumerate(meta):
+                if verdict is None:
+                    baseline_index[len(items)] = index
+                    items.append(batch.BatchItem(len(items), str(conversation_id), flow.id,
+                                                 flow.system_prompt, flow.agent_question,
+                                                 answer))
+
+            candidate: Dict[int, dict] = {}
+            baseline: Dict[int, dict] = {}
+            async for result in batch.classify_batch(api_key, items, concurrency):
+                if "done" in result:
+                    continue
+                if result["index"] in baseline_index:
+                    baseline[baseline_index[result["index"]]] = result
+                else:
+                    candidate[result["index"]] = result
+
+            totals = checkpoint.totals
+            for index, (conversation_id, answer, verdict) in enumerate(meta):
+                new = candidate[index]
+                old = baseline.get(index)
+                if "error" in new or (old is not None and "error" in old):
+                    totals["errors"] += 1
+                    continue
+                totals["answers"] += 1
+                if verdict is None:
+                    verdict = old["status"]
+                    totals["baseline_reclassified"] += 1
+                else:
+                    totals["baseline_from_history"] += 1
+                if new["status"] == verdict:
+                    totals["unchanged"] += 1
+                    continue
+                totals[f"{verdict}_to_{new['status']}"] += 1
+                if report is not None:
+                    report.write(json.dumps({
+                        "conversation_id": conversation_id,
+                        "answer": answer,
+                        "before": verdict,
+                        "after": new["status"],
+                        "baseline": "history" if old is None else "reclassified",
+                    }) + "\n")
+
+            totals["conversations"] += len(page)
+            replayed += len(page)
+            checkpoint.last_id = page[-1][0]
+            if report is not None:
+                report.flush()
+            checkpoint.save()
+            print(f"[Replay] Through conversation {checkpoint.last_id}: "
+                  f"{totals['answers']} answers, "
+                  f"{totals['pass_to_fail'] + totals['fail_to_pass']} flipped")
+    finally:
+        if report is not None:
+            report.close()
+
+    totals = dict(checkpoint.totals)
+    flipped = totals["pass_to_fail"] + totals["fail_to_pass"]
+    totals["flipped"] = flipped
+    totals["flip_rate"] = round(flipped / totals["answers"], 4) if totals["answers"] else 0.0
+    totals["seconds"] = round(time.perf_counter() - started, 1)
+    return totals
+
+
+def replay_key(flow_id: int, candidate_prompt: str) -> str:
+    return f"{flow_id}:{hashlib.sha256(candidate_prompt.encode()).hexdigest()[:16]}"
+
+
+def main():
+    import argparse
+
+    from .database import SessionLocal, engine, read_engine
+
+    parser = argparse.ArgumentParser(description="Replay stored answers under a candidate prompt")
+    parser.add_argument("--flow-id", type=int, required=True)
+    parser.add_argument("--prompt-file", required=True,
+                        help="File containing the candidate system_prompt")
+    parser.add_argument("--checkpoint", help="Checkpoint file; reuse it to resume")
+    parser.add_argument("--report", help="JSONL file receiving one line per flipped verdict")
+    parser.add_argument("--concurrency", type=int, default=batch.BATCH_MAX_CONCURRENCY)
+    parser.add_argument("--page-size", type=int, default=REPLAY_PAGE_SIZE)
+    parser.add_argument("--limit", type=int, help="Stop after this many conversations")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("OPENAI_API_KEY is not set")
+    with open(args.prompt_file) as f:
+        candidate_prompt = f.read().strip()
+
+    db = SessionLocal()
+    try:
+        flow = db.query(models.ConversationFlow).filter(
+            models.ConversationFlow.id == args.flow_id).first()
+        if flow is None:
+            parser.error(f"flow {args.flow_id} not found")
+        steps = {step.order: step for step in db.query(models.ConversationFlow).filter(
+            models.ConversationFlow.config_id == flow.config_id).all()}
+        db.expunge_all()
+    finally:
+        db.close()
+    pass_step, fail_step = steps.get(flow.pass_next), steps.get(flow.fail_next)
+
+    checkpoint = Checkpoint(args.checkpoint, replay_key(flow.id, candidate_prompt)).load()
+    totals = asyncio.run(replay_flow(
+        read_engine or engine, api_key, flow, candidate_prompt,
+        pass_step.agent_question if pass_step else None,
+        fail_step.agent_question if fail_step else None,
+        checkpoint, args.report, args.concurrency, args.page_size, args.limit))
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 
 # Base OpenAI config schema
@@ -11,6 +11,18 @@ class ChatRequest(BaseModel):
     system_prompt: str = Field(..., description="System prompt for OpenAI")
     agent_question: str = Field(..., description="Question to be asked by the agent")
     user_message: str = Field(..., description="Message from the user")
+    flow_id: Optional[int] = Field(None, description="Conversation flow step being answered, selects the classification policy")
+
+class ChatBatchItem(BaseModel):
+    id: Optional[str] = Field(None, description="Caller's identifier, echoed back with the result")
+    flow_id: Optional[int] = Field(None, description="Flow step whose prompt and policy to use")
+    system_prompt: Optional[str] = Field(None, description="Overrides the flow step's system prompt")
+    agent_question: Optional[str] = Field(None, description="Overrides the flow step's question")
+    user_message: str = Field(..., description="Answer to classify")
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem] = Field(..., min_length=1, description="Answers to classify")
+    concurrency: Optional[int] = Field(None, ge=1, description="Parallel classifications, capped by the server")
 
 # Configuration schemas
 class ConfigBase(BaseModel):
@@ -63,6 +75,43 @@ class ConversationFlow(ConversationFlowBase):
     class Config:
         from_attributes = True
 
+class ConversationFlowSummary(BaseModel):
+    id: int = Field(..., description="Unique identifier for the flow")
+    config_id: int = Field(..., description="ID of the associated configuration")
+    order: int = Field(..., description="Order in which this flow appears")
+    video_filename: str = Field(..., description="Name of the video file to play")
+    agent_question_preview: str = Field(..., description="First characters of the agent question")
+    system_prompt_length: int = Field(..., description="Length of the system prompt in characters")
+    pass_next: Optional[int] = Field(None, description="Next flow order number on PASS")
+    fail_next: Optional[int] = Field(None, description="Next flow order number on FAIL")
+    video_only: bool = Field(..., description="If True, plays video and moves to pass_next without input")
+    show_form: bool = Field(..., description="If True, shows a form instead of chat input")
+    form_name: Optional[str] = Field(None, description="Name of the form component to display")
+    updated_at: Optional[datetime] = Field(None, description="Timestamp when the flow was last updated")
+
+    class Config:
+        from_attributes = True
+
+class ConversationFlowBulkItem(ConversationFlowBase):
+    config_id: Optional[int] = Field(None, description="Ignored; taken from the URL")
+
+class ConversationFlowBulkUpsert(BaseModel):
+    flows: List[ConversationFlowBulkItem] = Field(..., description="Complete set of flow steps for the configuration, matched to existing steps by order")
+    delete_missing: bool = Field(True, description="Delete existing steps whose order is not in the payload")
+
+class ConversationFlowBulkResult(BaseModel):
+    inserted: int = Field(..., description="Number of steps created")
+    updated: int = Field(..., description="Number of existing steps updated")
+    deleted: int = Field(..., description="Number of steps removed")
+    flows: List[ConversationFlow] = Field(..., description="The configuration's flows after the upsert")
+
+class AvatarSessionRequest(BaseModel):
+    config_id: Optional[int] = Field(None, description="Configuration whose avatar to use; defaults to the active one")
+
+class ConfigBundle(BaseModel):
+    config: Config = Field(..., description="The configuration")
+    flows: List[ConversationFlow] = Field(..., description="The configuration's flow steps in order")
+
 # Conversation schemas
 class Message(BaseModel):
     role: str = Field(..., description="Role of the message sender (user/assistant/system)")
@@ -87,6 +136,22 @@ class Conversation(ConversationBase):
     class Config:
         from_attributes = True
         
+class ConversationSummary(BaseModel):
+    id: int = Field(..., description="Unique identifier for the conversation")
+    config_id: int = Field(..., description="ID of the associated configuration")
+    status: str = Field(..., description="Status of the conversation")
+    message_count: int = Field(..., description="Number of messages in the conversation")
+    last_question_preview: Optional[str] = Field(None, description="Start of the last question the agent asked")
+    last_activity_at: datetime = Field(..., description="Time of the last write to the conversation row (messages have no timestamps)")
+    created_at: datetime = Field(..., description="Timestamp when the conversation was created")
+
+    class Config:
+        from_attributes = True
+
+class ConversationIngest(ConversationBase):
+    created_at: Optional[datetime] = Field(None, description="Original creation time; defaults to the time of ingestion")
+    updated_at: Optional[datetime] = Field(None, description="Original last update time")
+
 # Form Submission schemas
 class FormSubmissionBase(BaseModel):
     form_name: str = Field(..., description="Name of the form that was submitted")
@@ -105,4 +170,38 @@ class FormSubmission(FormSubmissionBase):
     created_at: datetime = Field(..., description="Timestamp when the submission was created")
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class FormSubmissionIngest(FormSubmissionCreate):
+    created_at: Optional[datetime] = Field(None, description="Original submission time; defaults to the time of ingestion")
+
+# Bulk ingestion schemas
+class IngestError(BaseModel):
+    line: int = Field(..., description="1-based line number in the NDJSON body")
+    error: str = Field(..., description="Why the row was not stored")
+
+class IngestResult(BaseModel):
+    table: str = Field(..., description="Table the rows were loaded into")
+    method: str = Field(..., description="'copy' (PostgreSQL COPY) or 'insert' (multi-row INSERT)")
+    received: int = Field(..., description="Non-blank lines read")
+    inserted: int = Field(..., description="Rows stored")
+    failed: int = Field(..., description="Rows rejected")
+    chunks: int = Field(..., description="Chunks loaded, one transaction each")
+    errors: List[IngestError] = Field(..., description="Rejected rows, up to INGEST_MAX_ERRORS")
+    errors_truncated: bool = Field(..., description="True when more rows failed than are listed")
+    seconds: float = Field(..., description="Wall time of the request")
+    rows_per_second: float = Field(..., description="Rows stored per second")
+    notified: int = Field(0, description="Notification emails queued")
+
+# Lead job queue schemas
+class JobEnqueue(BaseModel):
+    queue: str = Field("score_leads", description="Queue whose handler processes the batches")
+    lead_ids: List[Union[int, str]] = Field(..., min_length=1, description="Leads to process")
+    batch_size: int = Field(10, ge=1, le=1000, description="Leads per job")
+    max_attempts: int = Field(5, ge=1, le=50, description="Attempts before a job is dead-lettered")
+    extra: Dict[str, Any] = Field(default_factory=dict, description="Merged into every job payload, e.g. an assistant_id")
+
+class JobEnqueueResult(BaseModel):
+    run_id: str = Field(..., description="Identifier grouping the jobs of this request")
+    jobs: int = Field(..., description="Number of jobs created")
+    items: int = Field(..., description="Number of leads queued")
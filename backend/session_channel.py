@@ -0,0 +1,393 @@
+"""
+WebSocket channel for a visitor's qualification conversation (/ws/session).
+
+One connection replaces the per-turn HTTP round trips (flow lookup, /openai/chat,
+PUT /conversations). Messages are JSON objects with a "type".
+
+Client -> server:
+
+    {"type": "start", "config_id": 2}          new session (config optional, defaults to active)
+    {"type": "resume", "session_id": "...", "last_seq": 7}
+    {"type": "answer", "text": "...", "answer_id": "..."}   answer_id makes resends idempotent
+    {"type": "advance"}                        a video-only step finished playing
+    {"type": "ping", "t": 123}
+
+Server -> client (every message except pong carries a per-session "seq"):
+
+    {"type": "session", "session_id", "conversation_id"}   conversation_id is null until first written
+    {"type": "step", "flow_id", "order", "video_url", "question", "video_only",
+     "show_form", "form_name", "input_delay"}
+    {"type": "verdict", "flow_id", "status"}
+    {"type": "complete"}
+    {"type": "error", "code", "detail"}
+    {"type": "pong", "t"}
+
+Sent messages are kept in a bounded outbox; after a reconnect, "resume" with the
+last seq received replays whatever was missed. Connections and outboxes live in
+the worker that created them and expire after WS_SESSION_TTL_SECONDS without
+activity.
+
+Conversation state (current step, verdicts, messages) is kept in the
+write-behind session_store, which persists it in batches keyed on
+conversations.session_id; no turn waits on a database write. A resume the
+worker does not recognise (after a restart, or on another worker) rebuilds the
+session from that row and sends the current step again in place of the lost
+outbox.
+"""
+import asyncio
+import os
+import secrets
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+
+from . import classifier, models, ratelimit, schemas
+from .cache import flows_key, shared_cache
+from .database import SessionLocal
+from .session_store import SessionRecord, session_store
+
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "90"))
+WS_SESSION_TTL = float(os.getenv("WS_SESSION_TTL_SECONDS", "1800"))
+WS_OUTBOX_SIZE = int(os.getenv("WS_OUTBOX_SIZE", "64"))
+
+CLASSIFY_PATH = "/openai/chat"
+START_PATH = "/ws/session"
+
+
+class SessionState:
+    def __init__(self, record: SessionRecord, flows: list, client_ip: str):
+        self.session_id = record.session_id
+        self.record = record
+        self.client_ip = client_ip
+        self.by_order = {flow["order"]: flow for flow in flows}
+        self.current: Optional[dict] = self.by_order.get(record.current_order)
+        self.seq = 0
+        self.outbox: Deque[dict] = deque(maxlen=WS_OUTBOX_SIZE)
+        self.answered_ids: Deque[str] = deque(maxlen=WS_OUTBOX_SIZE)
+        self.websocket: Optional[WebSocket] = None
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        """Number the message, keep it for resume, and deliver it if connected"""
+        self.seq += 1
+        message = dict(message, seq=self.seq)
+        self.outbox.append(message)
+        if self.websocket is not None:
+            try:
+                await self.websocket.send_json(message)
+            except Exception:
+                # Connection dropped; the client gets it from the outbox on resume
+                self.websocket = None
+
+
+class SessionRegistry:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._sessions: Dict[str, SessionState] = {}
+        self.started = 0
+        self.resumed = 0
+        self.rebuilt = 0
+
+    def add(self, state: SessionState, rebuilt: bool = False):
+        self._expire()
+        self._sessions[state.session_id] = state
+        if rebuilt:
+            self.rebuilt += 1
+        else:
+            self.started += 1
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        self._expire()
+        return self._sessions.get(session_id)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [sid for sid, s in self._sessions.items()
+                           if s.websocket is None and s.last_seen < cutoff]:
+            del self._sessions[session_id]
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "connected": sum(1 for s in self._sessions.values() if s.websocket is not None),
+            "started": self.started,
+            "resumed": self.resumed,
+            "rebuilt": self.rebuilt,
+        }
+
+
+registry = SessionRegistry(WS_SESSION_TTL)
+
+
+def _load_flows(config_id: int) -> list:
+    """Flows for a configuration through the same cache entry as GET /configs/{id}/flows"""
+    def load():
+        db = SessionLocal()
+        try:
+            flows = db.query(models.ConversationFlow).filter(
+                models.ConversationFlow.config_id == config_id).order_by(
+                    models.ConversationFlow.order).all()
+            return [schemas.ConversationFlow.model_validate(flow) for flow in flows]
+        finally:
+            db.close()
+
+    return shared_cache.get_or_load(flows_key(config_id), load)
+
+
+def _resolve_config_id(config_id: Optional[int]) -> Optional[int]:
+    """The requested configuration's id if it exists, or the active one's"""
+    db = SessionLocal()
+    try:
+        query = db.query(models.Configurations.id)
+        if config_id is None:
+            config = query.order_by(models.Configurations.id.asc()).first()
+        else:
+            config = query.filter(models.Configurations.id == config_id).first()
+        return config.id if config else None
+    finally:
+        db.close()
+
+
+def _step_message(flow: dict) -> dict:
+    return {
+        "type": "step",
+        "flow_id": flow["id"],
+        "order": flow["order"],
+        "video_url": f"/videos/{flow['video_filename']}",
+        "question": flow["agent_question"],
+        "video_only": flow["video_only"],
+        "show_form": flow["show_form"],
+        "form_name": flow["form_name"],
+        "input_delay": flow["input_delay"],
+    }
+
+
+async def _send_current(state: SessionState):
+    if state.current is None:
+        await state.send({"type": "complete"})
+    else:
+        await state.send(_step_message(state.current))
+
+
+async def _move_to(state: SessionState, next_order: Optional[int], **changes):
+    """Advance to the next step (or finish), record it and push it to the visitor"""
+    state.current = state.by_order.get(next_order) if next_order is not None else None
+    status = state.record.status
+    if state.current is None or state.current["show_form"]:
+        status = "completed"
+    session_store.update(state.record, current_order=next_order if state.current else None,
+                         status=status, **changes)
+    await _send_current(state)
+
+
+def _rate_limited(keys: list, path: str) -> Optional[dict]:
+    """Take a token for each key under `path`'s rule; the error message if one is empty"""
+    rule = ratelimit.limiter.rules.get(path) if ratelimit.RATE_LIMIT_ENABLED else None
+    if rule is None:
+        return None
+    for key in keys:
+        allowed, retry_after = ratelimit.limiter.backend.acquire(key, rule)
+        if not allowed:
+            return {"type": "error", "code": "rate_limited",
+                    "retry_after": ratelimit.retry_after_header(retry_after),
+                    "detail": "Rate limit exceeded"}
+    return None
+
+
+async def _handle_start(websocket: WebSocket, message: dict) -> Optional[SessionState]:
+    client_ip = ratelimit.client_ip(websocket)
+    limited = _rate_limited([f"ip:{client_ip}:{START_PATH}"], START_PATH)
+    if limited is not None:
+        await websocket.send_json(limited)
+        return None
+    config_id = await run_in_threadpool(_resolve_config_id, message.get("config_id"))
+    if config_id is None:
+        await websocket.send_json({"type": "error", "code": "no_configuration",
+                                   "detail": "No configuration found"})
+        return None
+    flows = await run_in_threadpool(_load_flows, config_id)
+    record = session_store.create(secrets.token_urlsafe(16), config_id,
+                                  min(flow["order"] for flow in flows) if flows else None)
+    if not flows:
+        session_store.update(record, status="completed")
+    state = SessionState(record, flows, client_ip)
+    state.websocket = websocket
+    registry.add(state)
+    print(f"[WS] Session {state.session_id} started for config {config_id}")
+    await state.send({"type": "session", "session_id": state.session_id,
+                      "conversation_id": record.conversation_id})
+    await _send_current(state)
+    return state
+
+
+async def _rebuild_session(websocket: WebSocket, session_id: str,
+                           last_seq: int) -> Optional[SessionState]:
+    """Recreate a session this worker does not hold from the session store"""
+    record = await run_in_threadpool(session_store.load, session_id)
+    if record is None:
+        return None
+    flows = await run_in_threadpool(_load_flows, record.config_id)
+    state = SessionState(record, flows, ratelimit.client_ip(websocket))
+    state.websocket = websocket
+    state.seq = last_seq
+    registry.add(state, rebuilt=True)
+    print(f"[WS] Session {session_id} rebuilt from conversation {record.conversation_id}")
+    await state.send({"type": "session", "session_id": session_id,
+                      "conversation_id": record.conversation_id})
+    await _send_current(state)
+    return state
+
+
+async def _handle_resume(websocket: WebSocket, message: dict) -> Optional[SessionState]:
+    session_id = str(message.get("session_id"))
+    last_seq = int(message.get("last_seq") or 0)
+    state = registry.get(session_id)
+    if state is None:
+        state = await _rebuild_session(websocket, session_id, last_seq)
+        if state is None:
+            await websocket.send_json({"type": "error", "code": "unknown_session",
+                                       "detail": "Session expired or unknown; start a new one"})
+        return state
+    if state.websocket is not None and state.websocket is not websocket:
+        # The old connection is half-open; the newest one wins
+        try:
+            await state.websocket.close(code=4000)
+        except Exception:
+            pass
+    state.websocket = websocket
+    registry.resumed += 1
+    missed = [m for m in state.outbox if m["seq"] > last_seq]
+    if missed and missed[0]["seq"] != last_seq + 1:
+        await websocket.send_json({"type": "error", "code": "outbox_overflow",
+                                   "detail": "Some messages are no longer available"})
+    print(f"[WS] Session {state.session_id} resumed, replaying {len(missed)} messages")
+    for m in missed:
+        await websocket.send_json(m)
+    return state
+
+
+async def _handle_answer(state: SessionState, message: dict, api_key: str):
+    answer_id = message.get("answer_id")
+    if answer_id is not None and answer_id in state.answered_ids:
+        return  # resent after a reconnect; the outbox already covered it
+    flow = state.current
+    if flow is None or flow["video_only"] or flow["show_form"]:
+        await state.send({"type": "error", "code": "not_expecting_answer",
+                          "detail": "The current step does not take an answer"})
+        return
+    text = str(message.get("text", ""))
+
+    # Same per-client budget and in-flight cap as POST /openai/chat
+    limited = _rate_limited([f"ip:{state.client_ip}:{CLASSIFY_PATH}",
+                             f"session:{state.session_id}:{CLASSIFY_PATH}"], CLASSIFY_PATH)
+    if limited is not None:
+        await state.send(limited)
+        return
+    limiter = ratelimit.limiter
+    capped = ratelimit.RATE_LIMIT_ENABLED and CLASSIFY_PATH in limiter.rules
+    if capped and not await limiter.concurrency.acquire():
+        await state.send({"type": "error", "code": "busy", "retry_after": "1",
+                          "detail": "Server busy, please retry"})
+        return
+
+    try:
+        result = await classifier.classify_async(api_key, flow["system_prompt"],
+                                                 flow["agent_question"], text,
+                                                 flow_id=flow["id"])
+    except Exception as e:
+        print(f"[WS] Classification failed: {e}")
+        await state.send({"type": "error", "code": "classification_failed", "detail": str(e)})
+        return
+    finally:
+        if capped:
+            limiter.concurrency.release()
+
+    await state.send({"type": "verdict", "flow_id": flow["id"], "status": result["status"]})
+    if answer_id is not None:
+        # Only now: a failed attempt must stay retryable with the same answer_id
+        state.answered_ids.append(answer_id)
+    record = state.record
+    await _move_to(
+        state, flow["pass_next"] if result["status"] == "pass" else flow["fail_next"],
+        messages=record.messages + [{"role": "assistant", "content": flow["agent_question"]},
+                                    {"role": "user", "content": text}],
+        verdicts=record.verdicts + [{"flow_id": flow["id"], "order": flow["order"],
+                                     "status": result["status"]}])
+
+
+# Answer tasks in flight; asyncio keeps only weak references to tasks
+_background: set = set()
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _locked(state: SessionState, work):
+    """Run a state change with the session lock held, so answers apply in order"""
+    async with state.lock:
+        try:
+            await work
+        except Exception as e:
+            print(f"[WS] Session {state.session_id} error: {e}")
+
+
+async def serve(websocket: WebSocket, api_key: Optional[str]):
+    """Run one WebSocket connection until the client goes away or idles out"""
+    await websocket.accept()
+    state: Optional[SessionState] = None
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive_json(), WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1001)
+                break
+            except ValueError:
+                await websocket.send_json({"type": "error", "code": "bad_message",
+                                           "detail": "Messages must be JSON objects"})
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if state is not None:
+                state.last_seen = time.monotonic()
+
+            if kind == "ping":
+                await websocket.send_json({"type": "pong", "t": message.get("t")})
+            elif kind in ("start", "resume"):
+                handler = _handle_start if kind == "start" else _handle_resume
+                new_state = await handler(websocket, message)
+                if new_state is not None:
+                    # A connection serves one session at a time
+                    if state is not None and state is not new_state \
+                            and state.websocket is websocket:
+                        state.websocket = None
+                    state = new_state
+            elif state is None:
+                await websocket.send_json({"type": "error", "code": "no_session",
+                                           "detail": "Send start or resume first"})
+            elif kind == "answer":
+                if not api_key:
+                    await state.send({"type": "error", "code": "classification_failed",
+                                      "detail": "OpenAI API key not configured"})
+                    continue
+                # In a task so pings are answered while the classification runs
+                _spawn(_locked(state, _handle_answer(state, message, api_key)))
+            elif kind == "advance":
+                async with state.lock:
+                    if state.current is not None and state.current["video_only"]:
+                        await _move_to(state, state.current["pass_next"])
+            else:
+                await websocket.send_json({"type": "error", "code": "unknown_type",
+                                           "detail": f"Unknown message type {kind!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if state is not None and state.websocket is websocket:
+            state.websocket = None
+            state.last_seen = time.monotonic()
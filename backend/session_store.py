@@ -0,0 +1,238 @@
+"""
+Write-behind store for in-progress visitor sessions.
+
+Turn handling (see session_channel.py) updates a SessionRecord in memory and
+returns; nothing on the hot path waits for the database. A flusher thread wakes
+every SESSION_FLUSH_INTERVAL_SECONDS, collects the dirty records and writes them
+in multi-row upserts of up to SESSION_FLUSH_BATCH_SIZE rows keyed on
+conversations.session_id (INSERT ... ON CONFLICT DO UPDATE on Postgres and
+SQLite). The conversation row is created by the first flush.
+
+stop() runs a final flush, so a graceful restart (lifespan shutdown) loses
+nothing; a crash loses at most one interval. Clean records untouched for
+SESSION_STORE_TTL_SECONDS are evicted; dirty ones stay until written. A failed
+flush leaves the records dirty for the next pass.
+
+Rows are read back by session id with load(), so a session can be resumed
+after a restart or on another worker.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Engine
+
+from . import models
+from .database import engine
+
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "1.0"))
+SESSION_FLUSH_BATCH_SIZE = int(os.getenv("SESSION_FLUSH_BATCH_SIZE", "500"))
+SESSION_STORE_TTL = float(os.getenv("SESSION_STORE_TTL_SECONDS",
+                                    os.getenv("WS_SESSION_TTL_SECONDS", "1800")))
+
+PERSISTED_FIELDS = ("config_id", "messages", "status", "current_order", "verdicts")
+
+
+class SessionRecord:
+    __slots__ = ("session_id", "config_id", "current_order", "verdicts", "messages", "status",
+                 "conversation_id", "version", "flushed_version", "touched")
+
+    def __init__(self, session_id: str, config_id: int, current_order: Optional[int],
+                 messages: Optional[list] = None, verdicts: Optional[list] = None,
+                 status: str = "ongoing", conversation_id: Optional[int] = None):
+        self.session_id = session_id
+        self.config_id = config_id
+        self.current_order = current_order
+        self.messages = messages or []
+        self.verdicts = verdicts or []
+        self.status = status
+        self.conversation_id = conversation_id
+        self.version = 1
+        # A record read back from the database starts clean
+        self.flushed_version = 1 if conversation_id is not None else 0
+        self.touched = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+
+class SessionStore:
+    def __init__(self, engine: Engine, interval: float, batch_size: int, ttl: float):
+        self.engine = engine
+        self.interval = interval
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self._records: Dict[str, SessionRecord] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.evicted = 0
+        self.last_flush_ms = 0.0
+
+    # Hot path: memory only
+
+    def create(self, session_id: str, config_id: int,
+               current_order: Optional[int]) -> SessionRecord:
+        record = SessionRecord(session_id, config_id, current_order)
+        with self._lock:
+            self._records[session_id] = record
+        return record
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            return self._records.get(session_id)
+
+    def update(self, record: SessionRecord, **changes):
+        """Apply changes to a record and mark it for the next flush"""
+        with self._lock:
+            for name, value in changes.items():
+                setattr(record, name, value)
+            record.version += 1
+            record.touched = time.monotonic()
+            self._records.setdefault(record.session_id, record)
+
+    # Read-through for resume after a restart
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """The in-memory record, or one rebuilt from its conversation row"""
+        record = self.get(session_id)
+        if record is not None:
+            return record
+        table = models.Conversations.__table__
+        with self.engine.connect() as conn:
+            row = conn.execute(select(table).where(table.c.session_id == session_id)).first()
+        if row is None:
+            return None
+        record = SessionRecord(session_id, row.config_id, row.current_order,
+                               list(row.messages or []), list(row.verdicts or []),
+                               row.status, row.id)
+        with self._lock:
+            return self._records.setdefault(session_id, record)
+
+    # Flusher
+
+    def _snapshot_dirty(self) -> List[tuple]:
+        now = time.monotonic()
+        with self._lock:
+            dirty = []
+            for session_id, record in list(self._records.items()):
+                if record.dirty:
+                    dirty.append((record, record.version, {
+                        "session_id": session_id,
+                        "config_id": record.config_id,
+                        "messages": list(record.messages),
+                        "status": record.status,
+                        "current_order": record.current_order,
+                        "verdicts": list(record.verdicts),
+                    }))
+                elif record.touched < now - self.ttl:
+                    del self._records[session_id]
+                    self.evicted += 1
+            return dirty
+
+    def _upsert(self, conn, rows: List[dict]) -> Dict[str, int]:
+        """Write rows in one statement; returns session_id -> conversation id"""
+        table = models.Conversations.__table__
+        dialect = conn.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            statement = insert(table).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.session_id],
+                set_={**{name: statement.excluded[name] for name in PERSISTED_FIELDS},
+                      "updated_at": func.now()},
+            ).returning(table.c.session_id, table.c.id)
+            return {session_id: id_ for session_id, id_ in conn.execute(statement)}
+
+        ids = {}
+        for row in rows:
+            result = conn.execute(update(table).where(table.c.session_id == row["session_id"])
+                                  .values(**row, updated_at=func.now()))
+            if result.rowcount == 0:
+                conn.execute(table.insert().values(**row))
+            ids[row["session_id"]] = conn.execute(select(table.c.id).where(
+                table.c.session_id == row["session_id"])).scalar_one()
+        return ids
+
+    def flush(self) -> int:
+        """Write every dirty record; returns the number of rows written"""
+        with self._flush_lock:
+            dirty = self._snapshot_dirty()
+            if not dirty:
+                return 0
+            started = time.perf_counter()
+            written = 0
+            for start in range(0, len(dirty), self.batch_size):
+                chunk = dirty[start:start + self.batch_size]
+                try:
+                    with self.engine.begin() as conn:
+                        ids = self._upsert(conn, [row for _, _, row in chunk])
+                except Exception as e:
+                    self.failed_flushes += 1
+                    print(f"[SessionStore] Flush of {len(chunk)} sessions failed, "
+                          f"will retry: {e}")
+                    continue
+                with self._lock:
+                    for record, version, row in chunk:
+                        record.flushed_version = max(record.flushed_version, version)
+                        record.conversation_id = ids.get(row["session_id"],
+                                                         record.conversation_id)
+                written += len(chunk)
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+            return written
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[SessionStore] Flusher error: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-flusher",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still dirty"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        written = self.flush()
+        pending = self.stats()["dirty"]
+        print(f"[SessionStore] Final flush wrote {written} sessions"
+              + (f", {pending} could not be written" if pending else ""))
+
+    def stats(self) -> dict:
+        with self._lock:
+            records = list(self._records.values())
+        return {
+            "sessions": len(records),
+            "dirty": sum(1 for record in records if record.dirty),
+            "running": self._thread is not None,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failed_flushes": self.failed_flushes,
+            "evicted": self.evicted,
+            "last_flush_ms": self.last_flush_ms,
+            "interval_seconds": self.interval,
+        }
+
+
+session_store = SessionStore(engine, SESSION_FLUSH_INTERVAL, SESSION_FLUSH_BATCH_SIZE,
+                             SESSION_STORE_TTL)
@@ -0,0 +1,39 @@
+"""
+Startup phase timing.
+
+Each worker records how long importing and initializing the backend takes, phase
+by phase, so cold-start regressions show up in the logs and at /debug/startup.
+"""
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.ready_ms = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - started) * 1000))
+
+    def mark_ready(self):
+        self.ready_ms = (time.perf_counter() - self.started) * 1000
+        print(f"[Startup] Ready in {self.ready_ms:.1f}ms")
+        for name, elapsed_ms in self.phases:
+            print(f"[Startup]   {name:<32} {elapsed_ms:8.1f}ms")
+
+    def report(self) -> dict:
+        return {
+            "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+            "phases": [{"name": name, "ms": round(ms, 1)} for name, ms in self.phases],
+        }
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,364 @@
+"""
+Request tracing.
+
+Each HTTP request gets a root span (see trace_requests in main.py) joined to the
+W3C `traceparent` sent by the Express proxy. Child spans are recorded for every
+SQLAlchemy cursor execution (engine events), every OpenAI call and every SMTP
+send, so a slow visitor turn shows where its time went.
+
+Traces are tail sampled when the root span ends: errors and traces slower than
+TRACE_SLOW_MS are always kept; the rest are kept with probability
+TRACE_SAMPLE_RATE. The sampled flag of the incoming traceparent is only honoured
+with TRACE_TRUST_UPSTREAM_SAMPLED=true, since it comes from the browser (the
+Express proxy clears it too). Kept traces are written by a background thread as
+OTLP/JSON (one ExportTraceServiceRequest per line) to
+TRACE_DIR/traces-YYYY-MM-DD[.N].jsonl, which the OpenTelemetry collector's
+otlpjsonfile receiver can ingest. A file rolls over to the next N at
+TRACE_FILE_MAX_BYTES, and files older than TRACE_RETENTION_DAYS are deleted.
+
+The current span lives in a contextvar. Threadpool work started through
+starlette inherits it; code handing work to its own executor must submit it via
+contextvars.copy_context().run to stay in the trace.
+"""
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() != "false"
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "aimastermind-backend")
+TRACE_TRUST_UPSTREAM_SAMPLED = os.getenv("TRACE_TRUST_UPSTREAM_SAMPLED", "false").lower() == "true"
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(64 * 1024 * 1024)))
+TRACE_RETENTION_DAYS = float(os.getenv("TRACE_RETENTION_DAYS", "7"))
+
+MAX_SPANS_PER_TRACE = 500
+MAX_STATEMENT_LENGTH = 1000
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP SpanKind values
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class Trace:
+    __slots__ = ("trace_id", "remote_parent_id", "remote_sampled", "spans", "dropped", "lock")
+
+    def __init__(self, trace_id: str, remote_parent_id: Optional[str], remote_sampled: bool):
+        self.trace_id = trace_id
+        self.remote_parent_id = remote_parent_id
+        self.remote_sampled = remote_sampled
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, span: "Span"):
+        with self.lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, kind: str, parent_id: Optional[str],
+                 attributes: Optional[dict] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+        trace.add(self)
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if error is not None and self.error is None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent, or None if invalid"""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None,
+                attributes: Optional[dict] = None) -> Tuple[Span, object]:
+    """Open a root (server) span; returns it and the token for end_trace()"""
+    parsed = parse_traceparent(traceparent)
+    if parsed:
+        trace = Trace(parsed[0], parsed[1], parsed[2])
+    else:
+        trace = Trace(os.urandom(16).hex(), None, False)
+    root = Span(trace, name, "server", trace.remote_parent_id, attributes)
+    return root, _current_span.set(root)
+
+
+def end_trace(root: Span, token, error: Optional[BaseException] = None):
+    """Close the root span, reset the context and hand the trace to the sampler"""
+    root.end(error)
+    _current_span.reset(token)
+    sampler.finish(root)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """Child span of the current one; a no-op outside a traced request"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, kind, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        child.end()
+        _current_span.reset(token)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)}
+            for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(root: Span) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for the trace `root` belongs to"""
+    trace = root.trace
+    with trace.lock:
+        spans = list(trace.spans)
+    otlp_spans = []
+    for s in spans:
+        attributes = dict(s.attributes)
+        end_ns = s.end_ns
+        if end_ns is None:
+            # e.g. a losing hedged OpenAI call still running after the response
+            attributes["span.unfinished"] = True
+            end_ns = root.end_ns
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": SPAN_KINDS[s.kind],
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": _otlp_attributes(attributes),
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        otlp_spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "backend.tracing"}, "spans": otlp_spans}],
+    }]}
+
+
+class OTLPFileExporter:
+    """Appends OTLP/JSON lines to daily, size-capped files from a background thread"""
+
+    def __init__(self, directory: str, max_queue: int = 1000,
+                 max_bytes: int = TRACE_FILE_MAX_BYTES,
+                 retention_days: float = TRACE_RETENTION_DAYS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self._day: Optional[str] = None
+        self._part = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, root: Span):
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="trace-exporter",
+                                                daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(root)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                path = self._path()
+                with open(path, "a") as f:
+                    for root in batch:
+                        f.write(json.dumps(to_otlp(root), separators=(",", ":")) + "\n")
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                print(f"[Tracing] Failed to write traces to {self.directory}: {e}")
+
+    def _path(self) -> str:
+        """Today's file, moving on to the next part once it reaches max_bytes"""
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        if day != self._day:
+            self._day, self._part = day, 0
+            self._prune()
+        while True:
+            suffix = f".{self._part}" if self._part else ""
+            path = os.path.join(self.directory, f"traces-{day}{suffix}.jsonl")
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_bytes:
+                return path
+            self._part += 1
+
+    def _prune(self):
+        """Delete export files older than retention_days; runs at each day change"""
+        cutoff = time.time() - self.retention_days * 86400
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("traces-") and name.endswith(".jsonl") \
+                    and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                print(f"[Tracing] Deleted expired trace file {name}")
+
+    def flush(self, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+class TailSampler:
+    """Decides at the end of each trace whether it is exported"""
+
+    def __init__(self, exporter: OTLPFileExporter, slow_ms: float, rate: float):
+        self.exporter = exporter
+        self.slow_ms = slow_ms
+        self.rate = rate
+        self.traces = 0
+        self.kept: Dict[str, int] = {"error": 0, "slow": 0, "upstream": 0, "random": 0}
+
+    def _reason(self, root: Span) -> Optional[str]:
+        status_code = root.attributes.get("http.status_code", 0)
+        if root.error or status_code >= 500:
+            return "error"
+        if root.duration_ms >= self.slow_ms:
+            return "slow"
+        if root.trace.remote_sampled and TRACE_TRUST_UPSTREAM_SAMPLED:
+            return "upstream"
+        if random.random() < self.rate:
+            return "random"
+        return None
+
+    def finish(self, root: Span):
+        self.traces += 1
+        reason = self._reason(root)
+        if reason is None:
+            return
+        self.kept[reason] += 1
+        root.set("sampling.reason", reason)
+        self.exporter.export(root)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": TRACING_ENABLED,
+            "traces": self.traces,
+            "kept": dict(self.kept),
+            "exported": self.exporter.exported,
+            "export_dropped": self.exporter.dropped,
+            "slow_ms": self.slow_ms,
+            "sample_rate": self.rate,
+            "directory": self.exporter.directory,
+            "trust_upstream_sampled": TRACE_TRUST_UPSTREAM_SAMPLED,
+        }
+
+
+sampler = TailSampler(OTLPFileExporter(TRACE_DIR), TRACE_SLOW_MS, TRACE_SAMPLE_RATE)
+
+
+def instrument_sqlalchemy():
+    """Record a span around every cursor execution on every engine"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        if parent is None or context is None:
+            return
+        context._trace_span = Span(parent.trace, "db.query", "client", parent.span_id, {
+            "db.system": conn.engine.dialect.name,
+            "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            "db.executemany": executemany,
+            "db.name": conn.engine.url.database,
+            "server.address": conn.engine.url.host,
+        })
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        child = getattr(context, "_trace_span", None)
+        if child is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                child.set("db.rowcount", cursor.rowcount)
+            child.end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(context):
+        child = getattr(context.execution_context, "_trace_span", None)
+        if child is not None:
+            child.end(context.original_exception)
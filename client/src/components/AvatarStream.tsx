@@ -1,9 +1,13 @@
 import { useEffect, useRef, useState } from 'react';
 import { useQuery } from '@tanstack/react-query';
+import { apiRequest } from '@/lib/queryClient';
 import { Room, RoomEvent, RemoteParticipant, RemoteTrackPublication, Track } from 'livekit-client';
 
 interface StreamingSession {
   session_id: string;
+  token: string;
+  pooled: boolean;
+  expires_in: number;
   sdp: {
     type: string;
     sdp: string;
@@ -27,7 +31,10 @@ export function AvatarStream() {
   const sessionRef = useRef<string | null>(null);
 
   const { data: session, isError, isLoading } = useQuery<StreamingSession>({
-    queryKey: ['/api/heygen/streaming/sessions'],
+    // Pre-warmed by the backend's session pool, so this returns without
+    // waiting for HeyGen to mint a token and negotiate the session
+    queryKey: ['/api/avatar/session'],
+    queryFn: () => apiRequest('POST', '/api/avatar/session'),
     retry: 1,
   });
 
@@ -82,7 +89,7 @@ export function AvatarStream() {
       }
       // Cleanup session if we have an ID
       if (sessionRef.current) {
-        fetch(`/api/heygen/streaming/sessions/${sessionRef.current}`, {
+        fetch(`/api/avatar/session/${sessionRef.current}`, {
           method: 'DELETE'
         }).catch(console.error);
       }
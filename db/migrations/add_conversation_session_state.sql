@@ -0,0 +1,9 @@
+-- Session state written behind by the /ws/session channel (see backend/session_store.py)
+ALTER TABLE conversations
+ADD COLUMN IF NOT EXISTS session_id VARCHAR,
+ADD COLUMN IF NOT EXISTS current_order INTEGER,
+ADD COLUMN IF NOT EXISTS verdicts JSON;
+
+-- Upsert target; NULLs (HTTP-created conversations) do not conflict
+CREATE UNIQUE INDEX IF NOT EXISTS conversations_session_id_idx
+ON conversations (session_id);
@@ -0,0 +1,8 @@
+-- Time bucket used to reject duplicate form submissions (see backend/dedupe.py)
+ALTER TABLE form_submissions
+ADD COLUMN IF NOT EXISTS dedupe_window INTEGER;
+
+-- One submission per form and email per bucket; rows from before this migration are exempt
+CREATE UNIQUE INDEX IF NOT EXISTS form_submissions_dedupe_idx
+ON form_submissions (form_name, lower(email), dedupe_window)
+WHERE dedupe_window IS NOT NULL;
@@ -0,0 +1,25 @@
+-- Durable lead batch jobs (see backend/jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    queue VARCHAR(255) NOT NULL,
+    run_id VARCHAR(255),
+    payload JSON NOT NULL,
+    batch_size INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(32) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    lease_owner VARCHAR(255),
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    result JSON,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Workers claim the oldest runnable job of a queue
+CREATE INDEX IF NOT EXISTS jobs_claim_idx ON jobs(queue, status, run_after);
+
+-- Progress queries per import run
+CREATE INDEX IF NOT EXISTS jobs_run_idx ON jobs(run_id, status);
@@ -0,0 +1 @@
+# Load-simulation harness and local stand-ins for the backend's upstream services
@@ -0,0 +1,91 @@
+"""
+Command line entry point.
+
+    # Terminal 1: local stand-ins for OpenAI and SMTP
+    python -m loadtest --serve-fakes --openai-port 9100 --smtp-port 2525
+
+    # Terminal 2: one uvicorn worker pointed at the stand-ins
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:9100/v1 \\
+    SMTP_SERVER=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=false \\
+    SMTP_USERNAME=load SMTP_PASSWORD=test \\
+    HEYGEN_API_KEY=fake HEYGEN_API_BASE=http://127.0.0.1:9200 \\
+        python -m uvicorn backend.main:app --port 8000 --workers 1
+
+    # Terminal 3: ramp visitors
+    python -m loadtest --base-url http://127.0.0.1:8000 --stages 1,2,4,8,16,32 --stage-seconds 30
+"""
+import argparse
+import asyncio
+import time
+
+from .fakes import FakeHeyGenServer, FakeOpenAIServer, FakeRedisServer, SMTPSink
+from .harness import run_load_test
+
+
+def parse_model_latency(value: str) -> dict:
+    latencies = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model, _, ms = item.partition("=")
+        latencies[model] = float(ms)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visitor journey load harness")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000",
+                        help="FastAPI backend to drive")
+    parser.add_argument("--stages", default="1,2,4,8,16,32",
+                        help="Comma separated concurrency levels")
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--config-id", type=int, default=None,
+                        help="Configuration to replay (default: the active one)")
+    parser.add_argument("--pass-rate", type=float, default=0.7,
+                        help="Share of answers drawn from the positive pool")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="Also write the report as JSON to this path")
+
+    parser.add_argument("--serve-fakes", action="store_true",
+                        help="Only run the fake OpenAI, SMTP, Redis and HeyGen servers")
+    parser.add_argument("--openai-port", type=int, default=9100)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--redis-port", type=int, default=6390)
+    parser.add_argument("--heygen-port", type=int, default=9200)
+    parser.add_argument("--latency-ms", type=float, default=800.0,
+                        help="Mean fake OpenAI latency")
+    parser.add_argument("--jitter-ms", type=float, default=400.0)
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of fake OpenAI calls answered with HTTP 500")
+    parser.add_argument("--model-latency", default="",
+                        help="Per-model mean latency, e.g. gpt-4=1500,gpt-4o-mini=300")
+    args = parser.parse_args()
+
+    if args.serve_fakes:
+        openai_server = FakeOpenAIServer(port=args.openai_port, latency_ms=args.latency_ms,
+                                         jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                                         model_latency_ms=parse_model_latency(args.model_latency),
+                                         seed=args.seed).start()
+        smtp_sink = SMTPSink(port=args.smtp_port).start()
+        redis_server = FakeRedisServer(port=args.redis_port).start()
+        heygen_server = FakeHeyGenServer(port=args.heygen_port).start()
+        try:
+            while True:
+                time.sleep(10)
+                print(f"[LoadTest] OpenAI requests={openai_server.requests} "
+                      f"errors={openai_server.errors} emails={smtp_sink.received} "
+                      f"heygen={heygen_server.counts()}")
+        except KeyboardInterrupt:
+            openai_server.stop()
+            smtp_sink.stop()
+            redis_server.stop()
+            heygen_server.stop()
+        return
+
+    stages = [int(s) for s in args.stages.split(",") if s.strip()]
+    asyncio.run(run_load_test(args.base_url, stages, args.stage_seconds,
+                              config_id=args.config_id, pass_rate=args.pass_rate,
+                              seed=args.seed, json_path=args.json_path))
+
+
+if __name__ == "__main__":
+    main()
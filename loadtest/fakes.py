@@ -0,0 +1,526 @@
+"""
+Local stand-ins for the services the FastAPI backend talks to.
+
+- FakeOpenAIServer speaks just enough of the Chat Completions API for
+  process_chat. Point the backend at it with OPENAI_BASE_URL=http://host:port/v1.
+- SMTPSink accepts and counts mail so create_form_submission can be exercised
+  without sending anything. Point the backend at it with SMTP_SERVER/SMTP_PORT
+  and SMTP_STARTTLS=false.
+
+- FakeRedisServer implements the handful of RESP commands the shared cache and
+  its invalidation bus use (GET/SET/DEL/PUBLISH/SUBSCRIBE). Point the backend at
+  it with CACHE_REDIS_URL=redis://host:port/0.
+
+- FakeHeyGenServer implements the streaming endpoints the avatar session pool
+  uses (create_token, new, start, stop) with configurable mint latency. Point the
+  backend at it with HEYGEN_API_BASE=http://host:port and any HEYGEN_API_KEY.
+
+They run on background threads and can be used from the harness or on their own
+via `python -m loadtest --serve-fakes`.
+"""
+import json
+import random
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+NEGATIVE_MARKERS = ("no", "not", "never", "nope", "don't", "can't", "cannot", "unsure", "maybe")
+
+
+def _fake_verdict(user_message: str) -> str:
+    """Decide PASS/FAIL the way a cooperative model would for the harness answers"""
+    words = user_message.lower().replace(",", " ").replace(".", " ").split()
+    return "FAIL" if any(word in NEGATIVE_MARKERS for word in words) else "PASS"
+
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    server: "_OpenAIHTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status_code: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        fake = self.server.fake
+        model = request.get("model", "gpt-4")
+        time.sleep(fake.sample_latency(model))
+
+        with fake.lock:
+            fake.requests += 1
+            fake.requests_by_model[model] = fake.requests_by_model.get(model, 0) + 1
+            fail = fake.rng.random() < fake.error_rate
+        if fail:
+            with fake.lock:
+                fake.errors += 1
+            self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+
+        messages = request.get("messages") or []
+        user_message = next((m.get("content", "") for m in reversed(messages)
+                             if m.get("role") == "user"), "")
+        verdict = fake.verdict_fn(user_message)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": verdict},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 1, "total_tokens": 1},
+        })
+
+
+class _OpenAIHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeOpenAIServer"
+
+
+class FakeOpenAIServer:
+    """Chat Completions stand-in with injectable latency and error rate"""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency_ms: float = 800.0,
+                 jitter_ms: float = 400.0,
+                 error_rate: float = 0.0,
+                 model_latency_ms: Optional[Dict[str, float]] = None,
+                 verdict_fn=_fake_verdict,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.model_latency_ms = model_latency_ms or {}
+        self.verdict_fn = verdict_fn
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.requests_by_model: Dict[str, int] = {}
+        self._httpd = _OpenAIHTTPServer((host, port), _OpenAIHandler)
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def sample_latency(self, model: str) -> float:
+        base = self.model_latency_ms.get(model, self.latency_ms)
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, base + jitter) / 1000.0
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name="fake-openai", daemon=True)
+        self._thread.start()
+        print(f"[LoadTest] Fake OpenAI listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    server: "_SMTPServer"
+
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self._reply("220 fake-smtp ESMTP ready")
+        in_data = False
+        data_lines = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.sink.record("\r\n".join(data_lines))
+                    data_lines = []
+                    self._reply("250 OK: queued")
+                else:
+                    data_lines.append(line[1:] if line.startswith("..") else line)
+                continue
+
+            command = line.split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif command == "HELO":
+                self._reply("250 fake-smtp")
+            elif command == "AUTH":
+                # Any credentials are accepted; prompt for them if not sent inline
+                if len(line.split()) < 3:
+                    self._reply("334 ")
+                    self.rfile.readline()
+                self._reply("235 Authentication successful")
+            elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif command == "DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    sink: "SMTPSink"
+
+
+class SMTPSink:
+    """Minimal SMTP server that accepts every message and keeps a count"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, keep_messages: int = 100):
+        self.lock = threading.Lock()
+        self.received = 0
+        self.keep_messages = keep_messages
+        self.messages = []
+        self._server = _SMTPServer((host, port), _SMTPHandler)
+        self._server.sink = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def record(self, message: str):
+        with self.lock:
+            self.received += 1
+            self.messages.append(message)
+            del self.messages[:-self.keep_messages]
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="smtp-sink", daemon=True)
+        self._thread.start()
+        host, port = self.address
+        print(f"[LoadTest] SMTP sink listening on {host}:{port}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    server: "_RedisServer"
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.channels = set()
+
+    def _write(self, payload: bytes):
+        with self.write_lock:
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+    @staticmethod
+    def _bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, str):
+            value = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _array(self, items) -> bytes:
+        out = b"*%d\r\n" % len(items)
+        for item in items:
+            out += b":%d\r\n" % item if isinstance(item, int) else self._bulk(item)
+        return out
+
+    def _read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        if not header.startswith(b"*"):
+            return header.decode().split()
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def handle(self):
+        fake = self.server.fake
+        try:
+            while True:
+                args = self._read_command()
+                if args is None:
+                    return
+                if not args:
+                    continue
+                command = args[0].upper()
+                if command == "PING":
+                    self._write(b"+PONG\r\n")
+                elif command in ("SELECT", "CLIENT"):
+                    self._write(b"+OK\r\n")
+                elif command == "GET":
+                    self._write(self._bulk(fake.get(args[1])))
+                elif command == "SET":
+                    ttl = None
+                    options = [a.upper() for a in args[3:]]
+                    if "PX" in options:
+                        ttl = int(args[3 + options.index("PX") + 1]) / 1000
+                    elif "EX" in options:
+                        ttl = int(args[3 + options.index("EX") + 1])
+                    fake.set(args[1], args[2], ttl)
+                    self._write(b"+OK\r\n")
+                elif command == "DEL":
+                    self._write(b":%d\r\n" % sum(fake.delete(key) for key in args[1:]))
+                elif command == "PUBLISH":
+                    self._write(b":%d\r\n" % fake.publish(args[1], args[2]))
+                elif command == "SUBSCRIBE":
+                    for channel in args[1:]:
+                        self.channels.add(channel)
+                        fake.subscribe(channel, self)
+                        self._write(self._array(["subscribe", channel, len(self.channels)]))
+                elif command == "UNSUBSCRIBE":
+                    for channel in args[1:] or list(self.channels):
+                        self.channels.discard(channel)
+                        fake.unsubscribe(channel, self)
+                        self._write(self._array(["unsubscribe", channel, len(self.channels)]))
+                else:
+                    self._write(f"-ERR unknown command '{args[0]}'\r\n".encode())
+        except (ConnectionError, OSError):
+            return
+        finally:
+            for channel in list(self.channels):
+                fake.unsubscribe(channel, self)
+
+    def push_message(self, channel: str, data: str):
+        try:
+            self._write(self._array(["message", channel, data]))
+        except OSError:
+            pass
+
+
+class _RedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    fake: "FakeRedisServer"
+
+
+class FakeRedisServer:
+    """In-memory Redis stand-in for the shared cache backend and invalidation bus"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.lock = threading.Lock()
+        self.data: Dict[str, tuple] = {}
+        self.subscribers: Dict[str, set] = {}
+        self.published = 0
+        self._server = _RedisServer((host, port), _RedisHandler)
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, key: str) -> int:
+        with self.lock:
+            return 1 if self.data.pop(key, None) is not None else 0
+
+    def subscribe(self, channel: str, handler):
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(handler)
+
+    def unsubscribe(self, channel: str, handler):
+        with self.lock:
+            self.subscribers.get(channel, set()).discard(handler)
+
+    def publish(self, channel: str, data: str) -> int:
+        with self.lock:
+            self.published += 1
+            handlers = list(self.subscribers.get(channel, ()))
+        for handler in handlers:
+            handler.push_message(channel, data)
+        return len(handlers)
+
+    def start(self) -> "FakeRedisServer":
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="fake-redis", daemon=True)
+        self._thread.start()
+        print(f"[LoadTest] Fake Redis listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _HeyGenHandler(BaseHTTPRequestHandler):
+    server: "_HeyGenHTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status_code: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        authorization = self.headers.get("Authorization", "")
+        token = authorization[7:] if authorization.startswith("Bearer ") else None
+        if not self.headers.get("X-Api-Key") and not fake.valid_token(token):
+            self._send_json(401, {"error": "unauthorized"})
+            return
+
+        if endpoint == "streaming.create_token":
+            time.sleep(fake.token_latency_ms / 1000)
+            self._send_json(200, {"error": None, "data": {"token": fake.mint_token()}})
+        elif endpoint == "streaming.new":
+            time.sleep(fake.session_latency_ms / 1000)
+            session_id = fake.new_session(request)
+            self._send_json(200, {"code": 100, "message": "success", "data": {
+                "session_id": session_id,
+                "url": "wss://fake-heygen.invalid",
+                "access_token": uuid.uuid4().hex,
+                "realtime_endpoint": f"wss://fake-heygen.invalid/v1/ws/{session_id}",
+                "session_duration_limit": 600,
+                "is_paid": False,
+            }})
+        elif endpoint in ("streaming.start", "streaming.stop"):
+            if not fake.transition(request.get("session_id"), endpoint.split(".")[1]):
+                self._send_json(400, {"code": 10005, "message": "session not found"})
+                return
+            self._send_json(200, {"code": 100, "message": "success", "data": None})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+
+class _HeyGenHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeHeyGenServer"
+
+
+class FakeHeyGenServer:
+    """HeyGen streaming API stand-in that counts tokens and sessions by state"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 token_latency_ms: float = 200.0, session_latency_ms: float = 1500.0):
+        self.token_latency_ms = token_latency_ms
+        self.session_latency_ms = session_latency_ms
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.sessions: Dict[str, dict] = {}
+        self.started = 0
+        self.stopped = 0
+        self._httpd = _HeyGenHTTPServer((host, port), _HeyGenHandler)
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def mint_token(self) -> str:
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens.add(token)
+        return token
+
+    def valid_token(self, token: Optional[str]) -> bool:
+        with self.lock:
+            return token in self.tokens
+
+    def new_session(self, request: dict) -> str:
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = {"state": "new", "avatar_id": request.get("avatar_id"),
+                                         "voice": request.get("voice")}
+        return session_id
+
+    def transition(self, session_id: Optional[str], action: str) -> bool:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or session["state"] == "stopped":
+                return False
+            session["state"] = "started" if action == "start" else "stopped"
+            if action == "start":
+                self.started += 1
+            else:
+                self.stopped += 1
+            return True
+
+    def counts(self) -> dict:
+        with self.lock:
+            states = [session["state"] for session in self.sessions.values()]
+        return {"tokens": len(self.tokens), "sessions": len(states),
+                "new": states.count("new"), "started": self.started, "stopped": self.stopped}
+
+    def start(self) -> "FakeHeyGenServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name="fake-heygen", daemon=True)
+        self._thread.start()
+        print(f"[LoadTest] Fake HeyGen listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,310 @@
+"""
+Visitor journey load harness.
+
+Each virtual visitor replays what the React client does for one qualification:
+load the active configuration, fetch its conversation flows, open a
+conversation, answer every question step (classifying the answer through
+/openai/chat and recording the turn) and submit the form at the first
+show_form step. Visitors run closed-loop in stages of increasing concurrency so
+the report shows per-step latency percentiles, the throughput ceiling and the
+stage where saturation starts.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+POSITIVE_ANSWERS = [
+    "Yes, absolutely.",
+    "Yes, I can commit to that every month.",
+    "I built an agent that triages our support inbox and drafts replies with GPT-4.",
+    "Definitely, I am ready to get started.",
+]
+NEGATIVE_ANSWERS = [
+    "No, not really.",
+    "I'm not sure I can make that work.",
+    "Maybe, I don't know yet.",
+]
+
+# Safety net against cyclic flow graphs
+MAX_STEPS_PER_JOURNEY = 50
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+@dataclass
+class StepStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self) -> Dict[str, float]:
+        values = sorted(self.latencies_ms)
+        return {
+            "count": len(values),
+            "errors": self.errors,
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+        }
+
+
+@dataclass
+class StageResult:
+    concurrency: int
+    duration_s: float
+    journeys: int = 0
+    failed_journeys: int = 0
+    requests: int = 0
+    steps: Dict[str, StepStats] = field(default_factory=dict)
+    journey_latencies_ms: List[float] = field(default_factory=list)
+
+    def record(self, step: str, elapsed_ms: float, ok: bool):
+        stats = self.steps.setdefault(step, StepStats())
+        self.requests += 1
+        if ok:
+            stats.latencies_ms.append(elapsed_ms)
+        else:
+            stats.errors += 1
+
+    @property
+    def journeys_per_second(self) -> float:
+        return self.journeys / self.duration_s if self.duration_s else 0.0
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.duration_s if self.duration_s else 0.0
+
+    def journey_p95_ms(self) -> float:
+        return percentile(sorted(self.journey_latencies_ms), 95)
+
+    def to_dict(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "duration_s": round(self.duration_s, 2),
+            "journeys": self.journeys,
+            "failed_journeys": self.failed_journeys,
+            "journeys_per_second": round(self.journeys_per_second, 2),
+            "requests_per_second": round(self.requests_per_second, 2),
+            "journey_p95_ms": round(self.journey_p95_ms(), 1),
+            "steps": {name: stats.summary() for name, stats in sorted(self.steps.items())},
+        }
+
+
+class StepFailed(Exception):
+    pass
+
+
+class VisitorJourney:
+    """One simulated visitor walking a configuration's conversation flows"""
+
+    def __init__(self, client: httpx.AsyncClient, stage: StageResult,
+                 rng: random.Random, visitor_id: int,
+                 config_id: Optional[int], pass_rate: float):
+        self.client = client
+        self.stage = stage
+        self.rng = rng
+        self.visitor_id = visitor_id
+        self.config_id = config_id
+        self.pass_rate = pass_rate
+
+    async def _call(self, step: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.stage.record(step, (time.perf_counter() - started) * 1000, ok=False)
+            raise StepFailed(f"{step}: {e}") from e
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        ok = response.status_code < 400
+        self.stage.record(step, elapsed_ms, ok=ok)
+        if not ok:
+            raise StepFailed(f"{step}: HTTP {response.status_code}")
+        return response
+
+    def _answer(self) -> str:
+        pool = POSITIVE_ANSWERS if self.rng.random() < self.pass_rate else NEGATIVE_ANSWERS
+        return self.rng.choice(pool)
+
+    async def run(self):
+        if self.config_id is None:
+            config = (await self._call("load_config", "GET", "/configurations/active")).json()
+        else:
+            config = (await self._call("load_config", "GET",
+                                       f"/configurations/{self.config_id}")).json()
+        if not config.get("id"):
+            raise StepFailed("load_config: no active configuration")
+
+        flows = (await self._call("fetch_flows", "GET", f"/configs/{config['id']}/flows")).json()
+        if not flows:
+            raise StepFailed("fetch_flows: configuration has no conversation flows")
+        by_order = {flow["order"]: flow for flow in flows}
+
+        messages = []
+        conversation = (await self._call("create_conversation", "POST", "/conversations", json={
+            "config_id": config["id"],
+            "messages": messages,
+            "status": "ongoing",
+        })).json()
+
+        flow = by_order[min(by_order)]
+        for _ in range(MAX_STEPS_PER_JOURNEY):
+            if flow["show_form"]:
+                await self._call("submit_form", "POST", "/form-submissions", json={
+                    "form_name": flow.get("form_name") or "SubmitInterestForm",
+                    "name": f"Load Test Visitor {self.visitor_id}",
+                    "email": f"loadtest+{self.visitor_id}@example.com",
+                    "message": "Submitted by the load harness",
+                    "additional_data": {"source": "loadtest"},
+                })
+                status = "completed"
+                break
+
+            if flow["video_only"]:
+                next_order = flow.get("pass_next")
+            else:
+                answer = self._answer()
+                verdict = (await self._call(f"answer[order={flow['order']}]", "POST", "/openai/chat", json={
+                    "system_prompt": flow["system_prompt"],
+                    "agent_question": flow["agent_question"],
+                    "user_message": answer,
+                    "flow_id": flow["id"],
+                })).json()
+                messages += [
+                    {"role": "assistant", "content": flow["agent_question"]},
+                    {"role": "user", "content": answer},
+                ]
+                await self._call("update_conversation", "PUT", f"/conversations/{conversation['id']}", json={
+                    "config_id": config["id"],
+                    "messages": messages,
+                    "status": "ongoing",
+                })
+                passed = verdict.get("status") == "pass"
+                next_order = flow.get("pass_next") if passed else flow.get("fail_next")
+
+            if next_order is None or next_order not in by_order:
+                status = "completed"
+                break
+            flow = by_order[next_order]
+        else:
+            status = "abandoned"
+
+        await self._call("update_conversation", "PUT", f"/conversations/{conversation['id']}", json={
+            "config_id": config["id"],
+            "messages": messages,
+            "status": status,
+        })
+
+
+async def run_stage(base_url: str, concurrency: int, duration_s: float,
+                    config_id: Optional[int], pass_rate: float,
+                    visitor_ids: itertools.count, seed: int,
+                    request_timeout: float = 60.0) -> StageResult:
+    """Run `concurrency` closed-loop visitors for `duration_s` seconds"""
+    stage = StageResult(concurrency=concurrency, duration_s=duration_s)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency)
+    deadline = time.perf_counter() + duration_s
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=request_timeout, limits=limits) as client:
+        async def visitor(slot: int):
+            rng = random.Random(seed * 100003 + slot)
+            while time.perf_counter() < deadline:
+                journey = VisitorJourney(client, stage, rng, next(visitor_ids), config_id, pass_rate)
+                started = time.perf_counter()
+                try:
+                    await journey.run()
+                except StepFailed as e:
+                    stage.failed_journeys += 1
+                    if stage.failed_journeys <= 3:
+                        print(f"[LoadTest] Journey failed: {e}")
+                    continue
+                stage.journeys += 1
+                stage.journey_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(visitor(slot) for slot in range(concurrency)))
+        # Visitors finish their in-flight journey after the deadline
+        stage.duration_s = time.perf_counter() - started
+    return stage
+
+
+def find_saturation(stages: List[StageResult], min_gain: float = 0.10,
+                    latency_factor: float = 2.0) -> Optional[StageResult]:
+    """
+    First stage where adding visitors stopped paying off: throughput grew by
+    less than `min_gain` over the previous stage, or journey p95 exceeded
+    `latency_factor` times the first stage's p95.
+    """
+    if len(stages) < 2:
+        return None
+    baseline_p95 = stages[0].journey_p95_ms()
+    for previous, current in zip(stages, stages[1:]):
+        gain = (current.journeys_per_second - previous.journeys_per_second) / max(previous.journeys_per_second, 1e-9)
+        if gain < min_gain or (baseline_p95 and current.journey_p95_ms() > latency_factor * baseline_p95):
+            return current
+    return None
+
+
+def build_report(stages: List[StageResult]) -> dict:
+    ceiling = max(stages, key=lambda s: s.journeys_per_second) if stages else None
+    saturation = find_saturation(stages)
+    return {
+        "stages": [stage.to_dict() for stage in stages],
+        "throughput_ceiling": {
+            "journeys_per_second": round(ceiling.journeys_per_second, 2),
+            "requests_per_second": round(ceiling.requests_per_second, 2),
+            "concurrency": ceiling.concurrency,
+        } if ceiling else None,
+        "saturation_concurrency": saturation.concurrency if saturation else None,
+    }
+
+
+def print_report(report: dict):
+    for stage in report["stages"]:
+        print(f"\n[LoadTest] concurrency={stage['concurrency']} "
+              f"journeys/s={stage['journeys_per_second']} req/s={stage['requests_per_second']} "
+              f"journeys={stage['journeys']} failed={stage['failed_journeys']} "
+              f"journey_p95={stage['journey_p95_ms']}ms")
+        print(f"  {'step':<28}{'count':>8}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, s in stage["steps"].items():
+            print(f"  {name:<28}{s['count']:>8}{s['errors']:>8}"
+                  f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+    ceiling = report["throughput_ceiling"]
+    if ceiling:
+        print(f"\n[LoadTest] Throughput ceiling: {ceiling['journeys_per_second']} journeys/s "
+              f"({ceiling['requests_per_second']} req/s) at concurrency {ceiling['concurrency']}")
+    if report["saturation_concurrency"] is not None:
+        print(f"[LoadTest] Saturation starts at concurrency {report['saturation_concurrency']}")
+    else:
+        print("[LoadTest] No saturation observed; extend --stages to find the ceiling")
+
+
+async def run_load_test(base_url: str, stages: List[int], stage_seconds: float,
+                        config_id: Optional[int] = None, pass_rate: float = 0.7,
+                        seed: int = 1, json_path: Optional[str] = None) -> dict:
+    """Run every concurrency stage in turn and return the report"""
+    visitor_ids = itertools.count(int(time.time()))
+    results = []
+    for concurrency in stages:
+        print(f"[LoadTest] Stage: {concurrency} concurrent visitors for {stage_seconds}s")
+        results.append(await run_stage(base_url, concurrency, stage_seconds,
+                                       config_id, pass_rate, visitor_ids, seed))
+
+    report = build_report(results)
+    print_report(report)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[LoadTest] Report written to {json_path}")
+    return report
@@ -45,7 +45,14 @@ const startFastAPI = () => {
     "0.0.0.0",
     "--port",
     "8000",
-  ]);
+  ], {
+    // Requests reach FastAPI through this server, which appends the visitor's
+    // address to X-Forwarded-For
+    env: {
+      ...process.env,
+      RATE_LIMIT_TRUSTED_PROXY_HOPS: process.env.RATE_LIMIT_TRUSTED_PROXY_HOPS ?? "1",
+    },
+  });
 
   fastApiProcess.stdout.on("data", (data) => {
     console.log("[FastAPI]", data.toString());
@@ -13,6 +13,9 @@ import { createServer, type Server } from "http";
 import express from "express";
 import axios from "axios";
 import path from "path";
+import { randomBytes } from "crypto";
+import net from "net";
+import tls from "tls";
 
 export function registerRoutes(app: Express): Server {
   const httpServer = createServer(app);
@@ -88,9 +91,43 @@ export function registerRoutes(app: Express): Server {
           Accept: "application/json",
         },
         validateStatus: () => true, // Allow any status code
+        // Pass FastAPI's compressed bytes through untouched instead of inflating
+        // them here and sending the browser an uncompressed copy
+        decompress: false,
+        responseType: "arraybuffer",
         timeout: process.env.NODE_ENV === "production" ? 5000 : 15000, // 5 second timeout to fail fast
       };
 
+      // Identify the visitor to FastAPI so its rate limiter does not see every
+      // request as coming from this proxy
+      const clientAddress = req.socket.remoteAddress || "unknown";
+      const forwardedFor = req.headers["x-forwarded-for"];
+      options.headers["X-Forwarded-For"] = forwardedFor
+        ? `${forwardedFor}, ${clientAddress}`
+        : clientAddress;
+      if (req.headers["x-session-id"]) {
+        options.headers["X-Session-Id"] = req.headers["x-session-id"];
+      }
+      for (const name of ["accept-encoding", "if-none-match"]) {
+        if (req.headers[name]) {
+          options.headers[name] = req.headers[name];
+        }
+      }
+
+      // Continue the browser's trace if it sent one, otherwise start a new
+      // W3C trace so FastAPI's spans share an id with these logs. The sampled
+      // flag is cleared: browsers must not be able to force traces to be kept
+      const traceparent =
+        typeof req.headers.traceparent === "string" &&
+        /^00-[0-9a-f]{32}-[0-9a-f]{16}-[0-9a-f]{2}$/.test(req.headers.traceparent)
+          ? `${req.headers.traceparent.slice(0, 52)}-00`
+          : `00-${randomBytes(16).toString("hex")}-${randomBytes(8).toString("hex")}-00`;
+      options.headers["traceparent"] = traceparent;
+      if (req.headers.tracestate) {
+        options.headers["tracestate"] = req.headers.tracestate;
+      }
+      console.log(`[Proxy] traceparent: ${traceparent}`);
+
       // Add body for non-GET requests
       if (req.method !== "GET" && req.body) {
         options.data = req.body;
@@ -120,15 +157,23 @@ export function registerRoutes(app: Express): Server {
       // Forward appropriate status code
       res.status(apiResponse.status);
 
-      // Forward response headers
+      // Forward response headers; the body is re-sent whole, so drop framing headers
       Object.entries(apiResponse.headers).forEach(([name, value]) => {
-        res.setHeader(name, value);
+        if (!["transfer-encoding", "connection", "keep-alive"].includes(name)) {
+          res.setHeader(name, value);
+        }
       });
 
       // Handle response
-      if (apiResponse.data) {
-        console.log("[Proxy] Response data:", apiResponse.data);
-        res.send(apiResponse.data);
+      const body = Buffer.from(apiResponse.data);
+      if (body.length) {
+        console.log(
+          `[Proxy] Response data: ${body.length} bytes` +
+            (apiResponse.headers["content-encoding"]
+              ? ` (${apiResponse.headers["content-encoding"]})`
+              : ""),
+        );
+        res.end(body);
       } else {
         console.log("[Proxy] Empty response");
         res.end();
@@ -166,6 +211,51 @@ export function registerRoutes(app: Express): Server {
     }
   });
 
+  // Proxy WebSocket upgrades for /api/ws/* (e.g. /api/ws/session) to FastAPI.
+  // axios cannot carry an upgraded connection, so the handshake is replayed on
+  // a raw socket and both directions are piped through untouched.
+  httpServer.on("upgrade", (req, socket, head) => {
+    if (!req.url || !req.url.startsWith("/api/ws/")) {
+      return; // not ours (e.g. the Vite HMR socket in development)
+    }
+    const target = new URL(fastApiHost);
+    const secure = target.protocol === "https:";
+    const port = Number(target.port) || (secure ? 443 : 80);
+    const path = req.url.replace(/^\/api/, "");
+    console.log(`[Proxy] WebSocket upgrade to ${fastApiHost}${path}`);
+
+    const onConnect = () => {
+      const clientAddress = req.socket.remoteAddress || "unknown";
+      const forwardedFor = req.headers["x-forwarded-for"];
+      const headers: Record<string, string | string[] | undefined> = {
+        ...req.headers,
+        host: target.host,
+        "x-forwarded-for": forwardedFor
+          ? `${forwardedFor}, ${clientAddress}`
+          : clientAddress,
+      };
+      let handshake = `${req.method} ${path} HTTP/1.1\r\n`;
+      for (const [name, value] of Object.entries(headers)) {
+        if (value === undefined) continue;
+        for (const item of Array.isArray(value) ? value : [value]) {
+          handshake += `${name}: ${item}\r\n`;
+        }
+      }
+      upstream.write(handshake + "\r\n");
+      if (head.length) upstream.write(head);
+      socket.pipe(upstream).pipe(socket);
+    };
+    const upstream = secure
+      ? tls.connect({ host: target.hostname, port, servername: target.hostname }, onConnect)
+      : net.connect(port, target.hostname, onConnect);
+
+    upstream.on("error", (error) => {
+      console.error(`[Proxy] WebSocket upstream error: ${error.message}`);
+      socket.destroy();
+    });
+    socket.on("error", () => upstream.destroy());
+  });
+
   // Register router
   app.use(router);
 
@@ -1,5 +1,9 @@
 #!/bin/bash
 
+# FastAPI only ever sees requests through the Express proxy, which appends the
+# visitor's address to X-Forwarded-For; rate limits and the form burst check key on it
+export RATE_LIMIT_TRUSTED_PROXY_HOPS="${RATE_LIMIT_TRUSTED_PROXY_HOPS:-1}"
+
 # Check if the application is already running
 if netstat -tuln | grep -q ":5000"; then
   echo "Warning: Port 5000 is already in use. Express server may already be running."
@@ -20,9 +24,13 @@ if netstat -tuln | grep -q ":5000"; then
   fi
 fi
 
+# Create any missing tables once, so the workers can skip it on boot
+echo "Running database migrations..."
+python -m backend.migrate || exit 1
+
 # Start the FastAPI server in the background
 echo "Starting FastAPI server on port 8000..."
-python -m uvicorn backend.main:app --host 0.0.0.0 --port 8000 &
+STARTUP_MODE=fast python -m uvicorn backend.main:app --host 0.0.0.0 --port 8000 &
 FASTAPI_PID=$!
 
 # Give FastAPI a moment to start up
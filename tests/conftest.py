@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+# backend.database needs a DATABASE_URL at import time; tests build their own engines
+os.environ.setdefault("DATABASE_URL",
+                      "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.setdefault("HEYGEN_POOL_ENABLED", "false")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient for backend.main on the temp database, without rate limits or email"""
+    from fastapi.testclient import TestClient
+
+    from backend import main, ratelimit
+    from backend.database import Base, engine
+
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(main, "send_email", lambda **kwargs: True)
+    yield TestClient(main.app)
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def config_id(client) -> int:
+    """A stored configuration for rows that reference one"""
+    from backend import models
+    from backend.database import SessionLocal
+
+    with SessionLocal() as db:
+        config = models.Configurations(page_title="Test", heygen_scene_id="scene",
+                                       voice_id="voice", openai_agent_config={},
+                                       pass_response="pass", fail_response="fail")
+        db.add(config)
+        db.commit()
+        return config.id
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import archive, models
+from backend.database import SessionLocal
+
+
+@pytest.fixture
+def conversation_archive(tmp_path, monkeypatch):
+    store = archive.ConversationArchive(str(tmp_path / "archive"))
+    monkeypatch.setattr(archive, "conversation_archive", store)
+    from backend import main
+    monkeypatch.setattr(main, "conversation_archive", store)
+    return store
+
+
+@pytest.fixture
+def db(client, config_id):
+    with SessionLocal() as session:
+        session.info["config_id"] = config_id
+        yield session
+
+
+def add_conversation(db, age: timedelta, **fields) -> int:
+    when = datetime.now(timezone.utc) - age
+    row = models.Conversations(config_id=db.info["config_id"], status=fields.pop("status", "active"),
+                               messages=[{"role": "user", "content": "hi"}],
+                               created_at=when, updated_at=when, **fields)
+    db.add(row)
+    db.commit()
+    return row.id
+
+
+def hot_ids(db) -> set:
+    return {row.id for row in db.query(models.Conversations.id)}
+
+
+def test_archive_round_trip(db, client, conversation_archive):
+    old = add_conversation(db, timedelta(days=100))
+    recent = add_conversation(db, timedelta(days=1))
+
+    result = archive.archive_conversations(db, older_than_days=90)
+
+    assert result["archived"] == 1
+    assert hot_ids(db) == {recent}
+    record = conversation_archive.get(old)
+    assert record["id"] == old and record["messages"] == [{"role": "user", "content": "hi"}]
+    assert client.get(f"/conversations/{old}").json()["id"] == old
+
+
+def test_abandoned_sessions_are_archived_once_they_cannot_resume(db, conversation_archive):
+    abandoned = add_conversation(db, timedelta(days=100), session_id="s-abandoned")
+    resumable = add_conversation(db, timedelta(minutes=5), session_id="s-live")
+    completed = add_conversation(db, timedelta(minutes=5), session_id="s-done",
+                                 status="completed")
+
+    archive.archive_conversations(db, older_than_days=0)
+
+    assert hot_ids(db) == {resumable}
+    assert conversation_archive.contains(abandoned)
+    assert conversation_archive.contains(completed)
+    assert conversation_archive.get(abandoned)["session_id"] == "s-abandoned"
+
+
+def test_archived_conversations_are_read_only(db, client, conversation_archive):
+    old = add_conversation(db, timedelta(days=100))
+    archive.archive_conversations(db, older_than_days=90)
+
+    update = client.put(f"/conversations/{old}",
+                        json={"config_id": db.info["config_id"], "messages": [],
+                              "status": "completed"})
+    assert update.status_code == 409
+    assert client.delete(f"/conversations/{old}").status_code == 409
+    assert client.delete("/conversations/999999").status_code == 404
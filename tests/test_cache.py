@@ -0,0 +1,86 @@
+import pytest
+
+from backend import cache
+
+
+class FanoutBus(cache.InvalidationBus):
+    """Stand-in for LISTEN/NOTIFY or pub/sub: delivers to every attached worker"""
+
+    def __init__(self, hub: list):
+        super().__init__()
+        self.hub = hub
+        hub.append(self)
+
+    def publish(self, key: str):
+        for bus in self.hub:
+            bus._deliver(key)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers sharing one SQLite L2 and an invalidation bus"""
+    hub = []
+    caches = [cache.SharedCache(cache.SQLiteCache(str(tmp_path / "cache.sqlite3")),
+                                FanoutBus(hub), ttl=300, l1_ttl=30) for _ in range(2)]
+    for worker in caches:
+        worker.start()
+    yield caches
+    for worker in caches:
+        worker.stop()
+
+
+def test_invalidation_reaches_the_other_worker(workers):
+    a, b = workers
+    assert a.get_or_load("config:1", lambda: {"title": "old"}) == {"title": "old"}
+    assert b.get_or_load("config:1", lambda: {"title": "unused"}) == {"title": "old"}
+
+    b.invalidate("config:1")
+
+    assert a.get("config:1") is None
+    assert a.get_or_load("config:1", lambda: {"title": "new"}) == {"title": "new"}
+
+
+def test_load_started_before_an_invalidation_is_not_stored(workers):
+    a, b = workers
+
+    def slow_loader():
+        b.invalidate("flows:1")  # an admin edit lands while the old rows are in hand
+        return [{"order": 1, "question": "old"}]
+
+    assert a.get_or_load("flows:1", slow_loader) == [{"order": 1, "question": "old"}]
+    assert a.get("flows:1") is None and b.get("flows:1") is None
+    assert a.stats()["stale_loads"] == 1
+
+
+def test_encoded_payload_is_not_kept_after_a_concurrent_invalidation():
+    shared = cache.SharedCache(cache.MemoryCache(), cache.LocalBus())
+    shared.start()
+
+    def loader():
+        shared.invalidate("bundle:1")
+        return {"flows": []}
+
+    assert shared.get_or_load_encoded("bundle:1", loader) is not None
+    assert shared.l1.get("bundle:1#encoded") is None
+
+
+@pytest.mark.parametrize("backend", [cache.MemoryCache, None])
+def test_callers_get_copies(backend, tmp_path):
+    store = backend() if backend else cache.SQLiteCache(str(tmp_path / "c.sqlite3"))
+    shared = cache.SharedCache(store, cache.LocalBus())
+    first = shared.get_or_load("flows:1", lambda: [{"order": 1}])
+    first[0]["order"] = 99
+    first.append({"order": 2})
+    assert shared.get("flows:1") == [{"order": 1}]
+    shared.get("flows:1")[0]["order"] = 42
+    assert shared.get("flows:1") == [{"order": 1}]
+
+
+def test_local_bus_defaults_to_short_lifetimes(monkeypatch):
+    for name in ("CACHE_BACKEND", "CACHE_BUS", "CACHE_TTL_SECONDS", "CACHE_L1_TTL_SECONDS"):
+        monkeypatch.delenv(name, raising=False)
+    local = cache._build_from_env()
+    assert local.ttl == local.l1_ttl == float(cache.LOCAL_BUS_TTL_SECONDS)
+
+    monkeypatch.setenv("CACHE_TTL_SECONDS", "120")
+    assert cache._build_from_env().ttl == 120
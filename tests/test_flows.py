@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+from backend import flows, schemas
+
+
+def step(order, pass_next=None, fail_next=None, **fields):
+    values = dict(video_filename=f"q{order}.mp4", system_prompt="Prompt",
+                  agent_question=f"Question {order}?")
+    values.update(fields)
+    return schemas.ConversationFlowBulkItem(order=order, pass_next=pass_next,
+                                            fail_next=fail_next, **values)
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def records(*chunks: bytes) -> list:
+    async def collect():
+        return [record async for record in flows.iter_csv_records(stream(*chunks))]
+    return asyncio.run(collect())
+
+
+def test_validator_reports_duplicates_dangling_steps_and_missing_form_names():
+    errors = flows.validate_flow_graph([
+        step(1, pass_next=2, fail_next=9), step(2), step(2), step(3, show_form=True)])
+    assert any("duplicate order 2" in error for error in errors)
+    assert any("fail_next=9" in error for error in errors)
+    assert any("show_form requires form_name" in error for error in errors)
+    assert len(errors) == 3
+
+
+def test_validator_accepts_steps_kept_by_a_partial_upsert():
+    items = [step(1, pass_next=2, fail_next=3)]
+    assert flows.validate_flow_graph(items)
+    assert flows.validate_flow_graph(items, kept_orders={2, 3}) == []
+
+
+def test_partial_upsert_may_point_at_existing_steps(client, config_id):
+    url = f"/configs/{config_id}/flows:bulk"
+    full = [step(1, pass_next=2, fail_next=2).model_dump(), step(2).model_dump()]
+    assert client.put(url, json={"flows": full}).status_code == 200
+
+    partial = [step(1, pass_next=2, fail_next=3).model_dump(), step(3).model_dump()]
+    response = client.put(url, json={"flows": partial, "delete_missing": False})
+    assert response.status_code == 200
+    assert [flow["order"] for flow in response.json()["flows"]] == [1, 2, 3]
+
+    dangling = [step(1, pass_next=7).model_dump()]
+    assert client.put(url, json={"flows": dangling, "delete_missing": False}).status_code == 422
+
+
+def test_quoted_fields_may_span_lines_and_chunks():
+    rows = records(b'order,system_prompt\n1,"first line\nsecond ""quoted"" line"\n2,pl',
+                   b'ain\n')
+    assert rows == [(1, ["order", "system_prompt"]),
+                    (2, ["1", 'first line\nsecond "quoted" line']),
+                    (4, ["2", "plain"])]
+
+
+def test_csv_export_imports_back_unchanged(client, config_id):
+    items = [step(1, pass_next=2, fail_next=3, input_delay=2).model_dump(),
+             step(2, system_prompt='Multi\nline, with "quotes"').model_dump(),
+             step(3, show_form=True, form_name="interest").model_dump()]
+    client.put(f"/configs/{config_id}/flows:bulk", json={"flows": items})
+
+    exported = client.get(f"/configs/{config_id}/flows.csv").content
+    parsed, errors = asyncio.run(flows.read_flows_csv(stream(exported)))
+
+    assert errors == []
+    fields = flows.STEP_FIELDS
+    assert ([item.model_dump(include=set(fields)) for item in parsed]
+            == [{name: item[name] for name in fields} for item in items])
+
+
+def test_sample_sheet_parses():
+    path = os.path.join(os.path.dirname(__file__), "..", "attached_assets",
+                        "conversation_flows.csv")
+    with open(path, "rb") as f:
+        parsed, errors = asyncio.run(flows.read_flows_csv(stream(f.read())))
+    assert errors == [] and parsed
+    assert flows.validate_flow_graph(parsed) == []
@@ -0,0 +1,85 @@
+import pytest
+
+from backend import dedupe, models, ratelimit
+from backend.database import SessionLocal
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls time.monotonic() as seen by backend.dedupe"""
+    now = [1000.0]
+    monkeypatch.setattr(dedupe.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(dedupe, "recent_submissions", dedupe.RecentSubmissions(600))
+    monkeypatch.setattr(dedupe, "burst_detector", dedupe.BurstDetector(3, 60))
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_HOPS", 1)
+
+
+def submit(client, email, forwarded_for="203.0.113.1"):
+    return client.post("/form-submissions", headers={"x-forwarded-for": forwarded_for},
+                       json={"form_name": "interest", "name": "Ada", "email": email})
+
+
+def test_repeat_inside_the_window_returns_the_first_id(clock):
+    recent = dedupe.RecentSubmissions(window=600)
+    key = dedupe.dedupe_key(" interest ", " Ada@Example.com")
+    assert recent.reserve(key) is None
+    assert recent.reserve(key) == dedupe.PENDING
+    recent.remember(key, 7)
+    assert recent.reserve(("interest", "ada@example.com")) == 7
+    clock[0] += 601
+    assert recent.reserve(key) is None
+
+
+def test_released_reservation_is_not_a_duplicate(clock):
+    recent = dedupe.RecentSubmissions(window=600)
+    key = ("interest", "ada@example.com")
+    recent.reserve(key)
+    recent.release(key)
+    assert recent.reserve(key) is None
+
+
+def test_burst_counts_distinct_emails_per_client(clock):
+    burst = dedupe.BurstDetector(limit=2, seconds=60)
+    assert burst.check("a", "1@x.io") and burst.check("a", "2@x.io")
+    assert burst.check("a", "1@x.io")  # a repeat is not a new address
+    assert not burst.check("a", "3@x.io")
+    assert burst.check("b", "3@x.io")
+    clock[0] += 61
+    assert burst.check("a", "3@x.io")
+
+
+def test_distinct_visitors_behind_the_proxy_are_not_a_burst(client, fresh_state):
+    responses = [submit(client, f"lead{i}@example.com", f"203.0.113.{i}") for i in range(6)]
+    assert [r.status_code for r in responses] == [201] * 6
+    with SessionLocal() as db:
+        stored = {row.ip_address for row in db.query(models.FormSubmissions)}
+    assert stored == {f"203.0.113.{i}" for i in range(6)}
+
+
+def test_one_visitor_cycling_emails_is_rejected(client, fresh_state):
+    codes = [submit(client, f"lead{i}@example.com").status_code for i in range(4)]
+    assert codes == [201, 201, 201, 429]
+
+
+def test_duplicate_is_answered_with_the_stored_id(client, fresh_state):
+    first = submit(client, "ada@example.com")
+    repeat = submit(client, "ADA@example.com ")
+    assert repeat.status_code == 200
+    assert repeat.json()["duplicate"] and repeat.json()["id"] == first.json()["id"]
+
+
+def test_unique_index_catches_a_duplicate_another_worker_stored(client, fresh_state,
+                                                                 monkeypatch):
+    first = submit(client, "ada@example.com")
+    # A second worker has not seen the first submission in its memory window
+    monkeypatch.setattr(dedupe, "recent_submissions", dedupe.RecentSubmissions(600))
+    repeat = submit(client, "ada@example.com")
+    assert repeat.status_code == 200
+    assert repeat.json()["id"] == first.json()["id"]
+    with SessionLocal() as db:
+        assert db.query(models.FormSubmissions).count() == 1
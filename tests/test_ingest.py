@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from backend import admin, ingest, models
+from backend.database import SessionLocal
+
+HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def admin_client(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    return client
+
+
+def ndjson(*rows) -> bytes:
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows).encode()
+
+
+def submission(**values) -> dict:
+    return {"form_name": "interest", "name": "Ada Lovelace", "email": "ada@example.com",
+            **values}
+
+
+def test_invalid_lines_are_reported_by_line_number(admin_client):
+    body = ndjson(submission(), "", "{not json", submission(email="nope"), submission())
+    result = admin_client.post("/admin/ingest/form-submissions", content=body,
+                               headers=HEADERS).json()
+    assert (result["method"], result["received"], result["inserted"]) == ("insert", 4, 2)
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+    assert "email" in result["errors"][1]["error"]
+
+
+def test_unknown_config_ids_are_skipped_across_chunks(admin_client, config_id):
+    rows = [{"config_id": config_id if n % 3 else 999, "messages": [], "status": "completed"}
+            for n in range(1, 8)]
+    result = admin_client.post("/admin/ingest/conversations?chunk_rows=2", content=ndjson(*rows),
+                               headers=HEADERS).json()
+    assert (result["inserted"], result["failed"], result["chunks"]) == (5, 2, 4)
+    assert [error["line"] for error in result["errors"]] == [3, 6]
+
+
+def test_ingested_submissions_keep_null_markers_and_skip_dedupe(admin_client):
+    body = ndjson(submission(message="\\N"), submission(message=None))
+    result = admin_client.post("/admin/ingest/form-submissions", content=body,
+                               headers=HEADERS).json()
+    assert result["inserted"] == 2
+    with SessionLocal() as db:
+        rows = db.query(models.FormSubmissions).order_by(models.FormSubmissions.id).all()
+    assert [row.message for row in rows] == ["\\N", None]
+    assert [row.dedupe_window for row in rows] == [None, None]
+
+
+def test_copy_quotes_values_so_only_nulls_match_the_marker():
+    copied = {}
+    cursor = SimpleNamespace(copy_expert=lambda sql, buffer: copied.update(
+        sql=sql, data=buffer.read()))
+    conn = SimpleNamespace(dialect=postgresql.dialect(),
+                           connection=SimpleNamespace(cursor=lambda: cursor))
+    run = ingest.IngestRun(ingest.FORM_SUBMISSIONS, SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql", driver="psycopg2")))
+    created_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    run.copy(conn, [
+        {**submission(message="\\N", additional_data={"a": "b,\"c\""}), "phone": None,
+         "ip_address": None, "created_at": created_at},
+        {**submission(message="two\nlines"), "phone": "", "ip_address": "203.0.113.1",
+         "additional_data": None, "created_at": created_at},
+    ])
+    assert "NULL '\\N'" in copied["sql"]
+    # phone is NULL (bare marker); message is the string \N (quoted)
+    assert copied["data"].startswith('"interest","Ada Lovelace","ada@example.com",\\N,"\\N",')
+    fields = list(csv.reader(io.StringIO(copied["data"])))
+    assert fields[0][4] == "\\N" and json.loads(fields[0][6]) == {"a": "b,\"c\""}
+    assert fields[1][3:5] == ["", "two\nlines"] and fields[1][6] == "\\N"
+    assert fields[0][7] == created_at.isoformat()
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import StaticPool
+
+from backend import jobs, models
+
+
+@pytest.fixture
+def queue():
+    engine = create_engine("sqlite://", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    models.Jobs.__table__.create(engine)
+    yield jobs.JobQueue(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls jobs._now(); advance(seconds) moves it forward"""
+    current = [jobs._now()]
+    monkeypatch.setattr(jobs, "_now", lambda: current[0])
+
+    class Clock:
+        @staticmethod
+        def advance(seconds: float):
+            current[0] += timedelta(seconds=seconds)
+
+    return Clock
+
+
+def job_row(queue: jobs.JobQueue, job_id: int):
+    with queue.engine.connect() as conn:
+        return conn.execute(select(jobs.jobs_table).where(jobs.jobs_table.c.id == job_id)).one()
+
+
+def test_enqueue_splits_items_into_batches(queue):
+    result = queue.enqueue("q", list(range(25)), batch_size=10)
+    assert result["jobs"] == 3 and result["items"] == 25
+    claimed = queue.claim("q", "w1", limit=5)
+    assert [job["batch_size"] for job in claimed] == [10, 10, 5]
+    assert claimed[0]["payload"]["lead_ids"] == list(range(10))
+
+
+def test_claim_leases_a_job_to_one_worker(queue, clock):
+    queue.enqueue("q", [1], batch_size=1)
+    [job] = queue.claim("q", "w1")
+    assert job["attempts"] == 1
+    assert queue.claim("q", "w2") == []
+    row = job_row(queue, job["id"])
+    assert row.status == "running" and row.lease_owner == "w1"
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    queue.enqueue("q", [1], batch_size=1, max_attempts=3)
+    [job] = queue.claim("q", "w1")
+    clock.advance(jobs.JOB_LEASE_SECONDS - 1)
+    assert queue.claim("q", "w2") == []
+    clock.advance(2)
+    [reclaimed] = queue.claim("q", "w2")
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    assert job_row(queue, job["id"]).lease_owner == "w2"
+
+
+def test_extend_leases_keeps_the_job(queue, clock):
+    queue.enqueue("q", [1], batch_size=1)
+    queue.claim("q", "w1")
+    clock.advance(jobs.JOB_LEASE_SECONDS - 1)
+    assert queue.extend_leases("w1") == 1
+    clock.advance(jobs.JOB_LEASE_SECONDS - 1)
+    assert queue.claim("q", "w2") == []
+
+
+def test_completion_after_lost_lease_is_rejected(queue, clock):
+    queue.enqueue("q", [1], batch_size=1)
+    [job] = queue.claim("q", "w1")
+    clock.advance(jobs.JOB_LEASE_SECONDS + 1)
+    queue.claim("q", "w2")
+
+    assert queue.complete(job["id"], "w1", {"from": "w1"}) is False
+    assert queue.fail(job, "w1", "late failure") == "lost"
+    assert job_row(queue, job["id"]).lease_owner == "w2"
+
+    assert queue.complete(job["id"], "w2", {"from": "w2"}) is True
+    row = job_row(queue, job["id"])
+    assert row.status == "done" and row.result == {"from": "w2"}
+    assert row.lease_owner is None
+
+
+def test_retry_backoff_doubles_and_is_capped(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 30.0)
+    assert [jobs.retry_delay(attempt) for attempt in (1, 2, 3, 4)] == [30, 60, 120, 240]
+    assert jobs.retry_delay(20) == jobs.MAX_RETRY_DELAY
+
+
+def test_failed_job_waits_for_its_backoff(queue, clock, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 30.0)
+    queue.enqueue("q", [1], batch_size=1, max_attempts=3)
+
+    [job] = queue.claim("q", "w1")
+    assert queue.fail(job, "w1", "boom") == "retry"
+    row = job_row(queue, job["id"])
+    assert row.status == "queued" and row.last_error == "boom"
+    clock.advance(29)
+    assert queue.claim("q", "w1") == []
+    clock.advance(2)
+    [job] = queue.claim("q", "w1")
+    assert job["attempts"] == 2
+
+    assert queue.fail(job, "w1", "boom") == "retry"
+    clock.advance(59)
+    assert queue.claim("q", "w1") == []
+    clock.advance(2)
+    assert queue.claim("q", "w1")[0]["attempts"] == 3
+
+
+def test_job_is_dead_lettered_after_max_attempts(queue, clock, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 0.0)
+    result = queue.enqueue("q", [1], batch_size=1, max_attempts=2)
+    for expected in ("retry", "dead"):
+        [job] = queue.claim("q", "w1")
+        assert queue.fail(job, "w1", f"attempt {job['attempts']}") == expected
+        clock.advance(1)
+
+    assert queue.claim("q", "w1") == []
+    row = job_row(queue, job["id"])
+    assert row.status == "dead" and row.last_error == "attempt 2"
+    status = queue.status("q", result["run_id"])
+    assert status["jobs"]["dead"] == 1
+    assert status["dead_letters"][0]["last_error"] == "attempt 2"
+
+    assert queue.requeue_dead("q") == 1
+    [job] = queue.claim("q", "w1")
+    assert job["attempts"] == 1
+
+
+def test_lease_lost_on_final_attempt_is_reaped(queue, clock):
+    queue.enqueue("q", [1], batch_size=1, max_attempts=1)
+    [job] = queue.claim("q", "w1")
+    clock.advance(jobs.JOB_LEASE_SECONDS + 1)
+    assert queue.claim("q", "w2") == []  # no attempts left to reclaim with
+    assert queue.reap() == 1
+    row = job_row(queue, job["id"])
+    assert row.status == "dead"
+    assert row.last_error == "lease expired on the final attempt"
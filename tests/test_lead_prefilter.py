@@ -0,0 +1,115 @@
+import sys
+from contextlib import nullcontext
+from types import ModuleType, SimpleNamespace
+
+import numpy as np
+import pytest
+
+import attached_assets
+from attached_assets import lead_jobs, lead_prefilter
+
+CONFIG = {
+    **lead_prefilter.DEFAULT_CONFIG,
+    "threshold": 1.0,
+    "category_cap": 4.0,
+    "categories": {
+        "seniority": {"weight": 1.0, "keywords": {
+            "job_title": {"founder": 3, "vice president": 2, "intern": -4},
+            "description": {"founded": 1}}},
+        "ai_interest": {"weight": 2.0, "keywords": {
+            "description": {"ai": 1, "machine learning": 1.5}}},
+    },
+}
+
+
+def lead(id, job_title="", industry="", description=""):
+    return {"id": str(id), "job_title": job_title, "company_name": "", "industry": industry,
+            "description": description}
+
+
+def test_keyword_matrix_dot_sums_repeated_rows():
+    matrix = lead_prefilter.KeywordMatrix(np.array([0, 0, 2]), np.array([0, 1, 1]), (3, 2))
+    weights = np.array([[1.0, 0.0], [2.0, 5.0]])
+    assert matrix.dot(weights).tolist() == [[3.0, 5.0], [0.0, 0.0], [2.0, 5.0]]
+    assert matrix.matched().tolist() == [True, False, True]
+
+
+def test_scores_match_phrases_per_field_and_cap_categories():
+    prefilter = lead_prefilter.LeadPrefilter(CONFIG)
+    scores, totals, matched = prefilter.score([
+        lead(1, "Founder", description="Founded an AI and machine learning studio"),
+        lead(2, "Vice President, Sales"),
+        lead(3, "Marketing Intern"),
+        lead(4, "Account Executive", description="president of the chess club"),
+    ])
+    # seniority: founder 3 + founded 1 = 4 (cap 4); ai_interest: 1 + 1.5 = 2.5, weighted x2
+    assert scores.tolist() == [[4.0, 2.5], [2.0, 0.0], [-4.0, 0.0], [0.0, 0.0]]
+    assert totals.tolist() == [9.0, 2.0, -4.0, 0.0]
+    # "vice president" is a two-word phrase; "president" alone is not a keyword
+    assert matched.tolist() == [True, True, True, False]
+
+
+def test_select_drops_low_scores_and_keeps_unknown_leads():
+    prefilter = lead_prefilter.LeadPrefilter(CONFIG)
+    keep, _, report = prefilter.select([lead(1, "Founder"), lead(2, "Intern"),
+                                        lead(3, "Sales Manager")], batch_size=1)
+    assert keep.tolist() == [True, False, True]
+    assert (report.kept, report.dropped, report.unknown) == (2, 1, 1)
+    assert report.calls_saved == 1 and report.tokens_saved > prefilter.call_overhead_tokens
+
+
+@pytest.fixture
+def scoring(monkeypatch):
+    """score_lead_batch against stand-ins for the lead database and the assistant"""
+    leads = [SimpleNamespace(id=1, linkedinJobTitle="Founder", companyIndustry="Software",
+                             linkedinDescription="AI startup"),
+             SimpleNamespace(id=2, linkedinJobTitle="Intern", companyIndustry="Restaurants",
+                             linkedinDescription="student")]
+    gpt_messages = ModuleType("attached_assets.gpt_messages")
+    gpt_messages.extract_relevant_lead_data = lambda batch: [lead(
+        item.id, item.linkedinJobTitle, item.companyIndustry, item.linkedinDescription)
+        for item in batch]
+    gpt_messages.sent = []
+
+    def score_leads(batch):
+        gpt_messages.sent.extend(item.id for item in batch)
+        return True, [{"id": str(item.id), "scores": {"fit": 5}} for item in batch]
+
+    gpt_messages.score_leads = score_leads
+    monkeypatch.setitem(sys.modules, "attached_assets.gpt_messages", gpt_messages)
+    monkeypatch.setattr(attached_assets, "gpt_messages", gpt_messages, raising=False)
+    monkeypatch.setattr(lead_jobs, "load_leads", lambda session, ids: leads)
+    monkeypatch.setattr(lead_jobs, "Session", lambda engine: nullcontext())
+    monkeypatch.setattr(lead_jobs, "_lead_engine", lambda: None)
+    monkeypatch.setattr(lead_prefilter, "_prefilter", lead_prefilter.LeadPrefilter(
+        lead_prefilter.DEFAULT_CONFIG))
+    return gpt_messages
+
+
+def test_shadow_mode_scores_every_lead_and_reports_the_drops(scoring):
+    result = lead_jobs.score_lead_batch({"lead_ids": [1, 2], "prefilter": "shadow"})
+    assert scoring.sent == [1, 2]
+    assert result["scored"] == 2
+    assert [entry["id"] for entry in result["filtered"]] == ["2"]
+    assert result["prefilter"]["mode"] == "shadow"
+
+
+def test_enforce_mode_records_a_result_for_each_dropped_lead(scoring):
+    result = lead_jobs.score_lead_batch({"lead_ids": [1, 2], "prefilter": "enforce"})
+    assert scoring.sent == [1]
+    assert result["scored"] == 1
+    dropped = [entry for entry in result["results"] if entry.get("prefiltered")]
+    assert [entry["id"] for entry in dropped] == ["2"]
+    assert "prefilter_score" in dropped[0]
+
+
+def test_off_mode_skips_the_prefilter(scoring):
+    result = lead_jobs.score_lead_batch({"lead_ids": [1, 2], "prefilter": "off"})
+    assert scoring.sent == [1, 2] and "prefilter" not in result
+
+
+def test_missing_prefilter_is_reported(scoring, monkeypatch):
+    monkeypatch.setattr(lead_jobs, "lead_prefilter", None)
+    result = lead_jobs.score_lead_batch({"lead_ids": [1, 2], "prefilter": "enforce"})
+    assert scoring.sent == [1, 2]
+    assert result["prefilter"] == {"mode": "enforce", "unavailable": True}
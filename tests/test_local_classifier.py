@@ -0,0 +1,59 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+from backend import classifier, local_classifier
+
+RUBRIC = ("### For this question: a positive response = PASS, "
+          "a negative or uncertain response = FAIL ###")
+
+
+@pytest.mark.parametrize("answer", [
+    "I never miss a meeting",
+    "I cannot wait!",
+    "I won't let you down",
+    "I can't imagine not doing it",
+    "I can't say no",
+    "never missed one",
+    "no reason not to",
+])
+def test_negated_idioms_are_positive_and_not_decidable(answer):
+    local = local_classifier.judge(RUBRIC, answer)
+    assert local.verdict == "PASS"
+    assert not local.decidable
+
+
+def test_double_negative_is_uncertain():
+    assert local_classifier.score_answer("I don't think I can't")[0] == "uncertain"
+    assert local_classifier.score_answer("No, I can't")[0] == "negative"
+
+
+def test_single_words_stay_decidable():
+    assert local_classifier.judge(RUBRIC, "no").decidable
+    assert local_classifier.judge(RUBRIC, "yes").decidable
+
+
+def test_negated_answer_is_not_decided_locally():
+    policy = replace(classifier.default_policy, local_mode="auto")
+    request = (RUBRIC, "Can you attend every session?", "I cannot wait!")
+    local = local_classifier.judge(RUBRIC, request[2])
+    assert classifier._decide_locally(None, policy, request, local) is None
+
+
+def test_cached_classification_ignores_local_verdicts():
+    assert classifier.cached_classification(RUBRIC, "Are you in?", "yes") is None
+
+
+def test_model_only_callers_do_not_share_a_flight_with_live_ones(monkeypatch):
+    keys = []
+
+    async def do_async(key, fn):
+        keys.append(key)
+        return {"status": "pass", "response": "PASS"}
+
+    monkeypatch.setattr(classifier.single_flight, "do_async", do_async)
+    request = ("key", RUBRIC, "Are you in?", "I cannot wait!")
+    asyncio.run(classifier.classify_async(*request))
+    asyncio.run(classifier.classify_async(*request, use_local=False))
+    assert len(set(keys)) == 2
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from starlette.requests import Request
+
+from backend import ratelimit
+
+RULE = ratelimit.RateLimitRule(rate=0.0, burst=1)
+
+
+def proxied_request(forwarded_for: str, path: str = "/chat") -> Request:
+    """A POST as the Express proxy on 127.0.0.1 forwards it"""
+    return Request({
+        "type": "http", "method": "POST", "path": path, "query_string": b"",
+        "headers": [(b"x-forwarded-for", forwarded_for.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 8000), "scheme": "http",
+    })
+
+
+@pytest.fixture
+def limiter():
+    return ratelimit.RateLimiter(ratelimit.InMemoryRateLimitBackend(), {"/chat": RULE},
+                                 ratelimit.ConcurrencyLimiter(max_in_flight=4, max_wait=0.1))
+
+
+def test_forwarded_visitors_get_separate_buckets(monkeypatch, limiter):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_HOPS", 1)
+    assert limiter.check(proxied_request("203.0.113.1"), RULE)[0]
+    assert limiter.check(proxied_request("203.0.113.2"), RULE)[0]
+    assert not limiter.check(proxied_request("203.0.113.1"), RULE)[0]
+
+
+def test_spoofed_leftmost_entry_is_ignored(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_HOPS", 1)
+    assert ratelimit.client_ip(proxied_request("1.2.3.4, 203.0.113.1")) == "203.0.113.1"
+
+
+def test_without_trusted_hops_the_proxy_address_is_used(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_HOPS", 0)
+    assert ratelimit.client_ip(proxied_request("203.0.113.1")) == "127.0.0.1"
+
+
+def test_start_script_trusts_the_express_hop():
+    with open(os.path.join(os.path.dirname(__file__), "..", "start.sh")) as f:
+        assert 'RATE_LIMIT_TRUSTED_PROXY_HOPS="${RATE_LIMIT_TRUSTED_PROXY_HOPS:-1}"' in f.read()
@@ -0,0 +1,72 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from backend.database import ReplicaRouter
+
+
+class SlowReplica:
+    """Replica stand-in whose lag query takes `delay` seconds"""
+
+    def __init__(self, delay: float, lag: float = 0.0):
+        self.delay = delay
+        self.lag = lag
+        self.probes = 0
+        self.pool = SimpleNamespace(status=lambda: "stand-in")
+
+
+def router_for(replica: SlowReplica, **options) -> ReplicaRouter:
+    router = ReplicaRouter(replica, max_lag=5, sticky_seconds=5, check_interval=60, **options)
+
+    def measure_lag():
+        replica.probes += 1
+        time.sleep(replica.delay)
+        return replica.lag
+
+    router._measure_lag = measure_lag
+    return router
+
+
+def wait_for_probe(router: ReplicaRouter):
+    deadline = time.monotonic() + 5
+    while router._probing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_concurrent_requests_start_one_background_probe():
+    replica = SlowReplica(delay=0.3)
+    router = router_for(replica)
+    durations = []
+
+    def read():
+        started = time.perf_counter()
+        router.use_replica("client")
+        durations.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=read) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wait_for_probe(router)
+
+    assert replica.probes == 1
+    assert max(durations) < 0.2
+
+
+def test_lagging_replica_sends_reads_to_the_primary():
+    replica = SlowReplica(delay=0, lag=30)
+    router = router_for(replica)
+    router.use_replica("client")
+    wait_for_probe(router)
+    assert not router.use_replica("client")
+    assert router.stats()["replica_lag_seconds"] == 30
+
+
+def test_writers_read_from_the_primary():
+    router = router_for(SlowReplica(delay=0))
+    router.mark_write("writer")
+    wait_for_probe(router)
+    assert not router.use_replica("writer")
+    assert router.use_replica("reader")
+    assert router.stats()["sticky_clients"] == 1
@@ -0,0 +1,97 @@
+import pytest
+
+from backend import classifier, models, ratelimit, session_channel
+from backend.cache import flows_key, shared_cache
+from backend.database import SessionLocal
+
+RUBRIC = ("### For this question: a positive response = PASS, "
+          "a negative or uncertain response = FAIL ###")
+
+
+@pytest.fixture
+def flows(config_id, monkeypatch):
+    """Two steps: a question, then the form"""
+    with SessionLocal() as db:
+        db.add_all([
+            models.ConversationFlow(config_id=config_id, order=1, video_filename="q.mp4",
+                                    system_prompt=RUBRIC, agent_question="Are you in?",
+                                    pass_next=2, fail_next=2),
+            models.ConversationFlow(config_id=config_id, order=2, video_filename="f.mp4",
+                                    system_prompt="", agent_question="Fill in the form",
+                                    show_form=True, form_name="interest"),
+        ])
+        db.commit()
+    shared_cache.invalidate(flows_key(config_id))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    return config_id
+
+
+@pytest.fixture
+def verdicts(monkeypatch):
+    """classify_async stand-in: raises while `failures` is positive, then passes"""
+    state = {"failures": 0, "calls": 0}
+
+    async def classify_async(api_key, system_prompt, agent_question, user_message, **kwargs):
+        state["calls"] += 1
+        if state["failures"] > 0:
+            state["failures"] -= 1
+            raise RuntimeError("upstream timeout")
+        return {"status": "pass", "response": "PASS"}
+
+    monkeypatch.setattr(classifier, "classify_async", classify_async)
+    return state
+
+
+def receive_until(ws, kind: str) -> dict:
+    while True:
+        message = ws.receive_json()
+        if message["type"] in (kind, "error"):
+            return message
+
+
+def test_start_sends_the_session_and_first_step(client, flows):
+    with client.websocket_connect("/ws/session") as ws:
+        ws.send_json({"type": "start", "config_id": flows})
+        assert ws.receive_json()["type"] == "session"
+        step = ws.receive_json()
+        assert step["type"] == "step" and step["question"] == "Are you in?"
+
+
+def test_answer_can_be_retried_after_classification_fails(client, flows, verdicts):
+    verdicts["failures"] = 1
+    with client.websocket_connect("/ws/session") as ws:
+        ws.send_json({"type": "start", "config_id": flows})
+        receive_until(ws, "step")
+        ws.send_json({"type": "answer", "text": "yes", "answer_id": "a1"})
+        assert receive_until(ws, "verdict")["code"] == "classification_failed"
+        ws.send_json({"type": "answer", "text": "yes", "answer_id": "a1"})
+        assert receive_until(ws, "verdict")["status"] == "pass"
+        assert receive_until(ws, "step")["show_form"]
+    assert verdicts["calls"] == 2
+
+
+def test_resent_answer_is_applied_once(client, flows, verdicts):
+    with client.websocket_connect("/ws/session") as ws:
+        ws.send_json({"type": "start", "config_id": flows})
+        receive_until(ws, "step")
+        ws.send_json({"type": "answer", "text": "yes", "answer_id": "a1"})
+        receive_until(ws, "step")
+        ws.send_json({"type": "answer", "text": "yes", "answer_id": "a1"})
+        ws.send_json({"type": "ping", "t": 1})
+        assert ws.receive_json()["type"] == "pong"
+    assert verdicts["calls"] == 1
+
+
+def test_session_starts_are_rate_limited(client, flows, monkeypatch):
+    limiter = ratelimit.RateLimiter(
+        ratelimit.InMemoryRateLimitBackend(),
+        {session_channel.START_PATH: ratelimit.RateLimitRule(rate=0.0, burst=2)},
+        ratelimit.ConcurrencyLimiter(max_in_flight=4, max_wait=0.1))
+    monkeypatch.setattr(ratelimit, "limiter", limiter)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    with client.websocket_connect("/ws/session") as ws:
+        for _ in range(2):
+            ws.send_json({"type": "start", "config_id": flows})
+            assert receive_until(ws, "step")["type"] == "step"
+        ws.send_json({"type": "start", "config_id": flows})
+        assert ws.receive_json()["code"] == "rate_limited"